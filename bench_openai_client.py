@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+CLI: замер задержки вызовов OpenAI — новый клиент на каждый вызов (как было раньше, в потоке)
+против общего AsyncOpenAI с keep-alive пулом (src/openai_client.py). Тело запроса в обоих режимах одно и то же
+(как его собирает get_reply), так что разница — только в клиенте и соединениях.
+Запуск из корня проекта: python bench_openai_client.py --calls 20 --concurrency 4
+Нужен OPENAI_API_KEY (или OPENAI_BASE_URL на совместимую локальную заглушку).
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from openai import OpenAI
+
+from config import OPENAI_API_KEY, OPENAI_BASE_URL, OPENAI_MODEL, setup_logging
+from src import openai_client
+
+setup_logging()
+
+PROMPT = [{"role": "user", "content": "Ответь одним словом: ок"}]
+# Тело, которое отправляет openai_client.get_reply(PROMPT): «до» шлёт ровно его же
+BODY = {"model": OPENAI_MODEL, "messages": PROMPT}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Сравнение задержки: клиент OpenAI на каждый вызов vs общий пул соединений."
+    )
+    parser.add_argument("--calls", type=int, default=20, help="Число вызовов в каждом режиме.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Сколько вызовов выполнять одновременно.")
+    return parser.parse_args()
+
+
+def _call_fresh_client() -> None:
+    # Старое поведение: OpenAI(...) на каждый вызов → новый HTTP-клиент, TLS handshake, пул
+    kwargs = {"api_key": OPENAI_API_KEY}
+    if OPENAI_BASE_URL:
+        kwargs["base_url"] = OPENAI_BASE_URL
+    client = OpenAI(**kwargs)
+    client.chat.completions.create(**BODY)
+
+
+async def _bench(name: str, call, calls: int, concurrency: int) -> list[float]:
+    sem = asyncio.Semaphore(max(1, concurrency))
+    latencies: list[float] = []
+
+    async def _one() -> None:
+        async with sem:
+            started = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_one() for _ in range(calls)))
+    wall = time.perf_counter() - started
+    _report(name, latencies, wall)
+    return latencies
+
+
+def _report(name: str, latencies: list[float], wall: float) -> None:
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    print(
+        f"{name:<22} вызовов={len(ordered)}  среднее={statistics.mean(ordered) * 1000:.0f} мс  "
+        f"p50={statistics.median(ordered) * 1000:.0f} мс  p95={p95 * 1000:.0f} мс  "
+        f"всего={wall:.1f} с"
+    )
+
+
+async def main() -> None:
+    args = parse_args()
+    if not OPENAI_API_KEY and not OPENAI_BASE_URL:
+        print("Не задан OPENAI_API_KEY (или OPENAI_BASE_URL).")
+        return
+    before = await _bench(
+        "до: клиент на вызов", lambda: asyncio.to_thread(_call_fresh_client), args.calls, args.concurrency
+    )
+    # Первый вызов открывает соединение — прогреваем, чтобы сравнивать установившийся режим
+    await openai_client.get_reply(PROMPT)
+    after = await _bench(
+        "после: общий пул", lambda: openai_client.get_reply(PROMPT), args.calls, args.concurrency
+    )
+    await openai_client.close_client()
+    gain = statistics.median(before) - statistics.median(after)
+    print(f"Выигрыш по медиане: {gain * 1000:.0f} мс на вызов")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+CLI: проверка, что обработка сообщений кандидатов не блокирует event loop. N кандидатов параллельно проходят
+handle_agreement → handle_answer по всем вопросам questions.json с настоящей сборкой промптов (prompts),
+локальными валидаторами, кэшем вердиктов (SQLite во временном каталоге) и short_extract, затем полную доставку
+(DeliveryPipeline: отчёт, выжимка, вакансии, HR, кандидат, диалог, дамп — с записью файлов во временный каталог)
+и диалог по вакансиям (отказ → следующая вакансия → согласие, handle_vacancy_dialogue_message). Вместо OpenAI —
+заглушка клиента с задержкой --llm-ms (в т.ч. потоковый ответ), вместо API вакансий — задержка в потоке,
+вместо Telegram — клиент, который только считает сообщения. Паузы «как человек» между частями вакансии
+(5–10 с) остаются, поэтому прогон занимает около полуминуты.
+Задержку меряет тот же сторож, что и в боте (health.watch_loop_lag, шаг --interval-ms): синхронный шаг дольше
+--max-lag-ms (запрос к SQLite, файловый I/O, тяжёлый разбор) пишется в лог с текущими задачами.
+Код выхода 1 — p99 задержки не меньше порога (единичные всплески — шум планировщика ОС, их видно в max).
+
+Запуск из корня проекта:
+  python check_loop_lag.py --candidates 50 --max-lag-ms 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+# До импорта config: без имитации набора и 2–3 минут «поиска вакансии», с доставкой вакансий и без лимитов
+# отправки (очередь send_queue остаётся, но не тормозит прогон)
+os.environ.update(
+    TOGGLE_DELAY="OFF",
+    VACANCY_API_KEY="check",
+    SAVE_RESULTS_TO_FILES="1",
+    SEND_GLOBAL_RATE="10000",
+    SEND_GLOBAL_BURST="10000",
+    SEND_PEER_RATE="10000",
+    SEND_PEER_BURST="10000",
+)
+
+from src import (  # noqa: E402
+    health,
+    metrics,
+    openai_client,
+    prompts,
+    questionnaire,
+    short_extract,
+    vacancy_prefetch,
+    verdict_cache,
+)
+from src.delivery import DeliveryPipeline  # noqa: E402
+from src.vacancies import format_top_vacancies_report  # noqa: E402
+
+# Ответы на вопросы questions.json по порядку: первый обычно не решается локальными валидаторами
+# (идёт в кэш вердиктов и validate_answer), второй — проверяется локально
+ANSWERS = [
+    ("меня зовут Иван, фамилия Петров", "Петров Иван Сергеевич"),
+    ("родился весной девяностого", "12.03.1990"),
+    ("Подмосковье, под Химками", "Москва"),
+    ("как только скажете, так и поеду", "сразу"),
+    ("что-нибудь физическое, не в офисе", "склад"),
+    ("работал пару лет в магазине продавцом", "нет"),
+    ("кое-что умею, руки из нужного места", "ничего"),
+    ("как удобнее работодателю", "вахта"),
+    ("мне всё одно, когда работать", "без разницы"),
+    ("чем больше, тем лучше", "по договоренности"),
+    ("было бы хорошо", "да"),
+    ("без проблем", "да"),
+    ("ни разу не привлекался", "нет"),
+    ("конечно", "да"),
+]
+# Развёрнутый ответ на приветствие: intent не решает его локально, идёт evaluate_agreement
+AGREEMENT = "А что за работа? Ну давайте, расскажите подробнее"
+# Диалог по вакансиям: отказ (1), вопрос (2) — следующая вакансия, согласие (3) — диалог завершён
+DIALOGUE = ("нет, далеко ездить", "а что ещё есть?", "да, подходит")
+HR = "hr_check"
+OFFERINGS = 10
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Задержка event loop при обработке ответов кандидатов (заглушки вместо OpenAI и API вакансий)."
+    )
+    parser.add_argument("--candidates", type=int, default=50, help="Сколько кандидатов вести одновременно.")
+    parser.add_argument("--llm-ms", type=float, default=40, help="Задержка ответа заглушки OpenAI, мс.")
+    parser.add_argument("--max-lag-ms", type=float, default=10, help="Допустимая задержка event loop (p99), мс.")
+    parser.add_argument("--interval-ms", type=float, default=5, help="Шаг замера задержки event loop, мс.")
+    parser.add_argument(
+        "--verdict-memory",
+        type=int,
+        default=1,
+        help="Размер LRU кэша вердиктов в памяти (маленький — повторные ответы читаются из SQLite).",
+    )
+    return parser.parse_args()
+
+
+def _usage() -> SimpleNamespace:
+    return SimpleNamespace(prompt_tokens=300, completion_tokens=30, prompt_tokens_details=None)
+
+
+def _analysis(body: dict[str, Any]) -> str:
+    """Ответ analyze_vacancy_reply: результат по первому слову последнего сообщения кандидата."""
+    message = body["messages"][-1]["content"].rsplit("Последнее сообщение кандидата:", 1)[-1].strip()
+    result = 1 if message.startswith("нет") else 3 if message.startswith("да") else 2
+    return json.dumps({"analysis_result": result, "reply_text": "Понял вас.", "reason": "check"})
+
+
+def _reply(body: dict[str, Any]) -> tuple[str, bool]:
+    """(текст или аргументы функции, tool) — правдоподобный ответ модели на тело запроса."""
+    tools = body.get("tools")
+    if body["messages"][0]["content"] == prompts.ANALYZE_VACANCY_REPLY.system:
+        return _analysis(body), False
+    if not tools:
+        return "YES", False
+    function = tools[0]["function"]
+    if function["name"] == "validate_answer":
+        return json.dumps({"valid": True, "human_response": ""}), True
+    # Выжимка: все запрошенные поля — «не указано»
+    return json.dumps({f: None for f in function["parameters"]["properties"]}), True
+
+
+class _FakeStream:
+    """Поток chat.completions: ответ тремя фрагментами, затем чанк с usage."""
+
+    def __init__(self, text: str, tool: bool, delay: float) -> None:
+        step = max(1, len(text) // 3)
+        self._parts = [text[i : i + step] for i in range(0, len(text), step)]
+        self._tool = tool
+        self._delay = delay
+
+    def _chunk(self, text: str) -> SimpleNamespace:
+        if self._tool:
+            call = SimpleNamespace(index=0, function=SimpleNamespace(arguments=text))
+            delta = SimpleNamespace(content=None, tool_calls=[call])
+        else:
+            delta = SimpleNamespace(content=text, tool_calls=None)
+        return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta)])
+
+    async def __aiter__(self):
+        for part in self._parts:
+            await asyncio.sleep(self._delay / len(self._parts))
+            yield self._chunk(part)
+        yield SimpleNamespace(usage=_usage(), choices=[])
+
+    async def close(self) -> None:
+        pass
+
+
+class _FakeCompletions:
+    def __init__(self, delay: float) -> None:
+        self._delay = delay
+        self.calls = 0
+
+    async def create(self, stream: bool = False, **body: Any) -> Any:
+        self.calls += 1
+        text, tool = _reply(body)
+        if stream:
+            return _FakeStream(text, tool, self._delay)
+        await asyncio.sleep(self._delay)
+        if tool:
+            call = SimpleNamespace(function=SimpleNamespace(arguments=text))
+            message = SimpleNamespace(content=None, tool_calls=[call])
+        else:
+            message = SimpleNamespace(content=text, tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=_usage())
+
+
+class _FakeTelegram:
+    """Клиент Telethon для доставки: сообщения и запросы («печатает») только считаются."""
+
+    def __init__(self) -> None:
+        self.sent = 0
+
+    async def send_message(self, entity: Any, text: str) -> SimpleNamespace:
+        self.sent += 1
+        return SimpleNamespace(id=self.sent)
+
+    async def __call__(self, request: Any) -> None:
+        return None
+
+
+class _Delivery:
+    """Общий DeliveryPipeline прогона; done(user_id) — дождаться окончания доставки кандидату."""
+
+    def __init__(self, client: _FakeTelegram, path: Path, workers: int) -> None:
+        self._waiters: dict[int, asyncio.Future] = {}
+        self.pipeline = DeliveryPipeline(lambda _name: client, workers=workers, path=path, on_done=self._on_done)
+
+    async def _on_done(self, job: dict[str, Any]) -> None:
+        fut = self._waiters.pop(job["ctx"]["candidate_entity"], None)
+        if fut is not None and not fut.done():
+            fut.set_result(job)
+
+    async def run(self, user_id: int, result: dict[str, Any]) -> None:
+        fut = self._waiters[user_id] = asyncio.get_running_loop().create_future()
+        ctx = questionnaire.new_delivery_context(result, hr_account=HR, candidate_entity=user_id)
+        await self.pipeline.submit(ctx, "check")
+        await fut
+
+
+async def _candidate(user_id: int, start_delay: float, delivery: _Delivery, client: _FakeTelegram) -> None:
+    # Кандидаты приходят вразнобой, а не одновременно на один и тот же вопрос
+    await asyncio.sleep(start_delay)
+    questionnaire.init_session(user_id, f"candidate{user_id}")
+    _reply_text, done = await questionnaire.handle_agreement(user_id, None, AGREEMENT)
+    if done:
+        raise RuntimeError(f"кандидат {user_id}: согласие не принято")
+    for idx, variants in enumerate(ANSWERS):
+        state = questionnaire.get_state(user_id)
+        if state is None or state["state"] != "asking":
+            break
+        for answer in variants:
+            _reply_text, done = await questionnaire.handle_answer(user_id, None, answer)
+            if done or state["current_q_index"] > idx:
+                break
+        else:
+            raise RuntimeError(f"кандидат {user_id}: вопрос {idx + 1} не принят ({variants})")
+    if questionnaire.get_state(user_id)["state"] != "completed":
+        raise RuntimeError(f"кандидат {user_id}: опрос не завершён")
+    result = questionnaire.finish_session(user_id, deliver=True)
+    await delivery.run(user_id, result)
+    for text in DIALOGUE:
+        if not await questionnaire.handle_vacancy_dialogue_message(user_id, text, client):
+            raise RuntimeError(f"кандидат {user_id}: диалог по вакансиям не начат")
+    if questionnaire.get_dialogue_state(user_id) is not None:
+        raise RuntimeError(f"кандидат {user_id}: диалог по вакансиям не завершён")
+
+
+def _offering(vid: int) -> dict[str, Any]:
+    # Описание — как у настоящих вакансий: несколько килобайт текста
+    section = "Обязанности: приёмка, комплектация и отгрузка товара на складе. Проживание и питание за счёт компании. "
+    return {
+        "id": vid,
+        "f_offering_name": f"Комплектовщик на склад #{vid}",
+        "region_name": "Московская область",
+        "rate_human": "от 3500 ₽ за смену",
+        "description_text": section * 25,
+    }
+
+
+def _fetch_vacancies(delay: float):
+    def fetch(short: dict[str, Any]) -> vacancy_prefetch.Fetched:
+        time.sleep(delay)
+        offerings = [_offering(vid) for vid in range(1, OFFERINGS + 1)]
+        return offerings, format_top_vacancies_report(offerings, top_n=1), len(offerings)
+
+    return fetch
+
+
+async def main() -> int:
+    args = parse_args()
+    loop = asyncio.get_running_loop()
+    delay = args.llm_ms / 1000
+
+    completions = _FakeCompletions(delay)
+    openai_client._clients[loop] = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    vacancy_prefetch.fetch_vacancies = _fetch_vacancies(delay)
+    tmp = tempfile.TemporaryDirectory()
+    work = Path(tmp.name)
+    verdict_cache._cache = verdict_cache.VerdictCache(path=work / "verdicts.sqlite3", memory_size=args.verdict_memory)
+    questionnaire.RESULTS_JSON_DIR = work / "json"
+    questionnaire.RESULTS_TEXT_DIR = work / "text"
+    questionnaire.SHORT_STORE_PATH = work / "json" / "short.json"
+    telegram = _FakeTelegram()
+    delivery = _Delivery(telegram, work / "delivery_jobs.json", workers=args.candidates + 1)
+    delivery.pipeline.start()
+
+    # Прогрев: разовое (открытие SQLite, пул потоков, json-ресурсы) не меряем; заодно кэш вердиктов заполняется,
+    # и ответы остальных кандидатов читаются из SQLite — как повторяющиеся «нет», «да» у тысяч кандидатов
+    await _candidate(999, 0, delivery, telegram)
+    watcher = asyncio.create_task(health.watch_loop_lag(args.max_lag_ms, interval_sec=args.interval_ms / 1000))
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(
+            *(_candidate(1000 + i, i * delay / 2, delivery, telegram) for i in range(args.candidates))
+        )
+    finally:
+        wall = time.perf_counter() - started
+        watcher.cancel()
+        await delivery.pipeline.close()
+        verdict_cache._cache.close()
+        tmp.cleanup()
+
+    p99 = metrics.percentile("loop_lag_ms", 0.99) or 0.0
+    worst = metrics.percentile("loop_lag_ms", 1.0) or 0.0
+    exceeded = metrics.get_counter("loop_lag_exceeded")
+    hits = sum(metrics.get_counter("verdict_cache_hits", layer=layer) for layer in ("memory", "disk"))
+    print(
+        f"кандидатов={args.candidates}  вызовов LLM={completions.calls}  сообщений Telegram={telegram.sent}  "
+        f"кэш вердиктов: попаданий={hits:.0f} (с диска {metrics.get_counter('verdict_cache_hits', layer='disk'):.0f})  "
+        f"всего={wall:.1f} с"
+    )
+    print(
+        f"задержка loop: p99={p99:.1f} мс  max={worst:.1f} мс  порог={args.max_lag_ms:.0f} мс  "
+        f"превышений={exceeded:.0f}"
+    )
+    if p99 >= args.max_lag_ms:
+        print("ПРОВАЛ: обработка ответов или доставка блокирует event loop")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -17,10 +17,52 @@ def _truthy(val: str) -> bool:
 TG_API_ID = int(os.environ.get("TG_API_ID", "0"))
 TG_API_HASH = os.environ.get("TG_API_HASH", "")
 TG_PHONE = os.environ.get("TG_PHONE", "")
+# Несколько userbot-аккаунтов в одном процессе: "session1:+7900...,session2:+7901..." (пусто — один аккаунт TG_PHONE)
+TG_ACCOUNTS = os.environ.get("TG_ACCOUNTS", "")
+# Виртуальных узлов на аккаунт в кольце консистентного хеширования
+ACCOUNT_VNODES = int(os.environ.get("ACCOUNT_VNODES", "64"))
+# Сколько не начинать новые диалоги с аккаунта после PeerFlood, сек (по умолчанию 12 ч)
+ACCOUNT_PEER_FLOOD_COOLDOWN_SEC = float(os.environ.get("ACCOUNT_PEER_FLOOD_COOLDOWN_SEC", str(12 * 3600)))
 
 # OpenAI
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+# Необязательный адрес API (совместимый прокси/локальная заглушка); пусто — api.openai.com
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "").strip() or None
+# Таймаут запроса к OpenAI, сек; пул keep-alive соединений общего клиента
+OPENAI_TIMEOUT_SEC = float(os.environ.get("OPENAI_TIMEOUT_SEC", "60"))
+OPENAI_MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_SEC = float(os.environ.get("OPENAI_KEEPALIVE_SEC", "60"))
+# prompt_cache_key (имя@версия промпта) в запросах — запросы с общим префиксом попадают в кэш провайдера;
+# выключить для совместимых API, которые не знают этот параметр
+OPENAI_PROMPT_CACHE_KEY = _truthy(os.environ.get("OPENAI_PROMPT_CACHE_KEY", "1"))
+# Устойчивость вызовов OpenAI: одновременных запросов (по лимиту аккаунта); срок на вызов целиком, сек —
+# для ответов кандидату и для фоновых вызовов; повторы при 429/таймауте/5xx и пауза между ними (full jitter)
+OPENAI_CONCURRENCY = int(os.environ.get("OPENAI_CONCURRENCY", "8"))
+OPENAI_DEADLINE_SEC = float(os.environ.get("OPENAI_DEADLINE_SEC", "25"))
+OPENAI_BACKGROUND_DEADLINE_SEC = float(os.environ.get("OPENAI_BACKGROUND_DEADLINE_SEC", "120"))
+OPENAI_RETRIES = int(os.environ.get("OPENAI_RETRIES", "3"))
+OPENAI_BACKOFF_BASE_SEC = float(os.environ.get("OPENAI_BACKOFF_BASE_SEC", "0.5"))
+OPENAI_BACKOFF_MAX_SEC = float(os.environ.get("OPENAI_BACKOFF_MAX_SEC", "8"))
+# Предохранитель: после стольких сбоев подряд LLM не вызывается столько секунд (локальные фолбэки)
+OPENAI_BREAKER_FAILURES = int(os.environ.get("OPENAI_BREAKER_FAILURES", "5"))
+OPENAI_BREAKER_COOLDOWN_SEC = float(os.environ.get("OPENAI_BREAKER_COOLDOWN_SEC", "30"))
+# Хеджирование интерактивных вызовов: нет ответа за скользящий перцентиль OPENAI_HEDGE_QUANTILE латентности функции —
+# второй такой же запрос, берётся первый ответ. Доля хеджей не больше OPENAI_HEDGE_MAX_RATE вызовов функции;
+# до OPENAI_HEDGE_MIN_SAMPLES замеров не хеджируем; OPENAI_HEDGE_HOLDOUT вызовов — без хеджа (для сравнения латентности)
+OPENAI_HEDGE = _truthy(os.environ.get("OPENAI_HEDGE", "0"))
+OPENAI_HEDGE_QUANTILE = float(os.environ.get("OPENAI_HEDGE_QUANTILE", "0.9"))
+OPENAI_HEDGE_MAX_RATE = float(os.environ.get("OPENAI_HEDGE_MAX_RATE", "0.1"))
+OPENAI_HEDGE_MIN_SAMPLES = int(os.environ.get("OPENAI_HEDGE_MIN_SAMPLES", "30"))
+OPENAI_HEDGE_HOLDOUT = float(os.environ.get("OPENAI_HEDGE_HOLDOUT", "0.1"))
+# Потоковые ответы для analyze_vacancy_reply / validate_answer: «печатает» продлевается по мере прихода токенов,
+# чтение прекращается, как только закрылся JSON
+OPENAI_STREAM = _truthy(os.environ.get("OPENAI_STREAM", "1"))
+# Выжимка (short) по мере ответов на вопросы с "extract"; summarize_questionnaire — только фолбэк
+INCREMENTAL_SHORT = _truthy(os.environ.get("INCREMENTAL_SHORT", "1"))
+# Упреждающая загрузка вакансий по полям фильтра, известным до конца опроса; сколько хранить результат, сек
+VACANCY_PREFETCH = _truthy(os.environ.get("VACANCY_PREFETCH", "1"))
+VACANCY_PREFETCH_TTL_SEC = float(os.environ.get("VACANCY_PREFETCH_TTL_SEC", "600"))
 
 # Telegram аккаунты
 HR_ACCOUNT = os.environ.get("HR_ACCOUNT", "")
@@ -51,6 +93,64 @@ THINK_DELAY_MIN = float(os.environ.get("THINK_DELAY_MIN", "1.0"))
 THINK_DELAY_MAX = float(os.environ.get("THINK_DELAY_MAX", "2.5"))
 # Верхняя граница времени «печати» (сек), чтобы длинный отчёт не «печатался» минуты
 HUMAN_DELAY_MAX_TYPING_SEC = float(os.environ.get("HUMAN_DELAY_MAX_TYPING_SEC", "90"))
+# Планировщик «печатает»: шаг timer wheel (сек) и максимум SetTyping за один шаг (остальные — на следующий)
+TYPING_TICK_SEC = float(os.environ.get("TYPING_TICK_SEC", "0.5"))
+TYPING_MAX_PER_TICK = int(os.environ.get("TYPING_MAX_PER_TICK", "4"))
+
+# Кампания (обычный режим): сколько опросов кандидатов вести одновременно
+CAMPAIGN_CONCURRENCY = int(os.environ.get("CAMPAIGN_CONCURRENCY", "5"))
+# Кандидат, не отвечающий столько секунд, освобождает слот кампании (0 — ждать бесконечно)
+CAMPAIGN_IDLE_TIMEOUT_SEC = float(os.environ.get("CAMPAIGN_IDLE_TIMEOUT_SEC", "21600"))
+# Импорт телефонов кандидатов в контакты: размер пачки одного ImportContactsRequest
+CONTACTS_IMPORT_BATCH = int(os.environ.get("CONTACTS_IMPORT_BATCH", "20"))
+# Сколько следующих кандидатов резолвить заранее, пока идут текущие опросы
+RESOLVE_LOOKAHEAD = int(os.environ.get("RESOLVE_LOOKAHEAD", "10"))
+# Удалять импортированные контакты пачкой в конце кампании
+CONTACTS_CLEANUP = _truthy(os.environ.get("CONTACTS_CLEANUP", "0"))
+# Кэш entity (username/телефон → id + access_hash): срок жизни записи, сек (по умолчанию 7 дней)
+ENTITY_CACHE_TTL_SEC = float(os.environ.get("ENTITY_CACHE_TTL_SEC", str(7 * 24 * 3600)))
+# Как часто изменения кэша entity сбрасываются на диск, сек (и один раз при завершении)
+ENTITY_CACHE_FLUSH_SEC = float(os.environ.get("ENTITY_CACHE_FLUSH_SEC", "30"))
+# Кэш вердиктов validate_answer (вопрос + нормализованный ответ → valid): вкл/выкл, TTL, размер на диске и в памяти
+VERDICT_CACHE = _truthy(os.environ.get("VERDICT_CACHE", "1"))
+VERDICT_CACHE_TTL_SEC = float(os.environ.get("VERDICT_CACHE_TTL_SEC", str(30 * 24 * 3600)))
+VERDICT_CACHE_MAX_ENTRIES = int(os.environ.get("VERDICT_CACHE_MAX_ENTRIES", "100000"))
+VERDICT_CACHE_MEMORY_SIZE = int(os.environ.get("VERDICT_CACHE_MEMORY_SIZE", "5000"))
+# Пулы текстов LLM, не зависящих от кандидата: вариантов на вакансию, сколько вакансий помнить,
+# как часто (сек) обновлять сообщения «других вакансий нет»
+LLM_POOL_VARIANTS = int(os.environ.get("LLM_POOL_VARIANTS", "3"))
+VACANCY_QUESTION_CACHE_SIZE = int(os.environ.get("VACANCY_QUESTION_CACHE_SIZE", "1000"))
+NO_MORE_REFRESH_SEC = float(os.environ.get("NO_MORE_REFRESH_SEC", "3600"))
+
+# Очередь исходящих в Telegram (token bucket): запросов в секунду и «запас» на аккаунт
+SEND_GLOBAL_RATE = float(os.environ.get("SEND_GLOBAL_RATE", "5"))
+SEND_GLOBAL_BURST = float(os.environ.get("SEND_GLOBAL_BURST", "10"))
+# Лимит сообщений одному собеседнику
+SEND_PEER_RATE = float(os.environ.get("SEND_PEER_RATE", "1"))
+SEND_PEER_BURST = float(os.environ.get("SEND_PEER_BURST", "3"))
+# Сколько раз повторять запрос после FloodWait, прежде чем отдать ошибку вызывающему коду
+SEND_FLOOD_MAX_RETRIES = int(os.environ.get("SEND_FLOOD_MAX_RETRIES", "5"))
+# Окно склейки отметок о прочтении по одному чату, сек
+READ_ACK_WINDOW_SEC = float(os.environ.get("READ_ACK_WINDOW_SEC", "1.5"))
+# Сколько ждать отправки очереди исходящих при остановке, сек
+SHUTDOWN_DRAIN_SEC = float(os.environ.get("SHUTDOWN_DRAIN_SEC", "30"))
+# Периодическая запись метрик в лог, сек (0 — выключено)
+METRICS_LOG_INTERVAL_SEC = float(os.environ.get("METRICS_LOG_INTERVAL_SEC", "300"))
+# HTTP health endpoint (GET / → JSON со статусом и метриками), порт (0 — выключено)
+HEALTH_PORT = int(os.environ.get("HEALTH_PORT", "0"))
+# Сторож event loop: предупреждение, если loop был заблокирован дольше порога, мс (0 — выключено)
+LOOP_LAG_WARN_MS = float(os.environ.get("LOOP_LAG_WARN_MS", "200"))
+
+# Склейка серии сообщений кандидата в один ответ: пауза тишины (0 — не склеивать),
+# продление, пока кандидат печатает, и верхняя граница ожидания, сек
+INBOX_QUIET_SEC = float(os.environ.get("INBOX_QUIET_SEC", "2.5"))
+INBOX_TYPING_EXTEND_SEC = float(os.environ.get("INBOX_TYPING_EXTEND_SEC", "6"))
+INBOX_MAX_WAIT_SEC = float(os.environ.get("INBOX_MAX_WAIT_SEC", "20"))
+# Очередь обработки сообщений одного собеседника: максимум ожидающих и простой до остановки воркера, сек
+MAILBOX_MAXSIZE = int(os.environ.get("MAILBOX_MAXSIZE", "20"))
+MAILBOX_IDLE_SEC = float(os.environ.get("MAILBOX_IDLE_SEC", "60"))
+# Фоновая доставка результатов опроса (обычный режим): сколько доставок одновременно
+DELIVERY_WORKERS = int(os.environ.get("DELIVERY_WORKERS", "10"))
 
 
 # --- Базовые пути проекта ---
@@ -62,6 +162,8 @@ RESOURCE_DIR = BASE_DIR / "resource"
 GREETINGS_PATH = RESOURCE_DIR / "json" / "greetings.json"
 COMPANY_DATA_PATH = RESOURCE_DIR / "json" / "company_data.json"
 QUESTIONS_PATH = RESOURCE_DIR / "json" / "questions.json"
+# Регионы и города для локального разбора ответа про регион (short_extract)
+REGIONS_PATH = RESOURCE_DIR / "json" / "regions.json"
 
 # Результаты опросника
 RESULTS_BASE_DIR = BASE_DIR / "questionnaire_results"
@@ -70,6 +172,14 @@ RESULTS_TEXT_DIR = RESULTS_BASE_DIR / "text"
 # Журнал обработанных кандидатов
 PROCESSED_USERS_PATH = RESULTS_JSON_DIR / "processed_users.json"
 
+# Локальные кэши между перезапусками
+CACHE_DIR = BASE_DIR / os.environ.get("CACHE_DIR", "cache")
+ENTITY_CACHE_PATH = CACHE_DIR / "entities.json"
+# Незавершённые фоновые доставки результатов опроса (продолжаются после перезапуска)
+DELIVERY_JOBS_PATH = CACHE_DIR / "delivery_jobs.json"
+# Кэш вердиктов validate_answer (SQLite)
+VERDICT_CACHE_PATH = CACHE_DIR / "verdicts.sqlite3"
+
 # Результаты вакансий (CLI)
 VACANCY_RESULTS_DIR = BASE_DIR / "vacancies_results"
 
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+CLI: пересборка выжимок (short) по архиву questionnaire_results/json/*.json через OpenAI Batch API —
+например, после изменения промпта summarize_questionnaire. Анкеты читаются по одной, запросы пишутся
+в JSONL формата Batch API пачками по --chunk; все пакеты сначала отправляются, затем ожидаются вместе (Batch API
+обрабатывает их параллельно), результаты сливаются в short.json по мере готовности (повторный запуск ничего не портит).
+Прогресс хранится в cache/resummarize_batch.json: прерванный запуск продолжается с того же места,
+отправленные, но не забранные пакеты дожидаются. Смена промпта — пересборка заново.
+
+Запуск из корня проекта:
+  python resummarize_batch.py                       # Batch API (до 24 ч на пакет)
+  python resummarize_batch.py --mode local          # те же JSONL построчно в chat.completions
+                                                    # (OPENAI_BASE_URL — локальная заглушка для проверки)
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterator
+
+from config import CACHE_DIR, OPENAI_API_KEY, OPENAI_BASE_URL, RESULTS_JSON_DIR, setup_logging
+from src import openai_client, questionnaire, resilience
+
+setup_logging()
+
+STATE_PATH = CACHE_DIR / "resummarize_batch.json"
+BATCH_ENDPOINT = "/v1/chat/completions"
+# Служебные файлы в каталоге результатов — не анкеты
+_NOT_RESULTS = {"short.json", "processed_users.json", "vacancy_dialogues.json"}
+# Суффикс имени файла анкеты: <user>_YYYY_mm_dd_HH_MM.json
+_TS_RE = re.compile(r"_(\d{4})_(\d{2})_(\d{2})_(\d{2})_(\d{2})$")
+_TERMINAL = {"completed", "failed", "expired", "cancelled"}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Пакетная пересборка выжимок short по архиву анкет (OpenAI Batch API или локальная заглушка)."
+    )
+    parser.add_argument("--mode", choices=("batch", "local"), default="batch",
+                        help="batch — Batch API; local — те же запросы построчно в chat.completions.")
+    parser.add_argument("--chunk", type=int, default=1000, help="Запросов в одном пакете (JSONL).")
+    parser.add_argument("--concurrency", type=int, default=8, help="Одновременных запросов в режиме local.")
+    parser.add_argument("--poll", type=float, default=30.0, help="Интервал опроса статуса пакета, сек.")
+    parser.add_argument("--limit", type=int, default=0, help="Обработать не больше N анкет (0 — все).")
+    parser.add_argument("--force", action="store_true", help="Начать заново, игнорируя сохранённый прогресс.")
+    return parser.parse_args()
+
+
+def _prompt_hash() -> str:
+    """Отпечаток промпта и схемы: при их изменении прежний прогресс недействителен."""
+    body = openai_client.summarize_request({})
+    body["messages"] = body["messages"][:1]
+    return hashlib.sha1(json.dumps(body, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def _load_state(prompt: str, force: bool) -> dict[str, Any]:
+    state: dict[str, Any] = {}
+    if STATE_PATH.exists() and not force:
+        with open(STATE_PATH, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    if state.get("prompt") != prompt:
+        if state:
+            print("Промпт выжимки изменился — пересборка с начала.")
+        state = {"prompt": prompt, "done": [], "batches": []}
+    return state
+
+
+def _save_state(state: dict[str, Any]) -> None:
+    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE_PATH.with_suffix(".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    tmp.replace(STATE_PATH)
+
+
+def _archive_paths() -> list[Path]:
+    return sorted(
+        p for p in RESULTS_JSON_DIR.glob("*.json")
+        if p.name not in _NOT_RESULTS and not p.name.startswith("short_")
+    )
+
+
+def _load_result(path: Path) -> dict[str, Any] | None:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) and "questions" in data else None
+
+
+def _iter_results(paths: list[Path], skip: set[str]) -> Iterator[tuple[str, dict[str, Any]]]:
+    """(custom_id = имя файла без .json, анкета) — по одной, без загрузки архива целиком."""
+    for path in paths:
+        if path.stem in skip:
+            continue
+        result = _load_result(path)
+        if result is not None:
+            yield path.stem, result
+
+
+def _store_key(custom_id: str, result: dict[str, Any]) -> str:
+    """Ключ short.json для анкеты: время из имени файла (как при сохранении), иначе поле date."""
+    m = _TS_RE.search(custom_id)
+    if m:
+        when = datetime(*(int(x) for x in m.groups()))
+    else:
+        when = datetime.fromisoformat(result["date"])
+    return questionnaire.short_store_key(result.get("user") or "unknown", when)
+
+
+def _write_jsonl(path: Path, chunk: list[tuple[str, dict[str, Any]]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for custom_id, result in chunk:
+            line = {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": openai_client.summarize_request(result),
+            }
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+
+def _parse_output(text: str) -> tuple[dict[str, dict[str, Any]], int]:
+    """Строки выхода Batch API → ({custom_id: short}, число ошибок)."""
+    shorts: dict[str, dict[str, Any]] = {}
+    failed = 0
+    for raw in text.splitlines():
+        if not raw.strip():
+            continue
+        line = json.loads(raw)
+        response = line.get("response") or {}
+        try:
+            if response.get("status_code") != 200:
+                raise ValueError(line.get("error") or response.get("status_code"))
+            tool_calls = response["body"]["choices"][0]["message"]["tool_calls"]
+            args = json.loads(tool_calls[0]["function"]["arguments"])
+        except Exception as e:
+            print(f"  {line.get('custom_id')}: ошибка ответа: {e}")
+            failed += 1
+            continue
+        shorts[line["custom_id"]] = openai_client.parse_brief(args)
+    return shorts, failed
+
+
+def _merge(state: dict[str, Any], shorts: dict[str, dict[str, Any]]) -> int:
+    entries = {}
+    for custom_id, short in shorts.items():
+        result = _load_result(RESULTS_JSON_DIR / f"{custom_id}.json")
+        # Без username запись в short.json шла под телефоном, которого в анкете нет — такие не трогаем
+        if result is not None and result.get("user") not in (None, "", "unknown"):
+            entries[_store_key(custom_id, result)] = short
+    changed = questionnaire.merge_short_store(entries)
+    done = set(state["done"])
+    done.update(shorts)
+    state["done"] = sorted(done)
+    _save_state(state)
+    return changed
+
+
+async def _run_local(path: Path, concurrency: int) -> str:
+    """Локальная замена Batch API: каждую строку JSONL — в chat.completions, ответы в формате выхода Batch API."""
+    client = openai_client.get_client()
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def _one(line: dict[str, Any]) -> str:
+        async with sem:
+            try:
+                # Повторы 429/5xx и предохранитель — как у вызовов бота
+                resp = await resilience.call(
+                    "resummarize_batch", lambda: client.chat.completions.create(**line["body"])
+                )
+                response = {"status_code": 200, "body": resp.model_dump()}
+                error = None
+            except Exception as e:
+                response = {"status_code": getattr(e, "status_code", 500), "body": {}}
+                error = {"message": str(e)}
+        return json.dumps({"custom_id": line["custom_id"], "response": response, "error": error}, ensure_ascii=False)
+
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [json.loads(raw) for raw in f if raw.strip()]
+    return "\n".join(await asyncio.gather(*(_one(line) for line in lines)))
+
+
+async def _submit_batch(path: Path) -> str:
+    client = openai_client.get_client()
+    uploaded = await client.files.create(file=path, purpose="batch")
+    batch = await client.batches.create(
+        input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT, completion_window="24h"
+    )
+    return batch.id
+
+
+async def _collect_batch(batch_id: str, poll: float) -> str:
+    """Дождаться пакета и вернуть его выход (JSONL); ошибки отдельных запросов — тоже в выходе."""
+    client = openai_client.get_client()
+    while True:
+        batch = await client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        if counts is not None:
+            print(f"  пакет {batch_id}: {batch.status}, {counts.completed}/{counts.total} (ошибок {counts.failed})")
+        if batch.status in _TERMINAL:
+            break
+        await asyncio.sleep(poll)
+    parts = []
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if file_id:
+            parts.append((await client.files.content(file_id)).text)
+    return "\n".join(parts)
+
+
+def _chunks(items: Iterator[tuple[str, dict[str, Any]]], size: int, limit: int) -> Iterator[list]:
+    chunk: list[tuple[str, dict[str, Any]]] = []
+    for n, item in enumerate(items):
+        if limit and n >= limit:
+            break
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def main() -> None:
+    args = parse_args()
+    if not OPENAI_API_KEY and not OPENAI_BASE_URL:
+        print("Не задан OPENAI_API_KEY (или OPENAI_BASE_URL).")
+        return
+    state = _load_state(_prompt_hash(), args.force)
+    paths = _archive_paths()
+    totals = {"ok": 0, "failed": 0, "changed": 0}
+    started = time.monotonic()
+
+    def _collected(output: str) -> None:
+        shorts, failed = _parse_output(output)
+        changed = _merge(state, shorts)
+        totals["ok"] += len(shorts)
+        totals["failed"] += failed
+        totals["changed"] += changed
+        elapsed = time.monotonic() - started
+        print(
+            f"Готово {len(state['done'])}/{len(paths)}: +{len(shorts)}, ошибок {failed}, "
+            f"изменено в short.json {changed}; {totals['ok'] / elapsed if elapsed else 0:.1f} анкет/с"
+        )
+
+    async def _finish(batch_id: str) -> None:
+        _collected(await _collect_batch(batch_id, args.poll))
+        state["batches"].remove(batch_id)
+        _save_state(state)
+
+    # Пакеты, отправленные прошлым запуском, но не забранные (их анкеты ещё не в done — забираем до новой отправки)
+    if state["batches"]:
+        print(f"Продолжаю пакеты: {', '.join(state['batches'])}")
+        await asyncio.gather(*(_finish(batch_id) for batch_id in list(state["batches"])))
+
+    results = _iter_results(paths, set(state["done"]))
+    submitted: list[str] = []
+    for n, chunk in enumerate(_chunks(results, max(1, args.chunk), args.limit)):
+        jsonl = CACHE_DIR / f"resummarize_{int(time.time())}_{n}.jsonl"
+        _write_jsonl(jsonl, chunk)
+        if args.mode == "local":
+            _collected(await _run_local(jsonl, args.concurrency))
+        else:
+            batch_id = await _submit_batch(jsonl)
+            state["batches"].append(batch_id)
+            _save_state(state)
+            submitted.append(batch_id)
+            print(f"Отправлен пакет {batch_id}: {len(chunk)} анкет")
+        jsonl.unlink(missing_ok=True)
+    # Все пакеты уже в очереди Batch API — ждём их вместе, а не по одному
+    await asyncio.gather(*(_finish(batch_id) for batch_id in submitted))
+
+    await openai_client.close_client()
+    print(
+        f"Итого: выжимок {totals['ok']}, ошибок {totals['failed']}, изменено записей short.json {totals['changed']}, "
+        f"за {time.monotonic() - started:.1f} с"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,159 @@
+"""
+Пул userbot-аккаунтов в одном процессе: распределение кандидатов по аккаунтам
+консистентным хешированием, «липкость» диалога к аккаунту, обход аккаунтов в FloodWait/PeerFlood.
+"""
+
+from __future__ import annotations
+
+import bisect
+import hashlib
+import logging
+import time
+from typing import Any, Optional
+
+from config import (
+    TG_ACCOUNTS,
+    TG_PHONE,
+    ACCOUNT_VNODES,
+    ACCOUNT_PEER_FLOOD_COOLDOWN_SEC,
+    ENTITY_CACHE_PATH,
+)
+from . import metrics, send_queue
+from .entity_cache import EntityCache
+from .peer_resolver import PeerResolver
+from .presence import PresenceManager
+
+log = logging.getLogger("userbot")
+
+DEFAULT_SESSION_NAME = "userbot_session"
+
+
+def parse_accounts(raw: str = TG_ACCOUNTS) -> list[tuple[str, str]]:
+    """
+    Список (session_name, phone) из TG_ACCOUNTS вида "session1:+7900...,session2:+7901...".
+    Пусто — один аккаунт по умолчанию (userbot_session, TG_PHONE).
+    """
+    accounts: list[tuple[str, str]] = []
+    for item in (raw or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        session, _, phone = item.partition(":")
+        accounts.append((session.strip(), phone.strip()))
+    return accounts or [(DEFAULT_SESSION_NAME, TG_PHONE)]
+
+
+def _hash(value: str) -> int:
+    return int(hashlib.md5(value.encode("utf-8")).hexdigest()[:16], 16)
+
+
+class Account:
+    """Аккаунт пула: клиент Telethon и всё, что привязано к access_hash/статусу этого аккаунта."""
+
+    def __init__(self, name: str, phone: str, client: Any, primary: bool = False) -> None:
+        self.name = name
+        self.phone = phone
+        self.client = client
+        # access_hash зависит от аккаунта — у каждого свой кэш entity (прогревается с диска при старте)
+        cache_path = ENTITY_CACHE_PATH if primary else ENTITY_CACHE_PATH.with_name(
+            f"{ENTITY_CACHE_PATH.stem}_{name}{ENTITY_CACHE_PATH.suffix}"
+        )
+        self.peer_cache = EntityCache(cache_path)
+        # Свои же резолвер кандидатов (импорт контактов идёт в контакты этого аккаунта)
+        # и «В сети» по числу активных диалогов со склейкой отметок о прочтении
+        self.resolver = PeerResolver(client, cache=self.peer_cache)
+        self.presence = PresenceManager(client)
+        self.peer_flood_until = 0.0
+        self.started = 0
+        self.failed = 0
+        self.active: set[int] = set()
+
+    @property
+    def flood_wait_sec(self) -> float:
+        return send_queue.get_queue().paused_for(self.client)
+
+    @property
+    def available(self) -> bool:
+        """Можно ли начинать с аккаунта новые диалоги (нет FloodWait и PeerFlood)."""
+        return self.flood_wait_sec <= 0 and time.monotonic() >= self.peer_flood_until
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "started": self.started,
+            "failed": self.failed,
+            "active": len(self.active),
+            "flood_wait_sec": round(self.flood_wait_sec, 1),
+            "peer_flood_sec": round(max(self.peer_flood_until - time.monotonic(), 0.0), 1),
+        }
+
+
+class AccountPool:
+    """Кольцо консистентного хеширования по аккаунтам + липкие назначения ключ/user_id → аккаунт."""
+
+    def __init__(self, accounts: list[Account], vnodes: int = ACCOUNT_VNODES) -> None:
+        if not accounts:
+            raise ValueError("пул аккаунтов пуст")
+        self.accounts = accounts
+        self._by_name = {a.name: a for a in accounts}
+        self._by_client = {id(a.client): a for a in accounts}
+        self._ring: list[tuple[int, str]] = sorted(
+            (_hash(f"{a.name}#{i}"), a.name) for a in accounts for i in range(max(1, vnodes))
+        )
+        self._ring_keys = [h for h, _ in self._ring]
+        self._sticky: dict[Any, Account] = {}
+
+    @property
+    def primary(self) -> Account:
+        return self.accounts[0]
+
+    def for_client(self, client: Any) -> Account:
+        return self._by_client.get(id(client), self.primary)
+
+    def by_name(self, name: str) -> Optional[Account]:
+        return self._by_name.get(name)
+
+    def route(self, key: str, exclude: set[str] | None = None) -> Account:
+        """Аккаунт для ключа по кольцу; недоступные и исключённые аккаунты пропускаются."""
+        exclude = exclude or set()
+        start = bisect.bisect(self._ring_keys, _hash(key)) % len(self._ring)
+        fallback: Optional[Account] = None
+        for i in range(len(self._ring)):
+            acc = self._by_name[self._ring[(start + i) % len(self._ring)][1]]
+            if acc.name in exclude:
+                continue
+            if acc.available:
+                return acc
+            fallback = fallback or acc
+        # Все аккаунты в ограничении — берём ближайший по кольцу, очередь отправок дождётся окончания паузы
+        return fallback or self.primary
+
+    def assign(self, key: str, user_id: int, account: Account) -> None:
+        """Закрепить диалог с кандидатом за аккаунтом."""
+        self._sticky[key] = account
+        self._sticky[user_id] = account
+        account.active.add(user_id)
+        account.started += 1
+        metrics.inc("account_started", account=account.name)
+        metrics.set_gauge("account_active", len(account.active), account=account.name)
+
+    def account_for(self, key: Any) -> Optional[Account]:
+        return self._sticky.get(key)
+
+    def release(self, user_id: int) -> None:
+        acc = self._sticky.get(user_id)
+        if acc is not None:
+            acc.active.discard(user_id)
+            metrics.set_gauge("account_active", len(acc.active), account=acc.name)
+
+    def mark_failed(self, account: Account) -> None:
+        account.failed += 1
+        metrics.inc("account_failed", account=account.name)
+
+    def mark_peer_flood(self, account: Account, seconds: float = ACCOUNT_PEER_FLOOD_COOLDOWN_SEC) -> None:
+        """PeerFlood: аккаунт временно не используется для новых диалогов."""
+        account.peer_flood_until = time.monotonic() + seconds
+        metrics.inc("account_peer_flood", account=account.name)
+        log.warning("PeerFlood на аккаунте %s: новые диалоги переносятся на другие аккаунты", account.name)
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {a.name: a.stats() for a in self.accounts}
@@ -0,0 +1,203 @@
+"""
+Планировщик кампании (обычный режим): держит до N опросов кандидатов одновременно
+и запускает следующего кандидата, как только освобождается слот. Кандидат, не отвечающий
+дольше таймаута, освобождает слот без зачёта в завершённые (watch_idle → abandon).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from . import metrics
+
+# Запуск кандидата: принимает запись {"username", "phone"}, возвращает user_id при успехе или None
+StartCandidate = Callable[[dict[str, Optional[str]]], Awaitable[Optional[int]]]
+# Кандидат снят по таймауту молчания: user_id и его запись
+OnIdle = Callable[[int, dict[str, Any]], Awaitable[None]]
+
+
+class CampaignScheduler:
+    """
+    Очередь кандидатов + пул активных опросов.
+    Активные опросы адресуются по user_id (тот же ключ, что и questionnaire._state).
+    """
+
+    def __init__(
+        self,
+        candidates: list[dict[str, Optional[str]]],
+        start_candidate: StartCandidate,
+        concurrency: int = 1,
+        logger: logging.Logger | None = None,
+    ) -> None:
+        self._pending = list(candidates)
+        self._next_idx = 0
+        self._start_candidate = start_candidate
+        self.concurrency = max(1, int(concurrency))
+        self._log = logger or logging.getLogger("userbot")
+        self._lock = asyncio.Lock()
+        # user_id -> запись кандидата
+        self.active: dict[int, dict[str, Any]] = {}
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        # Сняты без результата (таймаут молчания): в completed и пропускную способность не входят
+        self.abandoned = 0
+        self._started_at: float | None = None
+        # Кандидаты, выбранные fill(), чьё приветствие ещё отправляется (слот уже занят)
+        self._starting = 0
+        # Фоновые дозаполнения (ссылки, чтобы задачи не собрал GC)
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def remaining(self) -> int:
+        """Сколько кандидатов ещё не запускалось."""
+        return len(self._pending) - self._next_idx
+
+    @property
+    def exhausted(self) -> bool:
+        """Кандидаты закончились и активных опросов нет."""
+        return self.remaining == 0 and not self.active
+
+    def upcoming(self, count: int) -> list[dict[str, Optional[str]]]:
+        """Следующие count кандидатов, которые ещё не запускались (для упреждающего резолва)."""
+        return self._pending[self._next_idx : self._next_idx + max(0, count)]
+
+    def is_active(self, user_id: int) -> bool:
+        return user_id in self.active
+
+    def entry_for(self, user_id: int) -> dict[str, Any] | None:
+        return self.active.get(user_id)
+
+    async def _launch(self, entry: dict[str, Optional[str]]) -> bool:
+        try:
+            user_id = await self._start_candidate(entry)
+        except Exception as e:
+            self._log.exception("Запуск кандидата %s упал: %s", entry, e)
+            user_id = None
+        finally:
+            self._starting -= 1
+        if user_id is None:
+            self.failed += 1
+            metrics.inc("campaign_failed")
+            return False
+        if user_id in self.active:
+            self._log.warning("Кандидат user_id=%s уже в работе, пропуск дубля", user_id)
+            return False
+        now = time.monotonic()
+        self.active[user_id] = dict(entry, started=now, last_seen=now)
+        self.started += 1
+        metrics.inc("campaign_started")
+        metrics.set_gauge("campaign_active", len(self.active))
+        return True
+
+    async def fill(self) -> int:
+        """
+        Запустить кандидатов, пока есть свободные слоты. Возвращает число запущенных.
+        Под блокировкой только выбираются кандидаты; приветствия (очередь отправки, FloodWait) идут без неё.
+        """
+        launched = 0
+        while True:
+            async with self._lock:
+                if self._started_at is None:
+                    self._started_at = time.monotonic()
+                free = self.concurrency - len(self.active) - self._starting
+                batch = self._pending[self._next_idx : self._next_idx + max(0, free)]
+                self._next_idx += len(batch)
+                self._starting += len(batch)
+            if not batch:
+                break
+            # Неудачный запуск освобождает слот — следующий круг возьмёт очередного кандидата
+            launched += sum(await asyncio.gather(*(self._launch(entry) for entry in batch)))
+        metrics.set_gauge("campaign_active", len(self.active))
+        return launched
+
+    def schedule_fill(self) -> None:
+        """fill() фоновой задачей: вызывающий (например, обработчик сообщения кандидата) не ждёт приветствий."""
+        task = asyncio.get_running_loop().create_task(self.fill())
+        self._tasks.add(task)
+        task.add_done_callback(self._fill_done)
+
+    def _fill_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self._log.error("Дозаполнение кампании упало: %s", task.exception())
+
+    def touch(self, user_id: int) -> None:
+        """Кандидат ответил — сбросить его таймаут молчания."""
+        entry = self.active.get(user_id)
+        if entry is not None:
+            entry["last_seen"] = time.monotonic()
+
+    async def complete(self, user_id: int) -> dict[str, Any] | None:
+        """Освободить слот кандидата и дозаполнить пул в фоне. Возвращает запись кандидата (если была)."""
+        entry = self.active.pop(user_id, None)
+        if entry is not None:
+            self.completed += 1
+            metrics.inc("campaign_completed")
+            metrics.observe("campaign_candidate_sec", time.monotonic() - entry["started"])
+        metrics.set_gauge("campaign_active", len(self.active))
+        metrics.set_gauge("campaign_per_hour", self.throughput_per_hour())
+        self._log.info("Кампания: %s", self.stats())
+        print(
+            f"Кампания: завершено {self.completed}, в работе {len(self.active)}, "
+            f"осталось {self.remaining}, {self.throughput_per_hour():.1f} канд./час."
+        )
+        self.schedule_fill()
+        return entry
+
+    async def abandon(self, user_id: int) -> dict[str, Any] | None:
+        """Освободить слот кандидата без результата (не завершение) и дозаполнить пул в фоне."""
+        entry = self.active.pop(user_id, None)
+        if entry is not None:
+            self.abandoned += 1
+            metrics.inc("campaign_abandoned")
+        metrics.set_gauge("campaign_active", len(self.active))
+        self._log.info("Кампания: %s", self.stats())
+        self.schedule_fill()
+        return entry
+
+    async def expire_idle(self, timeout_sec: float, on_idle: OnIdle | None = None) -> list[int]:
+        """Снять кандидатов, молчащих дольше timeout_sec (abandon + on_idle). Возвращает их user_id."""
+        now = time.monotonic()
+        idle = [uid for uid, e in self.active.items() if now - e["last_seen"] >= timeout_sec]
+        for user_id in idle:
+            self._log.info("Кандидат user_id=%s не отвечает %.0f с — слот освобождён", user_id, timeout_sec)
+            metrics.inc("campaign_idle_timeout")
+            entry = await self.abandon(user_id)
+            if on_idle is not None and entry is not None:
+                try:
+                    await on_idle(user_id, entry)
+                except Exception as e:
+                    self._log.exception("Обработка молчащего кандидата %s упала: %s", user_id, e)
+        return idle
+
+    async def watch_idle(self, timeout_sec: float, on_idle: OnIdle | None = None) -> None:
+        """Фоновый сервис: периодически снимать молчащих кандидатов (expire_idle)."""
+        interval = max(1.0, min(60.0, timeout_sec / 4))
+        while True:
+            await asyncio.sleep(interval)
+            await self.expire_idle(timeout_sec, on_idle)
+
+    def throughput_per_hour(self) -> float:
+        """Пропускная способность: завершённые опросы в час с начала кампании."""
+        if self._started_at is None:
+            return 0.0
+        elapsed = time.monotonic() - self._started_at
+        if elapsed <= 0:
+            return 0.0
+        return self.completed * 3600.0 / elapsed
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "active": len(self.active),
+            "remaining": self.remaining,
+            "started": self.started,
+            "completed": self.completed,
+            "failed": self.failed,
+            "abandoned": self.abandoned,
+            "per_hour": round(self.throughput_per_hour(), 2),
+        }
@@ -0,0 +1,168 @@
+"""
+Фоновая доставка результатов опроса (обычный режим): summary → вакансии → HR → кандидат → диалог.
+Опрос следующего кандидата не ждёт доставки предыдущему; незавершённые доставки хранятся на диске
+и продолжаются после перезапуска с того этапа, на котором остановились.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from config import DELIVERY_WORKERS, DELIVERY_JOBS_PATH
+from . import metrics, questionnaire
+
+log = logging.getLogger("userbot")
+
+# account name -> клиент Telethon (None — аккаунт больше не в пуле)
+ClientLookup = Callable[[str], Any]
+OnDone = Callable[[dict[str, Any]], Awaitable[None]]
+
+
+class DeliveryPipeline:
+    """
+    submit(ctx, account) ставит доставку в очередь и сразу возвращается.
+    Работает не больше workers доставок одновременно; после каждого этапа задание сохраняется в path.
+    JSON каждого задания (с вакансиями — десятки КБ) кодируется только при его изменении; файл собирается
+    из готовых кусков и пишется в потоке через временный файл и rename.
+    on_done(job) вызывается после последнего этапа (например, чтобы снять «В сети»).
+    """
+
+    def __init__(
+        self,
+        client_for: ClientLookup,
+        workers: int = DELIVERY_WORKERS,
+        path: Path = DELIVERY_JOBS_PATH,
+        on_done: Optional[OnDone] = None,
+    ) -> None:
+        self._client_for = client_for
+        self._workers_count = max(1, int(workers))
+        self.path = path
+        self._on_done = on_done
+        self._jobs: dict[str, dict[str, Any]] = {}
+        # job_id -> JSON задания на момент последнего изменения
+        self._encoded: dict[str, str] = {}
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._workers: list[asyncio.Task] = []
+        self._save_lock = asyncio.Lock()
+        self.completed = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._jobs)
+
+    def _write(self, items: list[tuple[str, str]]) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write("{" + ", ".join(f"{json.dumps(job_id)}: {data}" for job_id, data in items) + "}")
+            tmp.replace(self.path)
+        except Exception as e:
+            log.exception("Save delivery jobs failed: %s", e)
+
+    def _encode(self, job_id: str) -> None:
+        job = self._jobs.get(job_id)
+        if job is None:
+            self._encoded.pop(job_id, None)
+        else:
+            self._encoded[job_id] = json.dumps(job, ensure_ascii=False, default=str)
+
+    async def _save(self, job_id: Optional[str] = None) -> None:
+        """Сохранить задания; job_id — изменившееся задание (перекодируется только оно)."""
+        if job_id is not None:
+            self._encode(job_id)
+        # Снимок — на loop (этапы меняют ctx только здесь), запись — в потоке; замок держит порядок снимков
+        items = list(self._encoded.items())
+        async with self._save_lock:
+            await asyncio.to_thread(self._write, items)
+
+    def start(self) -> int:
+        """Запустить воркеры и поставить в очередь незавершённые доставки с диска. Возвращает их число."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f) or {}
+        except FileNotFoundError:
+            saved = {}
+        except Exception as e:
+            log.exception("Load delivery jobs failed: %s", e)
+            saved = {}
+        for job_id, job in saved.items():
+            # Упреждающие загрузки вакансий прошлого процесса не существуют; ключ фильтра общий у кандидатов
+            job["ctx"]["prefetch_key"] = None
+            self._jobs[job_id] = job
+            self._encode(job_id)
+            self._queue.put_nowait(job_id)
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._run()) for _ in range(self._workers_count)]
+        metrics.set_gauge("delivery_pending", len(self._jobs))
+        if saved:
+            log.info("Доставка: продолжаем %s незавершённых после перезапуска", len(saved))
+        return len(saved)
+
+    async def submit(self, ctx: dict[str, Any], account: str) -> str:
+        job_id = uuid.uuid4().hex
+        self._jobs[job_id] = {"ctx": ctx, "account": account, "stage": 0, "created": time.time()}
+        await self._save(job_id)
+        self._queue.put_nowait(job_id)
+        metrics.inc("delivery_submitted")
+        metrics.set_gauge("delivery_pending", len(self._jobs))
+        return job_id
+
+    async def _run(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process(job_id)
+            except Exception:
+                log.exception("Delivery job %s failed", job_id)
+                metrics.inc("delivery_failed")
+                await self._finish(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job_id: str) -> None:
+        job = self._jobs[job_id]
+        client = self._client_for(job["account"])
+        if client is None:
+            log.warning("Доставка %s: аккаунт %s недоступен, задание отброшено", job_id, job["account"])
+            metrics.inc("delivery_failed")
+            await self._finish(job_id)
+            return
+        stages = questionnaire.DELIVERY_STAGES
+        while job["stage"] < len(stages):
+            stage = stages[job["stage"]]
+            started = time.monotonic()
+            await questionnaire.run_delivery_stage(stage, job["ctx"], client)
+            metrics.observe("delivery_stage_sec", time.monotonic() - started, stage=stage)
+            job["stage"] += 1
+            await self._save(job_id)
+        metrics.observe("delivery_total_sec", time.time() - job["created"])
+        metrics.inc("delivery_completed")
+        self.completed += 1
+        await self._finish(job_id)
+        if self._on_done is not None:
+            await self._on_done(job)
+
+    async def _finish(self, job_id: str) -> None:
+        job = self._jobs.pop(job_id, None)
+        if job is not None:
+            questionnaire.release_delivery_context(job["ctx"])
+        await self._save(job_id)
+        metrics.set_gauge("delivery_pending", len(self._jobs))
+
+    async def close(self) -> None:
+        """Остановить воркеры; незавершённые доставки остаются на диске до следующего запуска."""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await self._save()
+
+    def stats(self) -> dict[str, Any]:
+        return {"pending": len(self._jobs), "queued": self._queue.qsize(), "completed": self.completed}
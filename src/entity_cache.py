@@ -0,0 +1,151 @@
+"""
+Постоянный кэш entity собеседников: нормализованный @username / телефон → user id + access_hash.
+Хранится в JSON между перезапусками, чтобы повторная кампания не тратила ResolveUsername.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from telethon import types
+
+from config import ENTITY_CACHE_FLUSH_SEC, ENTITY_CACHE_PATH, ENTITY_CACHE_TTL_SEC
+from .candidates_utils import _normalize_phone
+
+log = logging.getLogger("userbot")
+
+
+def username_key(username: Optional[str]) -> Optional[str]:
+    """Ключ по username: "u:@name" в нижнем регистре (формат как у _prepare_candidate_entry)."""
+    u = (username or "").strip().lstrip("@").lower()
+    return f"u:@{u}" if u else None
+
+
+def phone_key(phone: Optional[str]) -> Optional[str]:
+    """Ключ по телефону: "p:+7..." после _normalize_phone."""
+    p = _normalize_phone(phone)
+    return f"p:{p}" if p else None
+
+
+def peer_key(peer: Any) -> Optional[str]:
+    """Ключ для строки из списка кандидатов или команды: телефон, если похоже на номер, иначе username."""
+    if not isinstance(peer, str):
+        return None
+    s = peer.strip()
+    if s.startswith("+") or s.replace(" ", "").replace("-", "").isdigit():
+        return phone_key(s)
+    return username_key(s)
+
+
+class EntityCache:
+    """
+    Кэш id + access_hash с TTL; загружается при старте (warm). put() только помечает кэш изменённым,
+    на диск он пишется в потоке: периодически (autosave) и при завершении (flush).
+    """
+
+    def __init__(self, path: Path = ENTITY_CACHE_PATH, ttl_sec: float = ENTITY_CACHE_TTL_SEC) -> None:
+        self.path = Path(path)
+        self.ttl_sec = ttl_sec
+        self._data: dict[str, dict[str, Any]] = {}
+        self._dirty = False
+        # Запись из потока autosave, отменённого при завершении, может пересечься с финальным flush
+        self._write_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self) -> int:
+        """Прочитать кэш с диска, отбросив просроченные записи. Возвращает число записей."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except Exception as e:
+            log.exception("Load entity cache failed: %s", e)
+            return 0
+        now = time.time()
+        self._data = {
+            k: v for k, v in (raw or {}).items()
+            if isinstance(v, dict) and now - float(v.get("ts", 0)) < self.ttl_sec
+        }
+        return len(self._data)
+
+    def save(self, data: Optional[dict[str, dict[str, Any]]] = None) -> bool:
+        """Записать кэш (или его снимок data) на диск синхронно. Возвращает успех."""
+        with self._write_lock:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_suffix(".tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self._data if data is None else data, f, ensure_ascii=False)
+                tmp.replace(self.path)
+                return True
+            except Exception as e:
+                log.exception("Save entity cache failed: %s", e)
+                return False
+
+    async def flush(self) -> None:
+        """Если были изменения — записать снимок кэша в потоке (asyncio.to_thread)."""
+        if not self._dirty:
+            return
+        self._dirty = False
+        # Записи не меняются после put — достаточно поверхностной копии
+        if not await asyncio.to_thread(self.save, dict(self._data)):
+            self._dirty = True
+
+    async def autosave(self, interval_sec: float = ENTITY_CACHE_FLUSH_SEC) -> None:
+        """Фоновый сервис: раз в interval_sec сбрасывать изменения на диск."""
+        while True:
+            await asyncio.sleep(interval_sec)
+            await self.flush()
+
+    def get(self, key: Optional[str]) -> Optional[types.User]:
+        """User с id/access_hash/username из кэша или None (нет/просрочено)."""
+        rec = self._data.get(key) if key else None
+        if rec is None or time.time() - float(rec.get("ts", 0)) >= self.ttl_sec:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return types.User(
+            id=rec["id"],
+            access_hash=rec["access_hash"],
+            username=rec.get("username"),
+            first_name=rec.get("first_name"),
+        )
+
+    def put(self, entity: Any, *, username: Optional[str] = None, phone: Optional[str] = None) -> None:
+        """Запомнить entity под ключами его username, переданного username и телефона."""
+        access_hash = getattr(entity, "access_hash", None)
+        uid = getattr(entity, "id", None)
+        if access_hash is None or not isinstance(uid, int):
+            return
+        rec = {
+            "id": uid,
+            "access_hash": access_hash,
+            "username": getattr(entity, "username", None),
+            "first_name": getattr(entity, "first_name", None),
+            "ts": time.time(),
+        }
+        keys = {username_key(rec["username"]), username_key(username), phone_key(phone)}
+        for key in keys - {None}:
+            self._data[key] = rec
+        self._dirty = True
+
+    async def resolve(self, client: Any, peer: Any) -> Any:
+        """Entity по @username/телефону: сначала кэш, иначе client.get_entity с записью в кэш."""
+        key = peer_key(peer)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        entity = await client.get_entity(peer)
+        if key and key.startswith("p:"):
+            self.put(entity, phone=peer)
+        else:
+            self.put(entity, username=peer if isinstance(peer, str) else None)
+        return entity
@@ -0,0 +1,72 @@
+"""
+Фоновые сервисы наблюдаемости: периодическая запись метрик в лог,
+сторож задержки event loop и минимальный HTTP health endpoint (GET → JSON со статусом, метриками и очередью отправки).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+
+from . import metrics, send_queue
+
+log = logging.getLogger("userbot")
+
+
+async def log_metrics_periodically(interval_sec: float) -> None:
+    """Раз в interval_sec писать снимок метрик в лог."""
+    while True:
+        await asyncio.sleep(interval_sec)
+        metrics.log_snapshot(log)
+
+
+async def watch_loop_lag(threshold_ms: float, interval_sec: float = 0.25) -> None:
+    """
+    Сторож event loop: если sleep(interval_sec) проснулся позже на threshold_ms и больше —
+    что-то выполнялось синхронно (блокирующий HTTP, файловый I/O) и замораживало все диалоги.
+    Задержка пишется в метрики (loop_lag_ms), превышение — в лог с текущими задачами.
+    """
+    while True:
+        started = time.monotonic()
+        await asyncio.sleep(interval_sec)
+        lag_ms = (time.monotonic() - started - interval_sec) * 1000
+        metrics.observe("loop_lag_ms", lag_ms)
+        if lag_ms >= threshold_ms:
+            metrics.inc("loop_lag_exceeded")
+            tasks = sorted(
+                t.get_coro().__qualname__ for t in asyncio.all_tasks() if t is not asyncio.current_task()
+            )
+            log.warning("Event loop заблокирован на %.0f мс (порог %s мс); задачи: %s", lag_ms, threshold_ms, tasks)
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        # Нам не важен путь и заголовки — читаем до конца заголовков и отвечаем
+        await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+        body = json.dumps(
+            {"status": "ok", "send_queue": send_queue.stats(), "metrics": metrics.snapshot()},
+            ensure_ascii=False,
+            default=str,
+        ).encode("utf-8")
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/json; charset=utf-8\r\n"
+            + f"Content-Length: {len(body)}\r\n".encode("ascii")
+            + b"Connection: close\r\n\r\n"
+            + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_health(port: int, host: str = "127.0.0.1") -> None:
+    """HTTP health endpoint на host:port; работает до отмены задачи."""
+    server = await asyncio.start_server(_handle, host, port)
+    log.info("Health endpoint: http://%s:%s/", host, port)
+    async with server:
+        await server.serve_forever()
@@ -4,9 +4,7 @@
 
 import asyncio
 import random
-
-from telethon import functions
-from telethon.tl.types import SendMessageTypingAction
+import time
 
 from config import (
     TOGGLE_DELAY,
@@ -15,9 +13,11 @@ from config import (
     THINK_DELAY_MAX,
     HUMAN_DELAY_MAX_TYPING_SEC,
 )
+from . import metrics
+from .typing_scheduler import TYPING_ACTION_INTERVAL_SEC, get_scheduler
 
-# Telegram сбрасывает индикатор «печатает» примерно через 5 сек — повторяем в цикле
-TYPING_ACTION_INTERVAL_SEC = 5
+# На сколько продлевать «печатает» при каждом фрагменте потокового ответа LLM
+STREAM_TYPING_EXTEND_SEC = TYPING_ACTION_INTERVAL_SEC + 1
 
 
 def _typing_duration_sec(text: str) -> float:
@@ -41,14 +41,65 @@ async def human_like_delay(client, entity, text: str) -> None:
     await asyncio.sleep(think_sec)
 
     typing_sec = _typing_duration_sec(text or "")
-    while typing_sec > 0:
+    if typing_sec <= 0:
+        return
+    # Обновления «печатает» ведёт общий планировщик; после паузы снимаем, чтобы не обновлять после отправки
+    scheduler = get_scheduler()
+    scheduler.start(client, entity, typing_sec)
+    try:
+        await asyncio.sleep(typing_sec)
+    finally:
+        scheduler.stop(client, entity)
+
+
+class ReplyBudget:
+    """
+    Human-like задержка как целевое время ответа, отсчитываемое от прихода сообщения кандидата.
+    Создаётся сразу при получении сообщения (индикатор «печатает» включается тут же), затем
+    идёт работа LLM, а wait(text) досыпает только остаток: think + typing(text) − уже прошедшее.
+    Если ответа не будет — cancel(). TOGGLE_DELAY=OFF — ничего не ждёт и не показывает.
+    """
+
+    def __init__(self, client, entity) -> None:
+        self._client = client
+        self._entity = entity
+        self.started = time.monotonic()
+        self.enabled = TOGGLE_DELAY != "OFF"
+        self.think_sec = random.uniform(THINK_DELAY_MIN, THINK_DELAY_MAX) if self.enabled else 0.0
+        if self.enabled:
+            # Пока неизвестна длина ответа — «печатаем» до wait()/cancel(), но не дольше предела набора
+            get_scheduler().start(client, entity, self.think_sec + HUMAN_DELAY_MAX_TYPING_SEC)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining(self, text: str) -> float:
+        """Сколько ещё ждать перед отправкой text, чтобы выдержать целевое время ответа."""
+        if not self.enabled:
+            return 0.0
+        return max(0.0, self.think_sec + _typing_duration_sec(text or "") - self.elapsed)
+
+    async def wait(self, text: str) -> None:
+        """Доспать остаток бюджета перед отправкой text и снять «печатает»."""
+        if not self.enabled:
+            return
+        elapsed = self.elapsed
+        left = self.remaining(text)
+        metrics.observe("reply_budget_elapsed_sec", elapsed)
+        if left <= 0:
+            # LLM ответила дольше целевого времени — отправляем сразу
+            metrics.inc("reply_budget_overrun")
         try:
-            await client(functions.messages.SetTypingRequest(
-                peer=entity,
-                action=SendMessageTypingAction(),
-            ))
-        except Exception:
-            pass
-        chunk = min(TYPING_ACTION_INTERVAL_SEC, typing_sec)
-        await asyncio.sleep(chunk)
-        typing_sec -= chunk
+            await asyncio.sleep(left)
+        finally:
+            self.cancel()
+
+    def keep_alive(self) -> None:
+        """Продлить «печатает», пока идёт потоковый ответ LLM (on_progress для openai_client)."""
+        if self.enabled:
+            get_scheduler().start(self._client, self._entity, STREAM_TYPING_EXTEND_SEC)
+
+    def cancel(self) -> None:
+        if self.enabled:
+            get_scheduler().stop(self._client, self._entity)
@@ -0,0 +1,81 @@
+"""
+Склейка входящих сообщений кандидата: короткая серия сообщений («Иванов», «Иван», «Петрович»)
+собирается в один ответ после паузы, чтобы оценивать её одним вызовом LLM.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+from config import INBOX_QUIET_SEC, INBOX_TYPING_EXTEND_SEC, INBOX_MAX_WAIT_SEC
+from . import metrics
+
+
+class _Burst:
+    __slots__ = ("parts", "deadline", "hard_deadline", "wake")
+
+    def __init__(self, text: str, quiet_sec: float, max_wait_sec: float) -> None:
+        now = time.monotonic()
+        self.parts = [text]
+        self.deadline = now + quiet_sec
+        self.hard_deadline = now + max_wait_sec
+        self.wake = asyncio.Event()
+
+    def extend(self, sec: float) -> None:
+        self.deadline = min(max(self.deadline, time.monotonic() + sec), self.hard_deadline)
+        self.wake.set()
+
+
+class Inbox:
+    """
+    collect(user_id, text): первое сообщение серии ждёт тишины quiet_sec и возвращает склеенный текст;
+    последующие сообщения серии дописываются к ней и возвращают None.
+    typing(user_id): кандидат печатает — тишина продлевается на typing_extend_sec.
+    """
+
+    def __init__(
+        self,
+        quiet_sec: float = INBOX_QUIET_SEC,
+        typing_extend_sec: float = INBOX_TYPING_EXTEND_SEC,
+        max_wait_sec: float = INBOX_MAX_WAIT_SEC,
+    ) -> None:
+        self.quiet_sec = quiet_sec
+        self.typing_extend_sec = typing_extend_sec
+        self.max_wait_sec = max_wait_sec
+        self._bursts: dict[int, _Burst] = {}
+
+    async def collect(self, user_id: int, text: str) -> str | None:
+        if self.quiet_sec <= 0:
+            return text
+        burst = self._bursts.get(user_id)
+        if burst is not None:
+            burst.parts.append(text)
+            burst.extend(self.quiet_sec)
+            metrics.inc("inbox_merged")
+            return None
+        burst = self._bursts[user_id] = _Burst(text, self.quiet_sec, self.max_wait_sec)
+        try:
+            while True:
+                left = burst.deadline - time.monotonic()
+                if left <= 0:
+                    break
+                burst.wake.clear()
+                try:
+                    await asyncio.wait_for(burst.wake.wait(), timeout=left)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._bursts.pop(user_id, None)
+        metrics.inc("inbox_bursts")
+        metrics.observe("inbox_burst_size", len(burst.parts))
+        return "\n".join(burst.parts)
+
+    def typing(self, user_id: int) -> None:
+        """Кандидат печатает: если серия открыта — продлить ожидание."""
+        burst = self._bursts.get(user_id)
+        if burst is not None:
+            burst.extend(self.typing_extend_sec)
+
+    def pending(self, user_id: int) -> bool:
+        return user_id in self._bursts
@@ -0,0 +1,143 @@
+"""
+Локальный классификатор коротких ответов кандидата (согласие/отказ) без вызова LLM:
+нормализованный словарь, эмодзи, частые опечатки и неверная раскладка, список брани.
+Неоднозначный текст — None, тогда решает LLM.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Optional
+
+from . import metrics
+
+# Согласие / отказ (после нормализации: нижний регистр, ё→е, повторы букв схлопнуты)
+_YES_WORDS = {
+    "да", "ага", "угу", "ок", "окей", "окэй", "оке", "океи", "хорошо", "хор", "ладно", "конечно",
+    "канечно", "конешно", "конечн", "давайте", "давай", "го", "готов", "готова", "согласен", "согласна",
+    "можно", "норм", "нормально", "естественно", "разумеется", "верно", "точно",
+    "yes", "yep", "yeah", "ya", "ok", "okay", "oki", "sure", "da", "+",
+}
+_NO_WORDS = {
+    "нет", "неа", "не", "нет-нет", "никак", "отказываюсь", "откажусь", "неинтересно", "ненадо",
+    "no", "nope", "nah", "net", "-",
+}
+# Фразы-отказы из нескольких слов (после нормализации)
+_NO_PHRASES = (
+    "не хочу", "не интересно", "не надо", "не нужно", "не буду", "не готов", "не готова",
+    "не сейчас", "не пишите", "не беспокойте", "отстаньте", "отстань", "удалите мой номер",
+)
+# Из _NO_WORDS — отказ от разговора, а не «нет» на вопрос «был ли / есть ли»
+_REFUSAL_WORDS = {"отказываюсь", "откажусь", "неинтересно", "ненадо"}
+# Слова-связки, которые не меняют смысл короткого ответа («ну да», «да, конечно, давайте»)
+_FILLER = {"ну", "а", "и", "так", "вот", "уж", "же", "ж", "то", "спасибо", "пожалуйста", "пжл", "пока"}
+
+_YES_EMOJI = ("👍", "👌", "✅", "🙂", "😊", "😉", "🤝", "🙏", "✔", "☺")
+_NO_EMOJI = ("👎", "❌", "🚫", "⛔", "🙅")
+
+# Начала матерных слов: брань — невалидный ответ (как в промпте evaluate_agreement)
+_PROFANITY_STEMS = (
+    "хуй", "хуе", "хуя", "пизд", "ебан", "ебат", "ебал", "ебу", "еба", "бля", "сука", "суки",
+    "мудак", "мудил", "пидор", "пидар", "залуп", "гандон", "нахуй", "нахер", "похуй", "шлюх", "дебил",
+)
+
+# Текст, набранный в английской раскладке вместо русской: "lf" → "да", "ytn" → "нет"
+_EN_TO_RU = str.maketrans(
+    "qwertyuiop[]asdfghjkl;'zxcvbnm,.`",
+    "йцукенгшщзхъфывапролджэячсмитьбюё",
+)
+
+# Дольше этого числа слов — не «короткий ответ», отдаём LLM
+MAX_WORDS = 6
+
+_PUNCT_RE = re.compile(r"[^\w\s+\-]", re.UNICODE)
+_REPEAT_RE = re.compile(r"(\w)\1{2,}", re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр, ё→е, без пунктуации и эмодзи, «дааа» → «да», пробелы схлопнуты."""
+    t = (text or "").lower().replace("ё", "е")
+    t = _PUNCT_RE.sub(" ", t)
+    t = _REPEAT_RE.sub(r"\1", t)
+    return " ".join(t.split())
+
+
+def has_profanity(text: str) -> bool:
+    words = normalize(text).split()
+    return any(w.startswith(_PROFANITY_STEMS) for w in words)
+
+
+def _word_verdict(word: str) -> Optional[bool]:
+    if word in _YES_WORDS:
+        return True
+    if word in _NO_WORDS:
+        return False
+    if word.isascii() and word.isalpha():
+        ru = word.translate(_EN_TO_RU)
+        if ru in _YES_WORDS:
+            return True
+        if ru in _NO_WORDS:
+            return False
+    return None
+
+
+def classify_agreement(text: str) -> Optional[bool]:
+    """
+    True — согласие, False — отказ (или брань), None — неоднозначно (нужна LLM).
+    Уверенно отвечает только на короткие ответы, где все значимые слова говорят одно и то же.
+    """
+    raw = (text or "").strip()
+    if not raw:
+        return None
+    if has_profanity(raw):
+        return False
+    yes_emoji = any(e in raw for e in _YES_EMOJI)
+    no_emoji = any(e in raw for e in _NO_EMOJI)
+    norm = normalize(raw)
+    if not norm:
+        # Только эмодзи
+        if yes_emoji != no_emoji:
+            return yes_emoji
+        return None
+    words = norm.split()
+    if len(words) > MAX_WORDS:
+        return None
+    if any(p in norm for p in _NO_PHRASES):
+        return False
+    verdicts = set()
+    for w in words:
+        if w in _FILLER:
+            continue
+        v = _word_verdict(w)
+        if v is None:
+            # Незнакомое слово — смысл может быть любым («да, но только удалённо»)
+            return None
+        verdicts.add(v)
+    if yes_emoji:
+        verdicts.add(True)
+    if no_emoji:
+        verdicts.add(False)
+    # «да нет», «ок, нет» — противоречие, пусть решает LLM
+    if len(verdicts) != 1:
+        return None
+    return verdicts.pop()
+
+
+def is_refusal(text: str) -> bool:
+    """Отказ отвечать («не хочу отвечать», «отстаньте», «отказываюсь»), а не ответ «нет» по существу."""
+    norm = normalize(text)
+    if any(p in norm for p in _NO_PHRASES):
+        return True
+    return any(w in _REFUSAL_WORDS for w in norm.split())
+
+
+def record(kind: str, verdict: Optional[bool]) -> None:
+    """Счётчики попаданий локального классификатора: {kind}_local / {kind}_llm и доля локальных."""
+    if verdict is None:
+        metrics.inc(f"{kind}_llm")
+    else:
+        metrics.inc(f"{kind}_local", verdict=verdict)
+    local = metrics.get_counter(f"{kind}_local", verdict=True) + metrics.get_counter(f"{kind}_local", verdict=False)
+    total = local + metrics.get_counter(f"{kind}_llm")
+    if total:
+        metrics.set_gauge(f"{kind}_local_hit_rate", round(local / total, 3))
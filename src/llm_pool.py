@@ -0,0 +1,197 @@
+"""
+Пулы заранее сгенерированных текстов LLM, которые не зависят от кандидата:
+вопросы об удовлетворённости вакансией (по id+updatedAt вакансии, несколько вариантов на выбор)
+и сообщения «других вакансий нет» (обновляются в фоне). Одинаковые одновременные генерации
+склеиваются в один запрос (singleflight).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Iterable, Optional, TypeVar
+
+from config import LLM_POOL_VARIANTS, NO_MORE_REFRESH_SEC, VACANCY_QUESTION_CACHE_SIZE
+from . import metrics, openai_client
+
+log = logging.getLogger("userbot")
+
+T = TypeVar("T")
+
+
+class Singleflight:
+    """do(key, factory): пока идёт вызов по key, остальные ждут его результат, а не запускают свой."""
+
+    def __init__(self) -> None:
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        fut = self._inflight.get(key)
+        if fut is not None:
+            metrics.inc("singleflight_shared")
+            return await asyncio.shield(fut)
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            # Ошибка уже передана ожидающим; без них не ругаемся «exception was never retrieved»
+            fut.exception()
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+
+_flight = Singleflight()
+# Ссылки на фоновые задачи догенерации (иначе их может собрать GC)
+_background: set[asyncio.Task] = set()
+
+
+def vacancy_key(vacancies: Iterable[dict[str, Any]]) -> Optional[str]:
+    """Ключ пула по id и времени изменения вакансий; None — у вакансии нет id, не кэшируем."""
+    parts = []
+    for v in vacancies:
+        vid = v.get("id")
+        if not vid:
+            return None
+        parts.append(f"{vid}:{v.get('updatedAt') or v.get('createdAt') or ''}")
+    return "|".join(parts) or None
+
+
+class _VariantPool:
+    """LRU: ключ → до variants вариантов текста; недостающие догенерируются в фоне."""
+
+    def __init__(self, name: str, variants: int, size: int) -> None:
+        self.name = name
+        self.variants = max(1, int(variants))
+        self.size = max(1, int(size))
+        self._items: OrderedDict[str, list[str]] = OrderedDict()
+        self._topping_up: set[str] = set()
+
+    def _add(self, key: str, text: str) -> None:
+        texts = self._items.setdefault(key, [])
+        self._items.move_to_end(key)
+        if text and text not in texts and len(texts) < self.variants:
+            texts.append(text)
+        self._evict()
+
+    def _evict(self) -> None:
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def replace(self, key: str, texts: Iterable[str]) -> None:
+        """Заменить варианты по key свежими (без повторов и пустых, не больше variants); ключ — самый новый."""
+        fresh: list[str] = []
+        for text in texts:
+            if text and text not in fresh and len(fresh) < self.variants:
+                fresh.append(text)
+        if not fresh:
+            return
+        self._items[key] = fresh
+        self._items.move_to_end(key)
+        self._evict()
+
+    async def _generate(self, key: str, generate: Callable[[], Awaitable[str]]) -> str:
+        async def _one() -> str:
+            text = await generate()
+            metrics.inc("llm_pool_generated", pool=self.name)
+            self._add(key, text)
+            return text
+
+        return await _flight.do(f"{self.name}:{key}", _one)
+
+    def _top_up(self, key: str, generate: Callable[[], Awaitable[str]]) -> None:
+        if key in self._topping_up:
+            return
+        self._topping_up.add(key)
+
+        async def _run() -> None:
+            try:
+                while len(self._items.get(key, ())) < self.variants:
+                    before = len(self._items.get(key, ()))
+                    await self._generate(key, generate)
+                    if len(self._items.get(key, ())) <= before:
+                        # LLM повторилась или ключ вытеснен — не крутимся впустую
+                        break
+            except Exception as e:
+                log.warning("Pool %s top-up failed: %s", self.name, e)
+            finally:
+                self._topping_up.discard(key)
+
+        task = asyncio.get_running_loop().create_task(_run())
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+
+    async def get(self, key: str, generate: Callable[[], Awaitable[str]]) -> str:
+        """Случайный готовый вариант (и догенерация в фоне) или генерация сейчас, если пусто."""
+        texts = self._items.get(key)
+        if texts:
+            self._items.move_to_end(key)
+            metrics.inc("llm_pool_hits", pool=self.name)
+            if len(texts) < self.variants:
+                self._top_up(key, generate)
+            return random.choice(texts)
+        metrics.inc("llm_pool_misses", pool=self.name)
+        text = await self._generate(key, generate)
+        self._top_up(key, generate)
+        return text
+
+
+_questions = _VariantPool("satisfaction_question", LLM_POOL_VARIANTS, VACANCY_QUESTION_CACHE_SIZE)
+_no_more = _VariantPool("no_more_vacancies", LLM_POOL_VARIANTS, 1)
+_NO_MORE_KEY = "default"
+
+
+async def satisfaction_question(vacancies: list[dict[str, Any]], report_text: str) -> str:
+    """
+    Вопрос об удовлетворённости для отчёта report_text по вакансиям vacancies.
+    Текст зависит только от вакансий — вариант берётся из пула; ошибка LLM → шаблонный вопрос (не кэшируется).
+    """
+    async def _generate() -> str:
+        return await openai_client.generate_satisfaction_question(report_text, raise_on_error=True)
+
+    key = vacancy_key(vacancies)
+    try:
+        if key is None:
+            return await _generate()
+        return await _questions.get(key, _generate)
+    except Exception:
+        return openai_client.SATISFACTION_QUESTION_FALLBACK
+
+
+async def no_more_vacancies_message() -> str:
+    """Сообщение «других вакансий нет» из пула; ошибка LLM → шаблонный текст."""
+    async def _generate() -> str:
+        return await openai_client.generate_no_more_vacancies_message(raise_on_error=True)
+
+    try:
+        return await _no_more.get(_NO_MORE_KEY, _generate)
+    except Exception:
+        return openai_client.NO_MORE_VACANCIES_FALLBACK
+
+
+async def refresh_no_more_periodically(interval_sec: float = NO_MORE_REFRESH_SEC) -> None:
+    """Фоновый сервис: заполнить пул «других вакансий нет» при старте и обновлять раз в interval_sec."""
+    while True:
+        fresh: list[str] = []
+        for _ in range(_no_more.variants):
+            try:
+                text = await openai_client.generate_no_more_vacancies_message(raise_on_error=True)
+            except Exception as e:
+                log.warning("Refresh 'no more vacancies' pool failed: %s", e)
+                break
+            if text and text not in fresh:
+                fresh.append(text)
+        if fresh:
+            _no_more.replace(_NO_MORE_KEY, fresh)
+            metrics.inc("llm_pool_refreshed", pool=_no_more.name)
+        await asyncio.sleep(interval_sec)
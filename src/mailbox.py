@@ -0,0 +1,71 @@
+"""
+Почтовые ящики по user_id: сообщения одного собеседника обрабатываются строго по очереди
+(как актор), сообщения разных собеседников — параллельно.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from config import MAILBOX_MAXSIZE, MAILBOX_IDLE_SEC
+from . import metrics
+
+log = logging.getLogger("userbot")
+
+Job = Callable[[], Awaitable[None]]
+
+
+class MailboxRouter:
+    """
+    submit(user_id, job) ставит обработку в очередь пользователя. Очередь ограничена maxsize:
+    если она заполнена, submit ждёт (backpressure). Воркер пользователя завершается после idle_sec простоя.
+    """
+
+    def __init__(self, maxsize: int = MAILBOX_MAXSIZE, idle_sec: float = MAILBOX_IDLE_SEC) -> None:
+        self._maxsize = max(1, int(maxsize))
+        self._idle_sec = idle_sec
+        self._queues: dict[int, asyncio.Queue] = {}
+        self._workers: dict[int, asyncio.Task] = {}
+
+    async def submit(self, user_id: int, job: Job) -> None:
+        queue = self._queues.get(user_id)
+        if queue is None:
+            queue = self._queues[user_id] = asyncio.Queue(maxsize=self._maxsize)
+        if queue.full():
+            metrics.inc("mailbox_backpressure")
+        await queue.put(job)
+        worker = self._workers.get(user_id)
+        if worker is None or worker.done():
+            self._workers[user_id] = asyncio.get_running_loop().create_task(self._run(user_id, queue))
+        metrics.set_gauge("mailbox_users", len(self._workers))
+
+    async def _run(self, user_id: int, queue: asyncio.Queue) -> None:
+        while True:
+            try:
+                job = await asyncio.wait_for(queue.get(), timeout=self._idle_sec)
+            except asyncio.TimeoutError:
+                if queue.empty():
+                    break
+                continue
+            try:
+                await job()
+            except Exception:
+                log.exception("Mailbox job error (user_id=%s)", user_id)
+            finally:
+                queue.task_done()
+        if self._queues.get(user_id) is queue and queue.empty():
+            self._queues.pop(user_id, None)
+        if self._workers.get(user_id) is asyncio.current_task():
+            self._workers.pop(user_id, None)
+        metrics.set_gauge("mailbox_users", len(self._workers))
+
+    def depth(self, user_id: int) -> int:
+        queue = self._queues.get(user_id)
+        return queue.qsize() if queue is not None else 0
+
+    async def join(self) -> None:
+        """Дождаться обработки всего, что уже поставлено в очереди."""
+        for queue in list(self._queues.values()):
+            await queue.join()
@@ -0,0 +1,100 @@
+"""
+Метрики процесса в памяти: счётчики, gauge и распределения (латентности и т.п.).
+Снимок (snapshot) доступен любому модулю и периодически пишется в лог.
+"""
+
+import logging
+import threading
+from collections import deque
+from typing import Any
+
+# Сколько последних наблюдений хранить для расчёта перцентилей
+_SAMPLES_MAXLEN = 2000
+
+_lock = threading.Lock()
+_counters: dict[str, float] = {}
+_gauges: dict[str, float] = {}
+_samples: dict[str, deque] = {}
+
+
+def _key(name: str, labels: dict[str, Any]) -> str:
+    """Имя метрики с метками: name{a=1,b=x}."""
+    if not labels:
+        return name
+    parts = ",".join(f"{k}={labels[k]}" for k in sorted(labels))
+    return f"{name}{{{parts}}}"
+
+
+def inc(name: str, value: float = 1.0, **labels: Any) -> None:
+    """Увеличить счётчик."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def set_gauge(name: str, value: float, **labels: Any) -> None:
+    """Установить текущее значение gauge."""
+    with _lock:
+        _gauges[_key(name, labels)] = float(value)
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    """Добавить наблюдение в распределение (например, латентность в секундах)."""
+    key = _key(name, labels)
+    with _lock:
+        buf = _samples.get(key)
+        if buf is None:
+            buf = _samples[key] = deque(maxlen=_SAMPLES_MAXLEN)
+        buf.append(float(value))
+
+
+def get_counter(name: str, **labels: Any) -> float:
+    with _lock:
+        return _counters.get(_key(name, labels), 0.0)
+
+
+def _percentile(sorted_vals: list[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    idx = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[idx]
+
+
+def sample_count(name: str, **labels: Any) -> int:
+    """Сколько наблюдений распределения хранится (не больше _SAMPLES_MAXLEN)."""
+    with _lock:
+        buf = _samples.get(_key(name, labels))
+        return len(buf) if buf else 0
+
+
+def percentile(name: str, q: float, **labels: Any) -> float | None:
+    """Перцентиль q (0..1) по последним наблюдениям; None, если наблюдений нет."""
+    with _lock:
+        buf = _samples.get(_key(name, labels))
+        vals = sorted(buf) if buf else []
+    if not vals:
+        return None
+    return _percentile(vals, q)
+
+
+def snapshot() -> dict[str, Any]:
+    """Снимок всех метрик: counters, gauges и summaries (count/p50/p95/p99)."""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        samples = {k: sorted(v) for k, v in _samples.items()}
+    summaries = {
+        k: {
+            "count": len(v),
+            "p50": _percentile(v, 0.50),
+            "p95": _percentile(v, 0.95),
+            "p99": _percentile(v, 0.99),
+        }
+        for k, v in samples.items()
+    }
+    return {"counters": counters, "gauges": gauges, "summaries": summaries}
+
+
+def log_snapshot(logger: logging.Logger | None = None) -> None:
+    """Записать снимок метрик в лог одной строкой."""
+    (logger or logging.getLogger("userbot")).info("metrics: %s", snapshot())
@@ -1,35 +1,305 @@
 """
 Интеграция с OpenAI для получения ответов в диалоге и вспомогательные вызовы LLM.
+Все вызовы асинхронные и идут через один AsyncOpenAI на event loop (общий keep-alive пул соединений);
+для синхронных скриптов — run_sync().
 """
 
+import asyncio
 import json
 import logging
+import threading
+import time
+import weakref
 from datetime import date, datetime
-from typing import Any, Dict
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+from openai import AsyncOpenAI
+from config import (
+    OPENAI_API_KEY,
+    OPENAI_MODEL,
+    OPENAI_BASE_URL,
+    OPENAI_TIMEOUT_SEC,
+    OPENAI_MAX_CONNECTIONS,
+    OPENAI_KEEPALIVE_SEC,
+    OPENAI_STREAM,
+)
+from . import intent, metrics, prompts, resilience
+from .prompts import Prompt
+from .resilience import CircuitOpenError
+
+try:
+    import httpx
+except ImportError:  # сборки SDK без httpx — пул соединений по умолчанию
+    httpx = None
+
+T = TypeVar("T")
+
+# Шаблонные тексты на случай ошибки LLM
+SATISFACTION_QUESTION_FALLBACK = "Как вам эта вакансия? Подходит ли она вам?"
+NO_MORE_VACANCIES_FALLBACK = (
+    "Сейчас других подходящих вакансий, к сожалению, нет. "
+    "Как только появится что-то подходящее, мы обязательно с вами свяжемся."
+)
+
+# Клиент на каждый event loop: соединения httpx привязаны к loop, в котором открыты
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+# Фоновый loop для run_sync (синхронные вызывающие: CLI-скрипты и т.п.)
+_sync_loop: asyncio.AbstractEventLoop | None = None
+_sync_lock = threading.Lock()
+
+
+def _new_client() -> AsyncOpenAI:
+    # Повторы делает resilience.call (со сроком вызова и предохранителем), не SDK
+    kwargs: dict[str, Any] = {"api_key": OPENAI_API_KEY, "timeout": OPENAI_TIMEOUT_SEC, "max_retries": 0}
+    if OPENAI_BASE_URL:
+        kwargs["base_url"] = OPENAI_BASE_URL
+    if httpx is not None:
+        kwargs["http_client"] = httpx.AsyncClient(
+            timeout=OPENAI_TIMEOUT_SEC,
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+                keepalive_expiry=OPENAI_KEEPALIVE_SEC,
+            ),
+        )
+    return AsyncOpenAI(**kwargs)
+
+
+def get_client() -> AsyncOpenAI:
+    """Общий AsyncOpenAI для текущего event loop (создаётся при первом обращении)."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = _new_client()
+    return client
+
+
+async def close_client() -> None:
+    """Закрыть клиент текущего event loop (при остановке бота)."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """
+    Выполнить корутину этого модуля из синхронного кода (как download_vacancies.py):
+    например, run_sync(summarize_questionnaire(result)). Все такие вызовы идут через один фоновый loop,
+    поэтому пул соединений переиспользуется между вызовами. Не вызывать из работающего event loop.
+    """
+    global _sync_loop
+    with _sync_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name="openai-sync", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _sync_loop).result()
 
-from openai import OpenAI
-from config import OPENAI_API_KEY, OPENAI_MODEL
+
+# Фоновые дочитывания потоков ради usage (ссылки, чтобы задачи не собрал GC)
+_draining: set[asyncio.Task] = set()
+
+
+def _record_usage(prompt: Prompt, usage: Any, hedged: bool = False) -> None:
+    """
+    Токены ответа в метрики (метки fn — имя промпта, v — его версия): llm_prompt_tokens,
+    llm_cached_tokens (из них взято из кэша префикса), llm_completion_tokens, gauge llm_cache_ratio;
+    llm_tokens_per_session — все токены на начатую анкету. hedged — был дублирующий запрос:
+    его стоимость (не больше стоимости ответа) — в llm_hedge_extra_tokens.
+    """
+    labels = {"fn": prompt.name, "v": prompt.version}
+    if usage is None:
+        metrics.inc("llm_usage_missing", **labels)
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or 0
+    prompt_tokens = usage.prompt_tokens or 0
+    completion_tokens = usage.completion_tokens or 0
+    metrics.inc("llm_calls", **labels)
+    metrics.inc("llm_prompt_tokens", prompt_tokens, **labels)
+    metrics.inc("llm_cached_tokens", cached, **labels)
+    metrics.inc("llm_completion_tokens", completion_tokens, **labels)
+    total_prompt = metrics.get_counter("llm_prompt_tokens", **labels)
+    if total_prompt:
+        cached_total = metrics.get_counter("llm_cached_tokens", **labels)
+        metrics.set_gauge("llm_cache_ratio", cached_total / total_prompt, **labels)
+    metrics.inc("llm_tokens_total", prompt_tokens + completion_tokens)
+    if hedged:
+        metrics.inc("llm_hedge_extra_tokens", prompt_tokens + completion_tokens, fn=prompt.name)
+    sessions = metrics.get_counter("questionnaire_sessions")
+    if sessions:
+        metrics.set_gauge("llm_tokens_per_session", metrics.get_counter("llm_tokens_total") / sessions)
+
+
+async def _create(prompt: Prompt, body: Dict[str, Any]) -> Any:
+    """
+    chat.completions.create через resilience.call (лимит, срок, повторы, предохранитель)
+    с учётом латентности (llm_latency_sec) и токенов ответа по prompt.
+    """
+    started = time.monotonic()
+    hedged: list[bool] = []
+    try:
+        resp = await resilience.call(
+            prompt.name,
+            lambda: get_client().chat.completions.create(**body),
+            on_hedge=lambda: hedged.append(True),
+        )
+    finally:
+        metrics.observe("llm_latency_sec", time.monotonic() - started, fn=prompt.name)
+    _record_usage(prompt, resp.usage, hedged=bool(hedged))
+    return resp
 
 
-def get_reply(messages: list[dict], system_prompt: str = "") -> str:
+async def get_reply(messages: list[dict], system_prompt: str = "", fn: str = "get_reply") -> str:
     """
     Получить ответ от OpenAI на основе истории сообщений.
     messages: [{"role": "user"|"assistant", "content": "..."}, ...]
     system_prompt: опциональное системное сообщение.
+    fn: метка вызова в метриках токенов и латентности.
     """
-    client = OpenAI(api_key=OPENAI_API_KEY)
     api_messages: list[dict] = []
     if system_prompt:
         api_messages.append({"role": "system", "content": system_prompt})
     api_messages.extend(messages)
 
-    response = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=api_messages,
-    )
+    response = await _create(Prompt(fn, 0, system_prompt), {"model": OPENAI_MODEL, "messages": api_messages})
     return response.choices[0].message.content or ""
 
 
+class _JsonObjectEnd:
+    """Поиск конца первого JSON-объекта в тексте, приходящем по фрагментам (строки и экранирование учитываются)."""
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, chunk: str) -> int:
+        """Индекс закрывающей '}' в chunk или -1, если объект ещё не закрылся."""
+        for i, ch in enumerate(chunk):
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == "{":
+                self.depth += 1
+            elif self.depth == 0:
+                # Текст до первой '{' (например, ```json) пропускаем
+                continue
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    return i
+        return -1
+
+
+def _background(coro: Awaitable[Any]) -> None:
+    task = asyncio.get_running_loop().create_task(coro)
+    _draining.add(task)
+    task.add_done_callback(_draining.discard)
+
+
+async def _drain_usage(prompt: Prompt, stream: Any, hedged: bool = False) -> None:
+    """Дочитать поток после раннего выхода: usage приходит последним фрагментом."""
+    usage = None
+    try:
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+    except Exception as e:
+        logging.getLogger("userbot").debug("Drain %s stream failed: %s", prompt.name, e)
+    finally:
+        await stream.close()
+    _record_usage(prompt, usage, hedged)
+
+
+async def _complete_json(
+    prompt: Prompt,
+    body: Dict[str, Any],
+    on_progress: Callable[[], None] | None = None,
+    tool: bool = False,
+) -> str:
+    """
+    chat.completions.create(**body), ответ которого — JSON-объект: текст сообщения или (tool=True) аргументы
+    первого вызова функции; "" — если модель их не вернула.
+    При OPENAI_STREAM ответ читается потоком: каждый фрагмент вызывает on_progress (продлить «печатает»),
+    ответ возвращается, как только объект закрылся (хвост с usage дочитывается в фоне).
+    Метрики llm_ttft_sec (до первого токена), llm_latency_sec и токены (_record_usage).
+    """
+    if not OPENAI_STREAM:
+        resp = await _create(prompt, body)
+        message = resp.choices[0].message
+        if tool:
+            return message.tool_calls[0].function.arguments if message.tool_calls else ""
+        return message.content or ""
+
+    started = time.monotonic()
+
+    async def _read() -> tuple[str, Any, Any, bool]:
+        """Одна попытка: (текст, поток, usage, закрылся ли JSON до конца потока)."""
+        stream = await get_client().chat.completions.create(
+            stream=True, stream_options={"include_usage": True}, **body
+        )
+        tracker = _JsonObjectEnd()
+        parts: list[str] = []
+        usage = None
+        try:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if tool:
+                    text = "".join(
+                        tc.function.arguments or ""
+                        for tc in delta.tool_calls or []
+                        if tc.index == 0 and tc.function is not None
+                    )
+                else:
+                    text = delta.content or ""
+                if not text:
+                    continue
+                if not parts:
+                    metrics.observe("llm_ttft_sec", time.monotonic() - started, fn=prompt.name)
+                if on_progress is not None:
+                    on_progress()
+                end = tracker.feed(text)
+                if end >= 0:
+                    parts.append(text[: end + 1])
+                    metrics.inc("llm_stream_closed_early", fn=prompt.name)
+                    return "".join(parts), stream, usage, True
+                parts.append(text)
+        except BaseException:
+            await stream.close()
+            raise
+        return "".join(parts), stream, usage, False
+
+    hedged: list[bool] = []
+    try:
+        content, stream, usage, closed_early = await resilience.call(
+            prompt.name,
+            _read,
+            on_hedge=lambda: hedged.append(True),
+            # Хедж и основной запрос ответили одновременно: поток проигравшего просто закрываем
+            discard=lambda result: _background(result[1].close()),
+        )
+    finally:
+        metrics.observe("llm_latency_sec", time.monotonic() - started, fn=prompt.name)
+    if closed_early:
+        # Ответ уже есть — хвост (finish_reason, usage) дочитываем в фоне, не задерживая ответ кандидату
+        _background(_drain_usage(prompt, stream, bool(hedged)))
+    else:
+        await stream.close()
+        _record_usage(prompt, usage, bool(hedged))
+    return content
+
+
 def _extract_json_object(content: str) -> str:
     """
     Попробовать вытащить чистый JSON-объект из ответа модели.
@@ -71,99 +341,53 @@ def _extract_json_object(content: str) -> str:
     return content
 
 
-def generate_satisfaction_question(vacancy_description: str) -> str:
+async def generate_satisfaction_question(vacancy_description: str, raise_on_error: bool = False) -> str:
     """
     Сформировать вежливый вопрос об удовлетворённости вакансией.
     Используется после отправки описания вакансии кандидату.
+    raise_on_error — бросить исключение вместо шаблонного вопроса (чтобы шаблон не попал в кэш).
     """
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    system = (
-        "Ты рекрутер/HR-менеджер по найму (живой человек) для массового найма "
-        "вахтовиков/сменщиков. Ты ведешь диалог с кандидатом в мессенджере.\n"
-        "Сформулируй один вежливый вопрос об удовлетворённости именно этой вакансией.\n"
-        "Язык: русский. Тон: вежливый, деловой, без воды. Не упоминай, что ты бот или ИИ."
-    )
     user_content = (
         "Кандидату только что было отправлено следующее описание вакансии:\n\n"
         f"{vacancy_description}\n\n"
         "Сформулируй один вопрос, чтобы узнать, насколько кандидату подходит эта вакансия."
     )
     try:
-        resp = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            temperature=0.7,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user_content},
-            ],
+        resp = await _create(
+            prompts.SATISFACTION_QUESTION,
+            prompts.SATISFACTION_QUESTION.request(user_content, temperature=0.7),
         )
         return (resp.choices[0].message.content or "").strip()
     except Exception as e:
         logging.getLogger("userbot").exception(
             "Ошибка генерации вопроса об удовлетворённости вакансией: %s", e
         )
+        if raise_on_error:
+            raise
         # Фолбэк — простой шаблонный вопрос
-        return "Как вам эта вакансия? Подходит ли она вам?"
+        return SATISFACTION_QUESTION_FALLBACK
 
 
-def _call_analyze_vacancy_reply(
+async def _call_analyze_vacancy_reply(
     vacancy_description: str,
     candidate_message: str,
     history_snippet: str | None = None,
+    on_progress: Callable[[], None] | None = None,
 ) -> Dict[str, Any]:
     """
     Внутренний вызов LLM для анализа ответа кандидата по вакансии.
     Возвращает словарь с ключами analysis_result, reply_text, reason.
     """
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    system = (
-        "Ты рекрутер/менеджер по найму (живой человек) для массового найма "
-        "вахтовиков/сменщиков. Ты ведёшь диалог с кандидатом в мессенджере.\n\n"
-        "У тебя есть описание вакансии и последнее сообщение кандидата.\n"
-        "Твоя задача — проанализировать сообщение кандидата и сгенерировать ответ от лица рекрутёра.\n\n"
-        "КРИТИЧЕСКИ ВАЖНО:\n"
-        "- Веди себя как живой человек, не упоминай, что ты бот/ИИ.\n"
-        "- Язык: русский, вежливый деловой тон, без канцелярита и воды.\n"
-        "- Если вопрос не по вакансии, вежливо (NB!) скажи, что вопрос не по делу, "
-        "и мягко верни разговор к обсуждению вакансии.\n"
-        "- Если вакансия понравилась, вежливо согласись, поддержи энтузиазм, пожелай успехов и т.п.\n"
-        "- Если сообщение содержит вопросы по вакансии, дай краткий, но по существу ответ, опираясь на описание вакансии.\n"
-        "- Если сообщение содержит отказ или явную неудовлетворённость вакансией, "
-        "вежливо уточни, что именно не подошло, и скажи, что постараешься подобрать другую вакансию.\n\n"
-        "analysis_result должен однозначно отражать реакцию кандидата:\n"
-        "1 — чёткий отказ от вакансии;\n"
-        "2 — ответ на вопросы (кандидат задаёт вопросы по вакансии);\n"
-        "3 — явное удовлетворение вакансией (кандидату подходит вакансия);\n"
-        "4 — требуется пояснение (ответ неоднозначен, нужно уточнение).\n"
-        "Ответ ДОЛЖЕН быть строго в виде JSON без какого-либо дополнительного текста.\n"
-        "КРИТИЧЕСКИ ВАЖНО: НЕ используй тройные кавычки ``` и не оборачивай ответ в markdown-кодблок. "
-        "Ответ должен начинаться с символа '{' и заканчиваться символом '}', без символов до и после JSON."
+    # Переменная часть — после стабильного system: описание вакансии (одно на весь разговор о ней),
+    # затем то, что меняется с каждым сообщением
+    vacancy_part = f"Описание вакансии, которое было отправлено кандидату:\n{vacancy_description}"
+    history_part = f"Краткий контекст предыдущего диалога:\n{history_snippet}\n\n" if history_snippet else ""
+    message_part = f"{history_part}Последнее сообщение кандидата:\n{candidate_message}"
+
+    prompt = prompts.ANALYZE_VACANCY_REPLY
+    content = await _complete_json(
+        prompt, prompt.request(vacancy_part, message_part, temperature=0.7), on_progress
     )
-    history_part = f"\n\nКраткий контекст предыдущего диалога:\n{history_snippet}" if history_snippet else ""
-    user_content = (
-        "Описание вакансии, которое было отправлено кандидату:\n"
-        f"{vacancy_description}\n\n"
-        "Последнее сообщение кандидата:\n"
-        f"{candidate_message}\n"
-        f"{history_part}\n\n"
-        "Сформируй JSON следующего вида (СТРОГО соблюдай формат и ключи, без markdown и ```):\n"
-        '{\n'
-        '  "analysis_result": 1 | 2 | 3 | 4,\n'
-        '  "reply_text": "строка с твоим ответом кандидату",\n'
-        '  "reason": "краткое текстовое объяснение, почему выбран такой analysis_result"\n'
-        '}\n'
-        "Только JSON, без комментариев и пояснений."
-    )
-
-    resp = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        temperature=0.7,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": user_content},
-        ],
-    )
-    content = resp.choices[0].message.content or ""
     cleaned = _extract_json_object(content)
     try:
         data = json.loads(cleaned)
@@ -188,14 +412,16 @@ def _call_analyze_vacancy_reply(
         }
 
 
-def analyze_vacancy_reply(
+async def analyze_vacancy_reply(
     vacancy_description: str,
     candidate_message: str,
     history: list[dict[str, Any]] | None = None,
+    on_progress: Callable[[], None] | None = None,
 ) -> Dict[str, Any]:
     """
     Анализирует ответ кандидата по вакансии и возвращает словарь
     с ключами analysis_result, reply_text, reason, raw.
+    on_progress — вызывается на каждый фрагмент потокового ответа (продлить «печатает»).
     """
     history_snippet = None
     if history:
@@ -209,142 +435,173 @@ def analyze_vacancy_reply(
         history_snippet = "\n".join(parts)
 
     try:
-        return _call_analyze_vacancy_reply(
+        return await _call_analyze_vacancy_reply(
             vacancy_description=vacancy_description,
             candidate_message=candidate_message,
             history_snippet=history_snippet,
+            on_progress=on_progress,
         )
+    except CircuitOpenError:
+        return _local_vacancy_reply(candidate_message, "circuit breaker open")
     except Exception as e:
         logging.getLogger("userbot").exception(
             "Ошибка анализа ответа кандидата по вакансии: %s", e
         )
-        return {
-            "analysis_result": 4,
-            "reply_text": "Спасибо за ответ. Не до конца понял вашу реакцию на вакансию, "
-            "можете, пожалуйста, немного уточнить, что именно вы имеете в виду?",
-            "reason": "fallback after exception",
-            "raw": {},
-        }
+        return _local_vacancy_reply(candidate_message, "fallback after exception")
 
 
-def generate_no_more_vacancies_message() -> str:
+def _local_vacancy_reply(candidate_message: str, reason: str) -> Dict[str, Any]:
+    """
+    Ответ без LLM (ошибка API или открыт предохранитель): короткое «да»/«нет» распознаётся
+    локальным классификатором, остальное — просьба уточнить (analysis_result 4).
+    """
+    verdict = intent.classify_agreement(candidate_message)
+    metrics.inc("analyze_vacancy_reply_local", verdict=verdict)
+    if verdict is True:
+        result, reply_text = 3, "Отлично, рад, что вакансия вам подходит! Скоро с вами свяжутся по деталям."
+    elif verdict is False:
+        result, reply_text = 1, (
+            "Понял вас. Подскажите, пожалуйста, что именно не подошло? Постараюсь подобрать другой вариант."
+        )
+    else:
+        result, reply_text = 4, (
+            "Спасибо за ответ. Не до конца понял вашу реакцию на вакансию, "
+            "можете, пожалуйста, немного уточнить, что именно вы имеете в виду?"
+        )
+    return {"analysis_result": result, "reply_text": reply_text, "reason": reason, "raw": {}}
+
+
+async def generate_no_more_vacancies_message(raise_on_error: bool = False) -> str:
     """
     Сформировать вежливое сообщение, что других вакансий пока нет.
+    raise_on_error — бросить исключение вместо шаблонного текста.
     """
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    system = (
-        "Ты рекрутер/менеджер по найму (живой человек) для массового найма "
-        "вахтовиков/сменщиков. Ты ведёшь диалог с кандидатом в мессенджере."
-    )
     user_content = (
         "Составь вежливое сообщение кандидату, что других подходящих вакансий пока нет. "
         "Язык: русский. Тон: вежливый, поддерживающий, без излишнего оптимизма и без мрачности."
     )
     try:
-        resp = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            temperature=0.7,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user_content},
-            ],
+        resp = await _create(
+            prompts.NO_MORE_VACANCIES, prompts.NO_MORE_VACANCIES.request(user_content, temperature=0.7)
         )
         return (resp.choices[0].message.content or "").strip()
     except Exception as e:
         logging.getLogger("userbot").exception(
             "Ошибка генерации сообщения об отсутствии вакансий: %s", e
         )
-        return (
-            "Сейчас других подходящих вакансий, к сожалению, нет. "
-            "Как только появится что-то подходящее, мы обязательно с вами свяжемся."
-        )
+        if raise_on_error:
+            raise
+        return NO_MORE_VACANCIES_FALLBACK
 
 
-def evaluate_agreement(user_message: str) -> bool:
+async def evaluate_agreement(user_message: str) -> bool:
     """
     Определить, согласен ли пользователь отвечать на вопросы (утвердительно/положительно).
     Возвращает True при согласии, False при отказе.
     """
-    system = (
-        "Ты рекрутер/менеджер по найму (живой человек) для массового найма вахтовиков/сменщиков." 
-        "Ты ведешь диалог с кандидатом в WhatsApp, собираешь информацию для подбора вакансии."
-        "Краткие ответы ok, ок, yes, да, нет, no - это ВАЛИДНЫЕ ответы!"
-        "Брань - невалидный ответ!"
-        "Ответь строго одним словом: YES — если согласен/готов отвечать (утвердительно, положительно); "
-        "NO — если отказывается или отвечает отрицательно. Без пояснений."
-    )
-    reply = get_reply([{"role": "user", "content": user_message}], system_prompt=system)
+    prompt = prompts.EVALUATE_AGREEMENT
+    resp = await _create(prompt, prompt.request(user_message))
+    reply = resp.choices[0].message.content or ""
     return reply.strip().upper().startswith("YES")
 
 
-def validate_answer(
-    question: str, answer: str, acceptance_criteria: str = ""
+async def validate_answer(
+    question: str,
+    answer: str,
+    acceptance_criteria: str = "",
+    rejection_reason: str = "",
+    raise_on_error: bool = False,
+    on_progress: Callable[[], None] | None = None,
 ) -> tuple[bool, str]:
     """
     Валидирует ответ кандидата и генерирует человеческий ответ рекрутера.
     Возвращает (valid: bool, human_response: str).
+    rejection_reason — ответ уже отклонён локальной проверкой: нужен только human_response, valid всегда False.
+    raise_on_error — при ошибке API/ответа без tool_calls бросить исключение; иначе фолбэк (False, "") —
+    без проверки ответ валидным не считается (вызывающий переспрашивает кандидата).
+    on_progress — вызывается на каждый фрагмент потокового ответа (продлить «печатает»).
     """
     try:
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        acceptance_text = (
-            f"\n\nКритерии приемлемости ответа: {acceptance_criteria}"
-            if acceptance_criteria
-            else ""
-        )
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Ты рекрутер/менеджер по найму (живой человек) для массового найма вахтовиков/сменщиков. Ты ведешь диалог с кандидатом в WhatsApp, собираешь информацию для подбора вакансии. КРИТИЧЕСКИ ВАЖНО: Веди диалог как живой человек-рекрутер. Никогда не говори и не намекай, что ты ИИ/бот/автоматизация. Язык: русский. Тон: вежливо-деловой, коротко, без воды. КРИТИЧЕСКИ ВАЖНО: Если вопрос спрашивает 'был ли опыт' или 'есть ли что-то', то ответы 'нет', 'не было', 'не было опыта' - это ВАЛИДНЫЕ ответы! Не требуй деталей, если человек говорит что опыта нет. БУДЬ ЩЕДРЫМ - если ответ содержит хоть какую-то информацию по теме или отрицательный ответ на вопрос 'был ли' - считай валидным. НЕВАЛИДЕН только полный отказ, полная ерунда не по теме или пустой ответ. Если ответ невалиден (ерунда/отказ) - сгенерируй человеческий ответ рекрутера, который объяснит проблему и склонит кандидата ответить нормально. КРИТИЧЕСКИ ВАЖНО: НЕ здоровайся, НЕ начинай с приветствий - мы УЖЕ в диалоге! Общайся естественно, как живой человек-рекрутер, не формально. Не повторяй одни и те же фразы - будь разнообразным. Если человек задал уточняющий вопрос, зачем эта информация или на что она влияет - придумай что-нибудь релевантное и убедительное, чтобы УБЕДИТЬ человека ответить. НЕ используй фразы типа 'Ваш ответ не содержит', 'Пожалуйста уточните' - это палит бота! Говори как живой рекрутер.",
-                },
-                {
-                    "role": "user",
-                    "content": f"Вопрос: {question}\nОтвет кандидата: {answer}{acceptance_text}",
-                },
-            ],
-            tools=[
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "validate_answer",
-                        "description": "Валидирует ответ кандидата и генерирует человеческий ответ для отправки",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "valid": {
-                                    "type": "boolean",
-                                    "description": "True если: ответ содержит информацию по теме ИЛИ отрицательный ответ на вопрос 'был ли' ('нет', 'не было', 'не было опыта' - ВСЕГДА валидны). False только если полный отказ, полная ерунда не по теме или пустой ответ. КРИТИЧЕСКИ ВАЖНО: если вопрос спрашивает 'был ли опыт', то 'нет' = валидно!",
-                                },
-                                "human_response": {
-                                    "type": "string",
-                                    "description": "Если valid=false - естественный ответ рекрутера, который объяснит проблему и склонит ответить. Будь разнообразным, неформальным, как живой человек-рекрутер. НЕ используй фразы типа 'Ваш ответ не содержит', 'Пожалуйста уточните' - это палит бота! Говори естественно, как рекрутер, например: 'Понял, но мне нужно уточнение...', 'Не совсем понял, можете пояснить...', 'Хм, не совсем ясно...', 'Чтобы подобрать вам подходящий вариант, мне нужно знать...'. НЕ повторяй вопрос дословно - переформулируй своими словами. Если valid=true - пустая строка.",
-                                },
-                            },
-                            "required": ["valid", "human_response"],
-                        },
-                    },
-                }
-            ],
-            tool_choice={"type": "function", "function": {"name": "validate_answer"}},
-            temperature=0.7,
-        )
-        if response.choices[0].message.tool_calls:
-            result = json.loads(
-                response.choices[0].message.tool_calls[0].function.arguments
+        # Стабильное (вопрос, критерии) — раньше ответа кандидата: префикс общий для всех ответов на вопрос
+        question_part = f"Вопрос: {question}"
+        if acceptance_criteria:
+            question_part += f"\nКритерии приемлемости ответа: {acceptance_criteria}"
+        answer_part = f"\n\nОтвет кандидата: {answer}"
+        if rejection_reason:
+            answer_part += (
+                f"\n\nОтвет уже признан невалидным ({rejection_reason}). "
+                "Верни valid=false и human_response, который мягко попросит ответить корректно."
             )
-            valid = result.get("valid", False)
+        prompt = prompts.VALIDATE_ANSWER
+        arguments = await _complete_json(
+            prompt, prompt.request(question_part + answer_part, temperature=0.7), on_progress, tool=True
+        )
+        if arguments:
+            result = json.loads(arguments)
+            valid = result.get("valid", False) and not rejection_reason
             human_response = (
                 result.get("human_response", "") if not valid else ""
             )
             return (valid, human_response)
-        return (True, "")
+        raise ValueError("validate_answer: no tool_calls in response")
+    except CircuitOpenError:
+        if raise_on_error:
+            raise
+        return (False, "")
     except Exception as e:
         logging.getLogger("userbot").exception("Ошибка валидации: %s", e)
-        return (True, "")
+        if raise_on_error:
+            raise
+        return (False, "")
+
+
+def summarize_request(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Тело запроса chat.completions для выжимки опроса: его же отправляет summarize_questionnaire
+    и пишет в JSONL пакетная пересборка выжимок (resummarize_batch.py).
+    """
+    user_content = (
+        "Вот полный JSON результата опроса кандидата.\n"
+        "Сформируй выжимку по правилам из системного сообщения.\n\n"
+        f"{json.dumps(result, ensure_ascii=False)}"
+    )
+    return prompts.SUMMARIZE_QUESTIONNAIRE.request(user_content, temperature=0)
+
+
+def parse_brief(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Аргументы generate_brief → выжимка: birth_date проверяется, age считается от неё."""
+    birth_date_str = data.get("birth_date")
+    birth_date_iso: str | None = None
+    age: int | None = None
+    if isinstance(birth_date_str, str) and birth_date_str:
+        try:
+            dt = datetime.fromisoformat(birth_date_str).date()
+            birth_date_iso = dt.isoformat()
+            today = date.today()
+            age = today.year - dt.year - (
+                (today.month, today.day) < (dt.month, dt.day)
+            )
+        except ValueError as e:
+            logging.getLogger("userbot").exception(
+                "summarize_questionnaire: неверный birth_date: %s", e
+            )
+            birth_date_iso = None
+            age = None
 
+    return {
+        "full_name": data.get("full_name"),
+        "last_name": data.get("last_name"),
+        "first_name": data.get("first_name"),
+        "patronymic": data.get("patronymic"),
+        "gender": data.get("gender"),
+        "birth_date": birth_date_iso,
+        "age": age,
+        "job_type": data.get("job_type"),
+        "region": data.get("region"),
+    }
 
-def summarize_questionnaire(result: Dict[str, Any]) -> Dict[str, Any]:
+
+async def summarize_questionnaire(result: Dict[str, Any]) -> Dict[str, Any]:
     """
     Сформировать короткую выжимку из результата опроса для дальнейшей передачи в parser.
     Возвращает словарь вида:
@@ -360,130 +617,8 @@ def summarize_questionnaire(result: Dict[str, Any]) -> Dict[str, Any]:
       "region": str | None
     }
     """
-    client = OpenAI(api_key=OPENAI_API_KEY)
-
-    user_content = (
-        "Вот полный JSON результата опроса кандидата.\n"
-        "Сформируй выжимку по правилам из системного сообщения.\n\n"
-        f"{json.dumps(result, ensure_ascii=False)}"
-    )
-
     try:
-        resp = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            temperature=0,
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "Ты HR-специалист по анализу анкет.\n"
-                        "На вход ты получаешь JSON с результатами опроса кандидата "
-                        "(пары question-answer).\n\n"
-
-                        "Твоя задача — извлечь ТОЛЬКО явно присутствующую информацию "
-                        "и вернуть структурированные данные.\n\n"
-
-                        "КРИТИЧЕСКИЕ ПРАВИЛА:\n"
-                        "- Ничего не додумывай.\n"
-                        "- Не делай предположений.\n"
-                        "- Не интерпретируй косвенные намёки.\n"
-                        "- Если нет прямого указания — возвращай null.\n"
-                        "- Если есть малейшая неопределённость — возвращай null.\n\n"
-
-                        "Правила извлечения:\n"
-                        "1. full_name — ФИО целиком, если явно указано.\n"
-                        "   Дополнительно разбери ФИО на компоненты (порядок в русском: Фамилия Имя Отчество, или Имя Отчество Фамилия):\n"
-                        "   - last_name — фамилия;\n"
-                        "   - first_name — имя;\n"
-                        "   - patronymic — отчество (если есть, иначе null).\n"
-                        "   Если ФИО неполное (например, только имя) — заполни только известные поля, остальные null.\n"
-                        "2. gender — только если:\n"
-                        "   - явно указан пол\n"
-                        "   - или однозначно определяется по ФИО.\n"
-                        "   Иначе null.\n"
-                        "3. birth_date — дата рождения строго в формате YYYY-MM-DD.\n"
-                        "   - если указан только год → YYYY-01-01\n"
-                        "   - если формат невозможно определить точно → null\n"
-                        "4. age — только если возраст явно указан числом.\n"
-                        "   Не вычислять возраст из даты рождения.\n"
-                        "5. job_type — только 'склад' или 'производство', "
-                        "если это прямо указано.\n"
-                        "   Иначе null.\n"
-                        "6. region — город или регион проживания, если явно указан.\n\n"
-
-                        "Ответ должен быть строго через вызов функции."
-                    )
-                },
-                {
-                    "role": "user",
-                    "content": user_content
-                }
-            ],
-            tools=[
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "generate_brief",
-                        "description": "Извлекает структурированные данные кандидата",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "full_name": {
-                                    "type": ["string", "null"],
-                                    "description": "ФИО целиком"
-                                },
-                                "last_name": {
-                                    "type": ["string", "null"],
-                                    "description": "Фамилия"
-                                },
-                                "first_name": {
-                                    "type": ["string", "null"],
-                                    "description": "Имя"
-                                },
-                                "patronymic": {
-                                    "type": ["string", "null"],
-                                    "description": "Отчество (если нет — null)"
-                                },
-                                "gender": {
-                                    "type": ["string", "null"],
-                                    "enum": ["мужчина", "женщина"]
-                                },
-                                "birth_date": {
-                                    "type": ["string", "null"],
-                                    "description": "YYYY-MM-DD"
-                                },
-                                "age": {
-                                    "type": ["number", "null"]
-                                },
-                                "job_type": {
-                                    "type": ["string", "null"],
-                                    "enum": ["склад", "производство"]
-                                },
-                                "region": {
-                                    "type": ["string", "null"]
-                                }
-                            },
-                            "required": [
-                                "full_name",
-                                "last_name",
-                                "first_name",
-                                "patronymic",
-                                "gender",
-                                "birth_date",
-                                "age",
-                                "job_type",
-                                "region"
-                            ],
-                            "additionalProperties": False
-                        }
-                    }
-                }
-            ],
-            tool_choice={
-                "type": "function",
-                "function": {"name": "generate_brief"}
-            }
-        )
+        resp = await _create(prompts.SUMMARIZE_QUESTIONNAIRE, summarize_request(result))
         tool_calls = resp.choices[0].message.tool_calls
         if not tool_calls:
             logging.getLogger("userbot").error(
@@ -506,32 +641,28 @@ def summarize_questionnaire(result: Dict[str, Any]) -> Dict[str, Any]:
             "region": None,
         }
 
-    birth_date_str = data.get("birth_date")
-    birth_date_iso: str | None = None
-    age: int | None = None
-    if isinstance(birth_date_str, str) and birth_date_str:
-        try:
-            dt = datetime.fromisoformat(birth_date_str).date()
-            birth_date_iso = dt.isoformat()
-            today = date.today()
-            age = today.year - dt.year - (
-                (today.month, today.day) < (dt.month, dt.day)
-            )
-        except ValueError as e:
-            logging.getLogger("userbot").exception(
-                "summarize_questionnaire: неверный birth_date: %s", e
-            )
-            birth_date_iso = None
-            age = None
+    return parse_brief(data)
 
-    return {
-        "full_name": data.get("full_name"),
-        "last_name": data.get("last_name"),
-        "first_name": data.get("first_name"),
-        "patronymic": data.get("patronymic"),
-        "gender": data.get("gender"),
-        "birth_date": birth_date_iso,
-        "age": age,
-        "job_type": data.get("job_type"),
-        "region": data.get("region"),
-    }
+
+async def extract_short_fields(question: str, answer: str, fields: list[str]) -> Dict[str, Any]:
+    """
+    Извлечь поля выжимки (подмножество full_name … region) из одного ответа анкеты — короткий вызов
+    вместо summarize_questionnaire по всей анкете. Возвращает {поле: значение или None} ровно по fields;
+    при ошибке API бросает исключение. birth_date — как вернула модель (проверку делает вызывающий).
+    """
+    prompt = prompts.EXTRACT_SHORT_FIELDS
+    resp = await _create(
+        prompt,
+        prompt.request(
+            "Вот один вопрос анкеты и ответ кандидата. "
+            f"Заполни только поля: {', '.join(fields)}.\n\n"
+            f"Вопрос: {question}\nОтвет кандидата: {answer}",
+            tool=prompts.brief_tool(fields),
+            temperature=0,
+        ),
+    )
+    tool_calls = resp.choices[0].message.tool_calls
+    if not tool_calls:
+        raise ValueError("extract_short_fields: no tool_calls in response")
+    data = json.loads(tool_calls[0].function.arguments)
+    return {f: data.get(f) for f in fields}
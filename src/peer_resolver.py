@@ -0,0 +1,213 @@
+"""
+Резолвер кандидатов кампании: пакетный импорт телефонов в контакты и упреждающее
+получение entity для следующих кандидатов, пока идут текущие опросы.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Optional
+
+from telethon import functions, types
+
+from config import CONTACTS_IMPORT_BATCH
+from . import send_queue
+from .entity_cache import EntityCache, phone_key, username_key
+
+log = logging.getLogger("userbot")
+
+Entry = dict[str, Optional[str]]
+
+
+def _entry_key(entry: Entry) -> tuple[str | None, str | None]:
+    return (entry.get("username"), entry.get("phone"))
+
+
+def _consume_exception(fut: asyncio.Future) -> None:
+    # Резолв, который никто не ждёт (кандидат ушёл на другой аккаунт), не ругается «exception was never retrieved»
+    if not fut.cancelled():
+        fut.exception()
+
+
+class PeerResolver:
+    """
+    Телефоны импортируются пачками по CONTACTS_IMPORT_BATCH одним ImportContactsRequest;
+    из ответа (users) сразу берутся id + access_hash, без отдельного get_entity.
+    Кандидаты только с username резолвятся по одному в фоне.
+    Если передан cache — сначала смотрим в него, результаты резолва туда же и записываются.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        batch_size: int = CONTACTS_IMPORT_BATCH,
+        cache: EntityCache | None = None,
+    ) -> None:
+        self._client = client
+        self._cache = cache
+        self._batch_size = max(1, int(batch_size))
+        self._futures: dict[tuple[str | None, str | None], asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+        # Пользователи, добавленные в контакты этим резолвером (для очистки в конце кампании)
+        self._imported: dict[int, types.InputUser] = {}
+        # id контактов аккаунта до импорта (contacts.GetContactIDs, один раз): их cleanup не трогает
+        self._contact_ids: asyncio.Task[set[int] | None] | None = None
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def prefetch(self, entries: list[Entry]) -> None:
+        """Запустить в фоне резолв кандидатов, которые ещё не резолвились."""
+        loop = asyncio.get_running_loop()
+        phone_batch: list[tuple[Entry, asyncio.Future]] = []
+        by_username: list[tuple[Entry, asyncio.Future]] = []
+        for entry in entries:
+            key = _entry_key(entry)
+            if key in self._futures or not (key[0] or key[1]):
+                continue
+            fut = self._futures[key] = loop.create_future()
+            fut.add_done_callback(_consume_exception)
+            cached = self._from_cache(entry)
+            if cached is not None:
+                fut.set_result(cached)
+            elif entry.get("phone"):
+                phone_batch.append((entry, fut))
+            else:
+                by_username.append((entry, fut))
+        for i in range(0, len(phone_batch), self._batch_size):
+            self._spawn(self._import_batch(phone_batch[i : i + self._batch_size]))
+        if by_username:
+            self._spawn(self._resolve_usernames(by_username))
+
+    def discard(self, entry: Entry) -> None:
+        """Кандидат запускается с другого аккаунта: забыть его упреждающий резолв здесь."""
+        self._futures.pop(_entry_key(entry), None)
+
+    def _from_cache(self, entry: Entry) -> Any:
+        if self._cache is None:
+            return None
+        return self._cache.get(phone_key(entry.get("phone"))) or self._cache.get(username_key(entry.get("username")))
+
+    def _remember(self, entity: Any, entry: Entry) -> None:
+        if self._cache is not None:
+            self._cache.put(entity, username=entry.get("username"), phone=entry.get("phone"))
+
+    async def resolve(self, entry: Entry) -> Any:
+        """Entity кандидата (User); при неудаче — исключение."""
+        key = _entry_key(entry)
+        if key not in self._futures:
+            self.prefetch([entry])
+        fut = self._futures.get(key)
+        if fut is None:
+            raise ValueError("пустой кандидат: нет ни username, ни телефона")
+        try:
+            return await asyncio.shield(fut)
+        finally:
+            # Результат нужен один раз; повторный запрос для того же кандидата резолвится заново
+            if fut.done():
+                self._futures.pop(key, None)
+
+    async def _existing_contact_ids(self) -> set[int] | None:
+        """id уже существующих контактов; None, если список получить не удалось (тогда очищать нечего)."""
+        # Запрос — отдельной задачей: отмена первого ожидающего не оставляет остальных без ответа
+        if self._contact_ids is None or self._contact_ids.cancelled():
+            self._contact_ids = asyncio.get_running_loop().create_task(self._fetch_contact_ids())
+        return await asyncio.shield(self._contact_ids)
+
+    async def _fetch_contact_ids(self) -> set[int] | None:
+        try:
+            ids = await send_queue.call(
+                self._client,
+                functions.contacts.GetContactIDsRequest(hash=0),
+                kind="import",
+            )
+        except Exception as e:
+            log.warning("Список контактов не получен, импортированные контакты не будут удалены: %s", e)
+            return None
+        return set(ids)
+
+    async def _import_batch(self, batch: list[tuple[Entry, asyncio.Future]]) -> None:
+        existing = await self._existing_contact_ids()
+        contacts = [
+            types.InputPhoneContact(
+                client_id=i,
+                phone=entry["phone"],
+                first_name=f"vaxtaR кандидат {entry['phone']}",
+                last_name="",
+            )
+            for i, (entry, _) in enumerate(batch)
+        ]
+        try:
+            result = await send_queue.call(
+                self._client,
+                functions.contacts.ImportContactsRequest(contacts=contacts),
+                kind="import",
+            )
+        except Exception as e:
+            log.exception("Пакетный импорт контактов (%s шт.) не удался: %s", len(batch), e)
+            result = None
+
+        users_by_id: dict[int, Any] = {}
+        by_client_id: dict[int, Any] = {}
+        if result is not None:
+            users_by_id = {u.id: u for u in result.users}
+            for imp in result.imported:
+                user = users_by_id.get(imp.user_id)
+                if user is not None:
+                    by_client_id[imp.client_id] = user
+                    # Кандидат уже был в контактах до кампании — не наш импорт, в конце не удаляем
+                    if existing is None or user.id in existing:
+                        continue
+                    if getattr(user, "access_hash", None) is not None:
+                        self._imported[user.id] = types.InputUser(user.id, user.access_hash)
+
+        for i, (entry, fut) in enumerate(batch):
+            user = by_client_id.get(i)
+            if user is not None:
+                self._remember(user, entry)
+                fut.set_result(user)
+                continue
+            # Номер не найден в Telegram (или импорт упал) — пробуем по username, если он есть
+            if entry.get("username"):
+                await self._resolve_one(entry, fut)
+            else:
+                fut.set_exception(ValueError(f"номер {entry.get('phone')} не найден в Telegram"))
+
+    async def _resolve_usernames(self, items: list[tuple[Entry, asyncio.Future]]) -> None:
+        # По одному: ResolveUsername сильно ограничен Telegram
+        for entry, fut in items:
+            await self._resolve_one(entry, fut)
+
+    async def _resolve_one(self, entry: Entry, fut: asyncio.Future) -> None:
+        peer = entry.get("username") or entry.get("phone")
+        try:
+            entity = await self._client.get_entity(peer)
+        except Exception as e:
+            fut.set_exception(e)
+            return
+        self._remember(entity, entry)
+        fut.set_result(entity)
+
+    async def cleanup(self) -> int:
+        """
+        Удалить из контактов тех, кого добавил резолвер (пачками); бывшие в контактах до кампании
+        остаются. Возвращает число удалённых.
+        """
+        ids = list(self._imported.values())
+        removed = 0
+        for i in range(0, len(ids), self._batch_size):
+            chunk = ids[i : i + self._batch_size]
+            try:
+                await send_queue.call(
+                    self._client,
+                    functions.contacts.DeleteContactsRequest(id=chunk),
+                    kind="import",
+                )
+                removed += len(chunk)
+            except Exception as e:
+                log.exception("Пакетное удаление контактов (%s шт.) не удалось: %s", len(chunk), e)
+        self._imported.clear()
+        return removed
@@ -0,0 +1,121 @@
+"""
+Статус «В сети» и отметки о прочтении: один переход online/offline на весь аккаунт
+по числу активных диалогов и склейка read acknowledge по чату до максимального max_id.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+from typing import Any
+
+from config import READ_ACK_WINDOW_SEC
+from . import metrics, send_queue
+
+log = logging.getLogger("userbot")
+
+# Через сколько секунд после завершения последнего диалога уходить из сети
+OFFLINE_DELAY_MIN_SEC = 10
+OFFLINE_DELAY_MAX_SEC = 40
+
+
+class PresenceManager:
+    """
+    touch(user_id) — сообщение в активном диалоге (online, если ещё не online);
+    release(user_id) — диалог завершён; когда активных не осталось — offline через 10–40 с.
+    """
+
+    def __init__(self, client: Any, read_window_sec: float = READ_ACK_WINDOW_SEC) -> None:
+        self._client = client
+        self._read_window = read_window_sec
+        self._active: set[int] = set()
+        self._online: bool | None = None
+        self._offline_task: asyncio.Task | None = None
+        # chat_id -> максимальный max_id, ещё не отправленный
+        self._pending_reads: dict[Any, int] = {}
+        self._read_tasks: dict[Any, asyncio.Task] = {}
+
+    @property
+    def active_count(self) -> int:
+        return len(self._active)
+
+    async def _set_status(self, online: bool) -> None:
+        if self._online is online:
+            return
+        self._online = online
+        metrics.inc("presence_transitions", online=online)
+        try:
+            await send_queue.set_status(self._client, offline=not online)
+        except Exception as e:
+            log.debug("Не удалось сменить статус «В сети» (online=%s): %s", online, e)
+
+    def _cancel_offline(self) -> None:
+        t = self._offline_task
+        if t and not t.done():
+            t.cancel()
+        self._offline_task = None
+
+    async def touch(self, user_id: int) -> None:
+        """Отметить диалог с user_id активным и быть «В сети»."""
+        self._active.add(user_id)
+        metrics.set_gauge("presence_active_dialogues", len(self._active))
+        self._cancel_offline()
+        await self._set_status(True)
+
+    async def release(self, user_id: int) -> None:
+        """Диалог с user_id завершён; если активных не осталось — запланировать offline."""
+        self._active.discard(user_id)
+        metrics.set_gauge("presence_active_dialogues", len(self._active))
+        if self._active or self._online is False:
+            return
+        self._cancel_offline()
+        delay = random.randint(OFFLINE_DELAY_MIN_SEC, OFFLINE_DELAY_MAX_SEC)
+
+        async def _go_offline() -> None:
+            try:
+                await asyncio.sleep(delay)
+                if not self._active:
+                    await self._set_status(False)
+            except asyncio.CancelledError:
+                pass
+
+        self._offline_task = asyncio.get_running_loop().create_task(_go_offline())
+
+    async def force_offline(self) -> None:
+        """Сразу «не в сети» (старт и завершение процесса)."""
+        self._cancel_offline()
+        self._online = None
+        await self._set_status(False)
+
+    def mark_read(self, chat_id: Any, max_id: int) -> None:
+        """Отметить прочитанным до max_id; запросы по одному чату за окно склеиваются в один."""
+        prev = self._pending_reads.get(chat_id, 0)
+        self._pending_reads[chat_id] = max(prev, max_id)
+        if prev:
+            metrics.inc("presence_read_coalesced")
+        t = self._read_tasks.get(chat_id)
+        if t is None or t.done():
+            self._read_tasks[chat_id] = asyncio.get_running_loop().create_task(self._flush_read(chat_id))
+
+    async def _flush_read(self, chat_id: Any) -> None:
+        try:
+            await asyncio.sleep(self._read_window)
+        except asyncio.CancelledError:
+            return
+        max_id = self._pending_reads.pop(chat_id, 0)
+        self._read_tasks.pop(chat_id, None)
+        if not max_id:
+            return
+        try:
+            await send_queue.read_acknowledge(self._client, chat_id, max_id)
+        except Exception:
+            log.exception("Failed to send read acknowledge")
+
+    def close(self) -> None:
+        """Отменить отложенные задачи (при остановке)."""
+        self._cancel_offline()
+        for t in self._read_tasks.values():
+            if not t.done():
+                t.cancel()
+        self._read_tasks.clear()
@@ -6,8 +6,9 @@ import asyncio
 import json
 import logging
 import random
+import threading
 from datetime import datetime, timezone, timedelta
-from typing import Any
+from typing import Any, Callable
 
 from config import (
     HR_ACCOUNT,
@@ -21,19 +22,25 @@ from config import (
     RESULTS_JSON_DIR,
     RESULTS_TEXT_DIR,
     TOGGLE_DELAY,
+    VERDICT_CACHE,
+    INCREMENTAL_SHORT,
+    VACANCY_PREFETCH,
     setup_logging,
 )
-from . import openai_client
-from .human_delay import human_like_delay
-from .vacancies import (
-    enrich_offerings,
-    filter_from_short,
-    format_top_vacancies_report,
-    generate_filter,
-    get_job_offerings,
-    get_places,
-    split_vacancy_messages,
+from . import (
+    intent,
+    llm_pool,
+    metrics,
+    openai_client,
+    send_queue,
+    short_extract,
+    vacancy_prefetch,
+    validators,
+    verdict_cache,
 )
+from .human_delay import STREAM_TYPING_EXTEND_SEC, ReplyBudget, human_like_delay
+from .typing_scheduler import get_scheduler
+from .vacancies import format_top_vacancies_report, split_vacancy_messages
 
 setup_logging()
 log = logging.getLogger("userbot")
@@ -58,6 +65,10 @@ _dialogue_state: dict[int, dict[str, Any]] = {}
 GOODBYE_DECLINED = "Спасибо за ответ. Если передумаете — мы всегда рады. Всего доброго!"
 GOODBYE_EARLY = "К сожалению, мы вынуждены завершить опрос. Спасибо за уделенное время."
 REPEAT_ANSWER = "Пожалуйста, ответьте ещё раз, избегая грубых выражений."
+# Ответ отклонён локальной проверкой без известной причины
+CLARIFY_ANSWER = "Пожалуйста, уточните ответ и напишите его ещё раз."
+# Ответ не удалось проверить (LLM недоступна): он не засчитывается, вопрос остаётся открытым
+RETRY_ANSWER = "Извините, не успел разобрать ваш ответ. Напишите его, пожалуйста, ещё раз."
 
 
 def _load_greetings() -> list[str]:
@@ -101,11 +112,42 @@ def _load_questions() -> list[dict[str, Any]]:
     return data if isinstance(data, list) else list(data.values()) if isinstance(data, dict) else []
 
 
+# Файлы результатов пишутся в потоках (asyncio.to_thread); агрегированные файлы
+# (short.json, vacancies.json, vacancy_dialogues.json) читаются и переписываются под этой блокировкой
+_results_lock = threading.Lock()
+
+
 def _ensure_results_dirs() -> None:
     RESULTS_JSON_DIR.mkdir(parents=True, exist_ok=True)
     RESULTS_TEXT_DIR.mkdir(parents=True, exist_ok=True)
 
 
+def _write_json(path: Any, data: Any, what: str) -> None:
+    """Записать data в path как JSON (в потоке); ошибка — только в лог."""
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        log.exception("Save %s failed: %s", what, e)
+
+
+def _merge_json_file(path: Any, key: str, value: Any, what: str) -> None:
+    """Записать value по key в агрегированный JSON-файл {key: value} (в потоке, под _results_lock)."""
+    try:
+        with _results_lock:
+            if path.exists():
+                with open(path, "r", encoding="utf-8") as f:
+                    data: dict[str, Any] = json.load(f)
+            else:
+                data = {}
+            data[key] = value
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        log.exception("Save %s failed: %s", what, e)
+
+
 def _append_dialogue_history(
     user_id: int,
     *,
@@ -216,7 +258,10 @@ def init_session(user_id: int, username: str | None = None) -> None:
         "current_q_index": 0,
         "question_keys": get_question_keys(),
         "username": username,
+        # Выжимка по мере ответов (short_extract); уходит в доставку через finish_session
+        "short": {},
     }
+    metrics.inc("questionnaire_sessions")
 
 
 async def handle_agreement(user_id: int, username: str | None, message_text: str) -> tuple[str, bool]:
@@ -229,7 +274,17 @@ async def handle_agreement(user_id: int, username: str | None, message_text: str
         return ("", False)
 
     state["username"] = username or state.get("username")
-    agreed = await asyncio.to_thread(openai_client.evaluate_agreement, message_text)
+    # «да», «ок», «нет», 👍 и т.п. решаем локально; LLM — только для неоднозначного текста
+    agreed = intent.classify_agreement(message_text)
+    intent.record("agreement", agreed)
+    if agreed is None:
+        try:
+            agreed = await openai_client.evaluate_agreement(message_text)
+        except Exception as e:
+            # LLM недоступна: развёрнутый ответ без брани — скорее согласие, чем отказ (отказы ловит intent)
+            log.warning("evaluate_agreement failed, local fallback: %s", e)
+            agreed = not intent.has_profanity(message_text)
+            metrics.inc("agreement_fallback", verdict=agreed)
     if not agreed:
         state["state"] = "declined"
         return (GOODBYE_DECLINED, True)
@@ -245,14 +300,57 @@ async def handle_agreement(user_id: int, username: str | None, message_text: str
     return (first_q, False)
 
 
+async def _validate_with_cache(
+    q_key: str,
+    question_text: str,
+    message_text: str,
+    acceptance_criteria: str,
+    on_progress: Callable[[], None] | None = None,
+) -> tuple[bool, str]:
+    """
+    validate_answer с кэшем вердиктов по (вопрос, критерии, нормализованный ответ).
+    Кэшируется только valid: отрицательный вердикт (возможно, ошибочный) не закрепляется за ответом
+    для всех следующих кандидатов — его каждый раз проверяет LLM (записи False из старых версий — промах).
+    Ошибка LLM (в т.ч. открытый предохранитель) пробрасывается: ответ без проверки не принимается.
+    """
+    cache = verdict_cache.get_cache() if VERDICT_CACHE else None
+    key = verdict_cache.make_key(q_key, acceptance_criteria, message_text) if cache else None
+    if key and await cache.get(key):
+        return (True, "")
+    valid, human_response = await openai_client.validate_answer(
+        question_text, message_text, acceptance_criteria, raise_on_error=True, on_progress=on_progress
+    )
+    if key and valid:
+        await cache.put(key, True)
+    return (valid, human_response)
+
+
+def _local_rejection_reply(reason: str) -> str:
+    """Ответ рекрутера на отклонённый локальным валидатором ответ: причина и просьба уточнить."""
+    if not reason:
+        return CLARIFY_ANSWER
+    return f"Кажется, тут неточность: {reason}. Проверьте, пожалуйста, и напишите ещё раз."
+
+
+def _prefetch_vacancies(state: dict[str, Any], short: dict[str, Any]) -> None:
+    """Поля фильтра в выжимке изменились — перезапустить упреждающую загрузку вакансий кандидата."""
+    if state.get("finished"):
+        # Разбор ответа закончился после finish_session: ключ уже передан (или освобождён), новую загрузку не начинаем
+        return
+    state["prefetch_key"] = vacancy_prefetch.prefetch(short, state.get("prefetch_key"))
+
+
 async def handle_answer(
     user_id: int,
     username: str | None,
     message_text: str,
+    on_progress: Callable[[], None] | None = None,
 ) -> tuple[str, bool]:
     """
-    Обработать ответ на вопрос через validate_answer.
+    Обработать ответ на вопрос: локальный validator из questions.json, иначе validate_answer
+    (отказ локального валидатора объясняется его причиной, без LLM).
     Возвращает (текст ответа бота, закончена_ли сессия).
+    on_progress — продление «печатает» во время потокового ответа LLM (ReplyBudget.keep_alive).
     """
     state = _state.get(user_id)
     if not state or state["state"] != "asking":
@@ -270,12 +368,29 @@ async def handle_answer(
     question_text = q_full.get("question", "")
     acceptance_criteria = q_full.get("acceptance", "")
 
-    valid, human_response = await asyncio.to_thread(
-        openai_client.validate_answer,
-        question_text,
-        message_text,
-        acceptance_criteria,
-    )
+    # Локальная проверка по блоку validator вопроса; LLM — если она не дала ответа
+    # или нужен человеческий текст отказа
+    local_valid, reject_reason = validators.evaluate(q_full.get("validator"), message_text)
+    if local_valid is None:
+        metrics.inc("validation_llm")
+    else:
+        metrics.inc("validation_local", verdict=local_valid)
+    if local_valid:
+        valid, human_response = True, ""
+    elif local_valid is False:
+        # Причина отказа известна точно («такой даты не существует») — отвечаем ею, без LLM
+        valid, human_response = False, _local_rejection_reply(reject_reason)
+    else:
+        try:
+            valid, human_response = await _validate_with_cache(
+                q_key, question_text, message_text, acceptance_criteria, on_progress
+            )
+        except Exception as e:
+            # LLM недоступна (ошибка, срок вызова, открыт предохранитель): ответ не засчитываем
+            # и не пишем в отчёт — вопрос остаётся открытым, кандидата просим повторить
+            log.warning("Answer validation unavailable, asking to repeat: %s", e)
+            metrics.inc("validation_unavailable")
+            return (RETRY_ANSWER, False)
 
     state["report"].append({
         "q_number": q_key,
@@ -289,6 +404,15 @@ async def handle_answer(
     if not valid:
         return (human_response or REPEAT_ANSWER, False)
 
+    if INCREMENTAL_SHORT:
+        short_extract.extract(
+            state.setdefault("short", {}),
+            q_full.get("extract"),
+            question_text,
+            message_text,
+            on_update=(lambda short: _prefetch_vacancies(state, short)) if VACANCY_PREFETCH else None,
+        )
+
     state["current_q_index"] = idx + 1
     if state["current_q_index"] >= len(keys):
         state["state"] = "completed"
@@ -335,25 +459,57 @@ def build_questionnaire_result_from_state(state: dict[str, Any]) -> dict[str, An
     }
 
 
-async def dump_result_and_save_text(
+# Этапы доставки результата опроса. Контекст ctx — JSON-сериализуемый словарь,
+# чтобы незавершённую доставку можно было сохранить на диск и продолжить с того же этапа.
+DELIVERY_STAGES = ("report", "summary", "vacancies", "hr", "candidate", "dialogue", "dump")
+
+
+def new_delivery_context(
     result: dict[str, Any],
-    client: Any,
     send_to_hr: bool = True,
     hr_account: str | None = None,
     candidate_entity: int | str | None = None,
     candidate_phone: str | None = None,
-) -> str:
-    """
-    Дамп questionnaire_result в questionnaire_results/json,
-    сформировать текст отчёта, сохранить в questionnaire_results/text/,
-    при необходимости переслать в ЛС HR; отчёт по 1 вакансии — также кандидату (отдельным текстом), если передан candidate_entity.
-    Возвращает путь к сохранённому txt.
-    """
-    _ensure_results_dirs()
-    user_label = result.get("user", "unknown").replace("@", "")
-    now = datetime.now(UTC_PLUS_3)
+) -> dict[str, Any]:
+    """Контекст доставки результата опроса (вход для run_delivery_stage)."""
+    return {
+        "result": result,
+        "send_to_hr": send_to_hr,
+        "hr": (hr_account or HR_ACCOUNT) or "",
+        "candidate_entity": candidate_entity,
+        "candidate_phone": candidate_phone,
+        "now": datetime.now(UTC_PLUS_3).isoformat(),
+        "text_path": None,
+        # Выжимка, собранная по ходу опроса (finish_session); в отчёт result она не попадает
+        "short": result.pop("_short", None),
+        "prefetch_key": result.pop("_prefetch_key", None),
+        "offerings": [],
+        "report_text": None,
+        "total_count": 0,
+        "wait_msg": None,
+        "candidate_intro": None,
+        "candidate_delivered": False,
+    }
+
+
+def release_delivery_context(ctx: dict[str, Any]) -> None:
+    """Доставка закончена или брошена: освободить упреждающую загрузку вакансий, если этап vacancies до неё не дошёл."""
+    vacancy_prefetch.release(ctx.get("prefetch_key"))
+    ctx["prefetch_key"] = None
+
+
+def _ctx_labels(ctx: dict[str, Any]) -> tuple[str, datetime, str, str]:
+    """user_label, now, ts, safe_ts для имён файлов."""
+    user_label = ctx["result"].get("user", "unknown").replace("@", "")
+    now = datetime.fromisoformat(ctx["now"])
     ts = now.strftime("%Y_%m_%d-%H_%M")
-    safe_ts = ts.replace("-", "_")
+    return user_label, now, ts, ts.replace("-", "_")
+
+
+async def _stage_report(ctx: dict[str, Any], client: Any) -> None:
+    """Дамп questionnaire_result в json, текст отчёта в text/ и в ЛС HR."""
+    result = ctx["result"]
+    user_label, _now, ts, safe_ts = _ctx_labels(ctx)
 
     lines = [
         f"Опросник: {result.get('user')}",
@@ -377,353 +533,455 @@ async def dump_result_and_save_text(
     text_body = "\n".join(lines)
     text_filename = f"{user_label}_{ts}.txt"
     text_path = RESULTS_TEXT_DIR / text_filename
+    ctx["text_path"] = str(text_path)
 
     if SAVE_RESULTS_TO_FILES:
         json_path = RESULTS_JSON_DIR / f"{user_label}_{safe_ts}.json"
-        try:
-            with open(json_path, "w", encoding="utf-8") as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            log.exception("Save questionnaire JSON failed: %s", e)
-        try:
-            with open(text_path, "w", encoding="utf-8") as f:
-                f.write(text_body)
-        except Exception as e:
-            log.exception("Save questionnaire TXT failed: %s", e)
 
-    hr = (hr_account or HR_ACCOUNT) or ""
-    if send_to_hr and hr and client:
+        def _save() -> None:
+            _ensure_results_dirs()
+            _write_json(json_path, result, "questionnaire JSON")
+            try:
+                with open(text_path, "w", encoding="utf-8") as f:
+                    f.write(text_body)
+            except Exception as e:
+                log.exception("Save questionnaire TXT failed: %s", e)
+
+        await asyncio.to_thread(_save)
+
+    hr = ctx["hr"]
+    if ctx["send_to_hr"] and hr and client:
         try:
-            await client.send_message(hr, text_body)
+            await send_queue.send_message(client, hr, text_body, priority=send_queue.PRIORITY_BULK)
         except Exception as e:
             log.exception("Send to HR failed: %s", e)
             print(f"Отчёт не отправлен HR_ACCOUNT={hr}: {e}")
     else:
-        if not send_to_hr:
+        if not ctx["send_to_hr"]:
             print("Отчёт не отправлен: отправка отключена (send_to_hr=False)")
         elif not hr:
             print("Отчёт не отправлен: не задан HR_ACCOUNT")
         elif not client:
             print("Отчёт не отправлен: клиент Telegram не инициализирован")
 
-    # Короткая выжимка (short) — передаём напрямую в загрузку вакансий; сохранение в файл только для истории
-    short = None
-    try:
-        short = await asyncio.to_thread(openai_client.summarize_questionnaire, result)
-        print("Краткая выжимка опроса:", short)
-    except Exception as e:
-        log.exception("Short summary failed: %s", e)
 
-    if SAVE_RESULTS_TO_FILES and short is not None:
-        # Старый формат: один файл на запуск (для истории)
+SHORT_STORE_PATH = RESULTS_JSON_DIR / "short.json"
+
+
+def short_store_key(id_value: str, when: datetime) -> str:
+    """Ключ записи в short.json: "(@username или телефон, YYYY-mm-dd HH:MM)"."""
+    return f"({id_value}, {when.strftime('%Y-%m-%d %H:%M')})"
+
+
+def merge_short_store(entries: dict[str, dict[str, Any]]) -> int:
+    """
+    Слить выжимки в агрегированный short.json (запись через временный файл). Повторное слияние тех же данных
+    ничего не меняет; телефон из прежней записи сохраняется, если в новой его нет. Возвращает число изменённых записей.
+    Синхронно (из доставки — через asyncio.to_thread).
+    """
+    with _results_lock:
+        return _merge_short_store(entries)
+
+
+def _merge_short_store(entries: dict[str, dict[str, Any]]) -> int:
+    if SHORT_STORE_PATH.exists():
+        with open(SHORT_STORE_PATH, "r", encoding="utf-8") as f:
+            agg: dict[str, Any] = json.load(f)
+    else:
+        agg = {}
+    changed = 0
+    for key, entry in entries.items():
+        old = agg.get(key) or {}
+        entry = dict(entry)
+        if old.get("phone") and not entry.get("phone"):
+            entry["phone"] = old["phone"]
+        if old != entry:
+            agg[key] = entry
+            changed += 1
+    if changed:
+        SHORT_STORE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp = SHORT_STORE_PATH.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(agg, f, ensure_ascii=False, indent=2)
+        tmp.replace(SHORT_STORE_PATH)
+    return changed
+
+
+async def _stage_summary(ctx: dict[str, Any], client: Any) -> None:
+    """Короткая выжимка (short) — передаём напрямую в загрузку вакансий; сохранение в файл только для истории."""
+    result = ctx["result"]
+    candidate_phone = ctx["candidate_phone"]
+    user_label, now, _ts, safe_ts = _ctx_labels(ctx)
+    short = ctx["short"]
+    if short is not None:
+        await short_extract.settle(short)
+    if short_extract.is_complete(short):
+        metrics.inc("short_incremental")
+        short = short_extract.finalize(short)
+        print("Краткая выжимка опроса:", short)
+    else:
+        # Опрос прерван, разбор не удался или доставка продолжена после перезапуска — выжимка по всей анкете
+        metrics.inc("short_summary_fallback")
+        short = None
         try:
-            short_path = RESULTS_JSON_DIR / f"short_{user_label}_{safe_ts}.json"
-            with open(short_path, "w", encoding="utf-8") as f:
-                json.dump(short, f, ensure_ascii=False, indent=2)
+            short = await openai_client.summarize_questionnaire(result)
+            print("Краткая выжимка опроса:", short)
         except Exception as e:
-            log.exception("Save short summary failed: %s", e)
+            log.exception("Short summary failed: %s", e)
+    ctx["short"] = short
 
-        # Новый агрегированный формат: { (id, datetime): short_with_phone }
-        try:
-            agg_path = RESULTS_JSON_DIR / "short.json"
-            if agg_path.exists():
-                with open(agg_path, "r", encoding="utf-8") as f:
-                    agg: dict[str, Any] = json.load(f)
-            else:
-                agg = {}
+    if SAVE_RESULTS_TO_FILES and short is not None:
+        # Идентификатор кандидата в ключе: @username или телефон, если username нет
+        id_value = result.get("user") or candidate_phone or "unknown"
+        entry = dict(short)
+        if candidate_phone:
+            entry["phone"] = candidate_phone
+
+        def _save() -> None:
+            _ensure_results_dirs()
+            # Старый формат: один файл на запуск (для истории)
+            _write_json(RESULTS_JSON_DIR / f"short_{user_label}_{safe_ts}.json", short, "short summary")
+            # Новый агрегированный формат: { (id, datetime): short_with_phone }
+            try:
+                merge_short_store({short_store_key(id_value, now): entry})
+            except Exception as e:
+                log.exception("Save aggregated short.json failed: %s", e)
 
-            # Идентификатор кандидата в ключе: @username или телефон, если username нет
-            id_value = result.get("user") or candidate_phone or "unknown"
-            # Дата-время в ключе: "YYYY-mm-dd HH:MM"
-            ts_key = now.strftime("%Y-%m-%d %H:%M")
-            dict_key = f"({id_value}, {ts_key})"
+        await asyncio.to_thread(_save)
 
-            entry = dict(short)
-            if candidate_phone:
-                entry["phone"] = candidate_phone
 
-            agg[dict_key] = entry
-            with open(agg_path, "w", encoding="utf-8") as f:
-                json.dump(agg, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            log.exception("Save aggregated short.json failed: %s", e)
-
-    # Автозагрузка вакансий по short: описание 1-й вакансии — HR напрямую; сохранение в файл только для истории
-    offerings: list[dict[str, Any]] = []
-    report_text: str | None = None
-    total_count: int = 0
-
-    if short is not None and VACANCY_API_KEY and hr and client:
-        def _fetch_and_report() -> tuple[list, str | None, int]:
-            places_resp = get_places()
-            places = places_resp.get("data", [])
-            flat = filter_from_short(short, places)
-            if not flat:
-                return [], None, 0
-            filter_dict = generate_filter(flat)
-            raw = get_job_offerings(filter_dict=filter_dict)
-            offerings_local = enrich_offerings(raw, places)
-            meta = raw.get("meta") or {}
-            print(meta)
-            total_count_local = meta.get("count") or len(offerings_local)
-            report_local = (
-                format_top_vacancies_report(offerings_local, top_n=VACANCY_TOP_N)
-                if offerings_local
-                else None
-            )
-            return offerings_local, report_local, total_count_local
+async def _stage_vacancies(ctx: dict[str, Any], client: Any) -> None:
+    """Автозагрузка вакансий по short."""
+    short = ctx["short"]
+    # Ссылка кандидата на упреждающую загрузку освобождается здесь (take или release), один раз
+    prefetch_key, ctx["prefetch_key"] = ctx.get("prefetch_key"), None
+    if short is None or not VACANCY_API_KEY or not ctx["hr"] or not client:
+        vacancy_prefetch.release(prefetch_key)
+        return
+
+    # Обычно вакансии уже загружены в фоне по ходу опроса (vacancy_prefetch)
+    fetched = await vacancy_prefetch.take(short, prefetch_key) if VACANCY_PREFETCH else None
+    try:
+        if fetched is None:
+            fetched = await asyncio.to_thread(vacancy_prefetch.fetch_vacancies, short)
+        offerings, report_text, total_count = fetched
+    except Exception as e:
+        log.exception("Vacancy fetch failed: %s", e)
+        offerings, report_text, total_count = [], None, 0
 
+    print(f"Всего найдено вакансий: {total_count}")
+    ctx["offerings"] = offerings
+    ctx["report_text"] = report_text
+    ctx["total_count"] = total_count
+
+
+def _vacancies_fetched(ctx: dict[str, Any], client: Any) -> bool:
+    return ctx["short"] is not None and bool(VACANCY_API_KEY and ctx["hr"] and client)
+
+
+async def _stage_hr(ctx: dict[str, Any], client: Any) -> None:
+    """Описание 1-й вакансии — HR напрямую (шапка + тело)."""
+    if not _vacancies_fetched(ctx, client):
+        return
+    hr = ctx["hr"]
+    result = ctx["result"]
+    report_text = ctx["report_text"]
+
+    if not ctx["offerings"] or ctx["total_count"] == 0:
         try:
-            offerings, report_text, total_count = await asyncio.to_thread(_fetch_and_report)
+            # TODO: заменить на более содержательное уведомление HR
+            # о причинах отсутствия подходящих вакансий и вариантах дальнейших действий.
+            await send_queue.send_message(
+                client, hr, "Подходящие вакансии не найдены.", priority=send_queue.PRIORITY_BULK
+            )
         except Exception as e:
-            log.exception("Vacancy fetch failed: %s", e)
-            offerings = []
-            report_text = None
-            total_count = 0
+            log.exception("Send 'no vacancies found' notice to HR failed: %s", e)
 
-        print(f"Всего найдено вакансий: {total_count}")
+    if not report_text:
+        return
+    try:
+        candidate_display = result.get("user", "unknown")
+        if candidate_display and not str(candidate_display).startswith("@"):
+            candidate_display = f"@{candidate_display}"
+        full_fio, _name_patronymic = _get_fio_from_short(ctx["short"])
+        date_str = _format_report_date(result.get("date"))
+        hr_fio_part = f" ({full_fio})" if full_fio else ""
+        hr_header = (
+            f"Вакансия для кандидата {candidate_display}{hr_fio_part}. "
+            f"Дата опроса: {date_str}. Всего найдено вакансий: {ctx['total_count']}."
+        )
+        # Шапка отдельным сообщением
+        await send_queue.send_message(client, hr, hr_header, priority=send_queue.PRIORITY_BULK)
+        print(f"Отчёт по вакансиям (шапка) отправлен HR {hr}")
+
+        # Тело вакансии (вакансия + футер) — отдельное сообщение/сообщения
+        vacancy_parts = split_vacancy_messages(report_text)
+        # Задержка между шапкой и телом 5–10 секунд
+        await asyncio.sleep(random.randint(5, 10))
+        for idx_part, part in enumerate(vacancy_parts):
+            await send_queue.send_message(client, hr, part, priority=send_queue.PRIORITY_BULK)
+            if idx_part < len(vacancy_parts) - 1:
+                # Задержка между сообщениями тела 4–5 секунд
+                await asyncio.sleep(random.randint(4, 5))
+        print(f"Отчёт по вакансиям отправлен HR {hr}")
+    except Exception as e:
+        log.exception("Vacancy report send failed: %s", e)
 
-        if not offerings or total_count == 0:
-            try:
-                # TODO: заменить на более содержательное уведомление HR
-                # о причинах отсутствия подходящих вакансий и вариантах дальнейших действий.
-                await client.send_message(hr, "Подходящие вакансии не найдены.")
-            except Exception as e:
-                log.exception("Send 'no vacancies found' notice to HR failed: %s", e)
 
-        if report_text:
-            try:
-                candidate_display = result.get("user", "unknown")
-                if candidate_display and not str(candidate_display).startswith("@"):
-                    candidate_display = f"@{candidate_display}"
-                full_fio, name_patronymic = _get_fio_from_short(short)
-                date_str = _format_report_date(result.get("date"))
-                hr_fio_part = f" ({full_fio})" if full_fio else ""
-                hr_header = (
-                    f"Вакансия для кандидата {candidate_display}{hr_fio_part}. "
-                    f"Дата опроса: {date_str}. Всего найдено вакансий: {total_count}."
-                )
-                # Шапка отдельным сообщением
-                await client.send_message(hr, hr_header)
-                print(f"Отчёт по вакансиям (шапка) отправлен HR {hr}")
-
-                # Тело вакансии (вакансия + футер) — отдельное сообщение/сообщения
-                vacancy_parts = split_vacancy_messages(report_text)
-                # Задержка между шапкой и телом 5–10 секунд
-                await asyncio.sleep(random.randint(5, 10))
-                for idx_part, part in enumerate(vacancy_parts):
-                    await client.send_message(hr, part)
-                    if idx_part < len(vacancy_parts) - 1:
-                        # Задержка между сообщениями тела 4–5 секунд
-                        await asyncio.sleep(random.randint(4, 5))
-                print(f"Отчёт по вакансиям отправлен HR {hr}")
-                if name_patronymic:
-                    candidate_intro = (
-                        f"{name_patronymic}, подобрали Вам вакансию, высылаем описание. "
-                        "Можем обсудить другие варианты вакансий."
-                    )
-                else:
-                    candidate_intro = (
-                        "Подобрали Вам вакансию, высылаем описание. "
-                        "Можем обсудить другие варианты вакансий."
-                    )
-
-                vacancy_parts_candidate = split_vacancy_messages(report_text)
-
-                if candidate_entity is not None and client:
-                    try:
-                        if name_patronymic:
-                            wait_msg = (
-                                f"{name_patronymic}, подождите 2-3 минуты, пожалуйста. "
-                                "Подберу Вам образец вакансии."
-                            )   # TODO: уточнить формулировку!
-                        else:
-                            wait_msg = (
-                                "Подождите 2-3 минуты, пожалуйста. "
-                                "Подберу Вам образец вакансии."
-                            )   # TODO: уточнить формулировку!
-                        # Сообщение «подождите 2–3 минуты» с human_like_delay
-                        await human_like_delay(client, candidate_entity, wait_msg)
-                        await client.send_message(candidate_entity, wait_msg)
-
-                        # Задержка на «поиск вакансии» остаётся
-                        if TOGGLE_DELAY != "OFF":
-                            wait_sec = random.randint(120, 180) + random.randint(1, 40)
-                            await asyncio.sleep(wait_sec)
-
-                        # Шапка кандидату отдельным сообщением
-                        if TOGGLE_DELAY != "OFF":
-                            await human_like_delay(client, candidate_entity, candidate_intro)
-                        await client.send_message(candidate_entity, candidate_intro)
-
-                        # Задержка 5–10 сек как на вставку из буфера
-                        await asyncio.sleep(random.randint(5, 10))
-
-                        # Тело вакансии (вакансия + футер) — одно или несколько сообщений,
-                        # без имитации набора (HR не «перепечатывает» текст вакансии).
-                        for idx_part, part in enumerate(vacancy_parts_candidate):
-                            await client.send_message(candidate_entity, part)
-                            if idx_part < len(vacancy_parts_candidate) - 1:
-                                # Задержка между сообщениями тела 4–5 секунд (как «вставка из буфера»)
-                                await asyncio.sleep(random.randint(4, 5))
-
-                        print(f"Отчёт по вакансиям отправлен кандидату {candidate_entity}")
-                        # Инициализируем диалог по вакансиям для кандидата:
-                        # список найденных вакансий, текущая (первая) вакансия,
-                        # история сообщений и метаданные для дампа.
-                        try:
-                            if isinstance(candidate_entity, int):
-                                user_id_for_dialogue = candidate_entity
-                            else:
-                                # Если идентификатор не int, диалог по user_id не ведём
-                                user_id_for_dialogue = None
-                            if user_id_for_dialogue is not None and offerings:
-                                id_value = result.get("user") or candidate_phone or "unknown"
-                                started_at = datetime.now(UTC_PLUS_3)
-                                ts_key = started_at.strftime("%Y-%m-%d %H:%M")
-                                vacancies_by_id: dict[int, dict[str, Any]] = {}
-                                ordered_ids: list[int] = []
-                                for vac in offerings:
-                                    vid = vac.get("id")
-                                    if isinstance(vid, int):
-                                        vacancies_by_id[vid] = vac
-                                        ordered_ids.append(vid)
-                                current_vacancy_id = ordered_ids[0] if ordered_ids else None
-                                _dialogue_state[user_id_for_dialogue] = {
-                                    "appropriate": None,
-                                    "inappropriate": [],
-                                    "vacancies_by_id": vacancies_by_id,
-                                    "ordered_ids": ordered_ids,
-                                    "current_index": 0,
-                                    "current_vacancy_id": current_vacancy_id,
-                                    "history": [],
-                                    "pending_next_vacancy": False,
-                                    "dump_meta": {
-                                        "id_value": id_value,
-                                        "ts_key": ts_key,
-                                        "started_at": started_at.isoformat(),
-                                    },
-                                }
-                                # Сохраняем факт отправки вводного сообщения кандидату
-                                _append_dialogue_history(
-                                    user_id_for_dialogue,
-                                    author="system",
-                                    text=wait_msg,
-                                    vacancy_id=None,
-                                )
-                                _append_dialogue_history(
-                                    user_id_for_dialogue,
-                                    author="system",
-                                    text=candidate_intro,
-                                    vacancy_id=current_vacancy_id,
-                                )
-                                # Первый вопрос об удовлетворённости вакансией — сразу после отправки описания
-                                try:
-                                    satisfaction_question = openai_client.generate_satisfaction_question(
-                                        report_text
-                                    )
-                                except Exception as e:
-                                    log.exception(
-                                        "Generate satisfaction question failed: %s", e
-                                    )
-                                    satisfaction_question = (
-                                        "Как вы оцениваете эту вакансию по условиям работы и требованиям? "
-                                        "Подходит ли она вам?"
-                                    )
-                                _append_dialogue_history(
-                                    user_id_for_dialogue,
-                                    author="llm",
-                                    text=satisfaction_question,
-                                    vacancy_id=current_vacancy_id,
-                                )
-                                if TOGGLE_DELAY != "OFF":
-                                    await human_like_delay(
-                                        client, candidate_entity, satisfaction_question
-                                    )
-                                await client.send_message(
-                                    candidate_entity, satisfaction_question
-                                )
-                        except Exception as e:
-                            log.exception("Init vacancy dialogue state failed: %s", e)
-                    except Exception as e:
-                        log.exception("Send vacancy report to candidate failed: %s", e)
-            except Exception as e:
-                log.exception("Vacancy report send failed: %s", e)
+async def _stage_candidate(ctx: dict[str, Any], client: Any) -> None:
+    """Сообщение «подождите», пауза на «поиск», шапка и тело вакансии — кандидату."""
+    report_text = ctx["report_text"]
+    candidate_entity = ctx["candidate_entity"]
+    if not _vacancies_fetched(ctx, client) or not report_text or candidate_entity is None:
+        return
+    _full_fio, name_patronymic = _get_fio_from_short(ctx["short"])
+    if name_patronymic:
+        candidate_intro = (
+            f"{name_patronymic}, подобрали Вам вакансию, высылаем описание. "
+            "Можем обсудить другие варианты вакансий."
+        )
+        wait_msg = (
+            f"{name_patronymic}, подождите 2-3 минуты, пожалуйста. "
+            "Подберу Вам образец вакансии."
+        )   # TODO: уточнить формулировку!
+    else:
+        candidate_intro = (
+            "Подобрали Вам вакансию, высылаем описание. "
+            "Можем обсудить другие варианты вакансий."
+        )
+        wait_msg = (
+            "Подождите 2-3 минуты, пожалуйста. "
+            "Подберу Вам образец вакансии."
+        )   # TODO: уточнить формулировку!
+    ctx["candidate_intro"] = candidate_intro
 
-    # Dump вакансий — полностью отвязано от отправки сообщений
-    if SAVE_RESULTS_TO_FILES and offerings:
-        # Старый формат: список вакансий для одного запуска
-        vac_path = RESULTS_JSON_DIR / f"vacancies_{user_label}_{safe_ts}.json"
+    vacancy_parts_candidate = split_vacancy_messages(report_text)
+    try:
+        # При продолжении после перезапуска «подождите» повторно не отправляем
+        if not ctx["wait_msg"]:
+            # Сообщение «подождите 2–3 минуты» с human_like_delay
+            await human_like_delay(client, candidate_entity, wait_msg)
+            await send_queue.send_message(client, candidate_entity, wait_msg)
+            ctx["wait_msg"] = wait_msg
+
+        # Задержка на «поиск вакансии» остаётся
+        if TOGGLE_DELAY != "OFF":
+            wait_sec = random.randint(120, 180) + random.randint(1, 40)
+            await asyncio.sleep(wait_sec)
+
+        # Шапка кандидату отдельным сообщением
+        if TOGGLE_DELAY != "OFF":
+            await human_like_delay(client, candidate_entity, candidate_intro)
+        await send_queue.send_message(client, candidate_entity, candidate_intro)
+
+        # Задержка 5–10 сек как на вставку из буфера
+        await asyncio.sleep(random.randint(5, 10))
+
+        # Тело вакансии (вакансия + футер) — одно или несколько сообщений,
+        # без имитации набора (HR не «перепечатывает» текст вакансии).
+        for idx_part, part in enumerate(vacancy_parts_candidate):
+            await send_queue.send_message(
+                client, candidate_entity, part, priority=send_queue.PRIORITY_BULK
+            )
+            if idx_part < len(vacancy_parts_candidate) - 1:
+                # Задержка между сообщениями тела 4–5 секунд (как «вставка из буфера»)
+                await asyncio.sleep(random.randint(4, 5))
+
+        ctx["candidate_delivered"] = True
+        print(f"Отчёт по вакансиям отправлен кандидату {candidate_entity}")
+    except Exception as e:
+        log.exception("Send vacancy report to candidate failed: %s", e)
+
+
+async def _stage_dialogue(ctx: dict[str, Any], client: Any) -> None:
+    """
+    Инициализируем диалог по вакансиям для кандидата: список найденных вакансий,
+    текущая (первая) вакансия, история сообщений и метаданные для дампа.
+    """
+    candidate_entity = ctx["candidate_entity"]
+    offerings = ctx["offerings"]
+    if not ctx["candidate_delivered"]:
+        return
+    try:
+        if isinstance(candidate_entity, int):
+            user_id_for_dialogue = candidate_entity
+        else:
+            # Если идентификатор не int, диалог по user_id не ведём
+            user_id_for_dialogue = None
+        if user_id_for_dialogue is None or not offerings:
+            return
+        id_value = ctx["result"].get("user") or ctx["candidate_phone"] or "unknown"
+        started_at = datetime.now(UTC_PLUS_3)
+        ts_key = started_at.strftime("%Y-%m-%d %H:%M")
+        vacancies_by_id: dict[int, dict[str, Any]] = {}
+        ordered_ids: list[int] = []
+        for vac in offerings:
+            vid = vac.get("id")
+            if isinstance(vid, int):
+                vacancies_by_id[vid] = vac
+                ordered_ids.append(vid)
+        current_vacancy_id = ordered_ids[0] if ordered_ids else None
+        _dialogue_state[user_id_for_dialogue] = {
+            "appropriate": None,
+            "inappropriate": [],
+            "vacancies_by_id": vacancies_by_id,
+            "ordered_ids": ordered_ids,
+            "current_index": 0,
+            "current_vacancy_id": current_vacancy_id,
+            "history": [],
+            "pending_next_vacancy": False,
+            "dump_meta": {
+                "id_value": id_value,
+                "ts_key": ts_key,
+                "started_at": started_at.isoformat(),
+            },
+        }
+        # Сохраняем факт отправки вводного сообщения кандидату
+        _append_dialogue_history(
+            user_id_for_dialogue,
+            author="system",
+            text=ctx["wait_msg"] or "",
+            vacancy_id=None,
+        )
+        _append_dialogue_history(
+            user_id_for_dialogue,
+            author="system",
+            text=ctx["candidate_intro"] or "",
+            vacancy_id=current_vacancy_id,
+        )
+        # Первый вопрос об удовлетворённости вакансией — сразу после отправки описания;
+        # «печатаем» уже во время генерации вопроса
+        budget = ReplyBudget(client, candidate_entity)
         try:
-            with open(vac_path, "w", encoding="utf-8") as f:
-                json.dump(offerings, f, ensure_ascii=False, indent=2)
+            satisfaction_question = await llm_pool.satisfaction_question(
+                ctx["offerings"][:VACANCY_TOP_N], ctx["report_text"]
+            )
         except Exception as e:
-            log.exception("Save vacancies.json failed: %s", e)
+            log.exception(
+                "Generate satisfaction question failed: %s", e
+            )
+            satisfaction_question = (
+                "Как вы оцениваете эту вакансию по условиям работы и требованиям? "
+                "Подходит ли она вам?"
+            )
+        _append_dialogue_history(
+            user_id_for_dialogue,
+            author="llm",
+            text=satisfaction_question,
+            vacancy_id=current_vacancy_id,
+        )
+        await budget.wait(satisfaction_question)
+        await send_queue.send_message(
+            client,
+            candidate_entity,
+            satisfaction_question,
+            priority=send_queue.PRIORITY_INTERACTIVE,
+        )
+    except Exception as e:
+        log.exception("Init vacancy dialogue state failed: %s", e)
+
+
+async def _stage_dump(ctx: dict[str, Any], client: Any) -> None:
+    """Dump вакансий — полностью отвязано от отправки сообщений."""
+    offerings = ctx["offerings"]
+    if not SAVE_RESULTS_TO_FILES or not offerings:
+        return
+    user_label, now, _ts, safe_ts = _ctx_labels(ctx)
+    id_value = ctx["result"].get("user") or ctx["candidate_phone"] or "unknown"
+    dict_key = f"({id_value}, {now.strftime('%Y-%m-%d %H:%M')})"
 
+    def _save() -> None:
+        _ensure_results_dirs()
+        # Старый формат: список вакансий для одного запуска
+        _write_json(RESULTS_JSON_DIR / f"vacancies_{user_label}_{safe_ts}.json", offerings, "vacancies.json")
         # Новый агрегированный формат: { (id, datetime): [вакансии] }
-        try:
-            agg_vac_path = RESULTS_JSON_DIR / "vacancies.json"
-            if agg_vac_path.exists():
-                with open(agg_vac_path, "r", encoding="utf-8") as f:
-                    agg_vac: dict[str, Any] = json.load(f)
-            else:
-                agg_vac = {}
+        _merge_json_file(RESULTS_JSON_DIR / "vacancies.json", dict_key, offerings, "aggregated vacancies.json")
 
-            id_value = result.get("user") or candidate_phone or "unknown"
-            ts_key = now.strftime("%Y-%m-%d %H:%M")
-            dict_key = f"({id_value}, {ts_key})"
+    await asyncio.to_thread(_save)
 
-            agg_vac[dict_key] = offerings
-            with open(agg_vac_path, "w", encoding="utf-8") as f:
-                json.dump(agg_vac, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            log.exception("Save aggregated vacancies.json failed: %s", e)
 
-    return str(text_path)
+_DELIVERY_STAGE_FUNCS = {
+    "report": _stage_report,
+    "summary": _stage_summary,
+    "vacancies": _stage_vacancies,
+    "hr": _stage_hr,
+    "candidate": _stage_candidate,
+    "dialogue": _stage_dialogue,
+    "dump": _stage_dump,
+}
+
 
+async def run_delivery_stage(stage: str, ctx: dict[str, Any], client: Any) -> None:
+    """Выполнить один этап доставки (из DELIVERY_STAGES); результаты этапа записываются в ctx."""
+    await _DELIVERY_STAGE_FUNCS[stage](ctx, client)
 
-def finish_session(user_id: int) -> dict[str, Any] | None:
-    """Взять результат и очистить сессию. Возвращает questionnaire_result или None."""
+
+async def dump_result_and_save_text(
+    result: dict[str, Any],
+    client: Any,
+    send_to_hr: bool = True,
+    hr_account: str | None = None,
+    candidate_entity: int | str | None = None,
+    candidate_phone: str | None = None,
+) -> str:
+    """
+    Дамп questionnaire_result в questionnaire_results/json,
+    сформировать текст отчёта, сохранить в questionnaire_results/text/,
+    при необходимости переслать в ЛС HR; отчёт по 1 вакансии — также кандидату (отдельным текстом), если передан candidate_entity.
+    Все этапы DELIVERY_STAGES по очереди, в текущей корутине. Возвращает путь к сохранённому txt.
+    """
+    ctx = new_delivery_context(result, send_to_hr, hr_account, candidate_entity, candidate_phone)
+    try:
+        for stage in DELIVERY_STAGES:
+            await run_delivery_stage(stage, ctx, client)
+    finally:
+        release_delivery_context(ctx)
+    return ctx["text_path"]
+
+
+def finish_session(user_id: int, deliver: bool = False) -> dict[str, Any] | None:
+    """
+    Взять результат и очистить сессию. Возвращает questionnaire_result или None.
+    deliver — результат уйдёт в доставку (new_delivery_context): упреждающая загрузка вакансий передаётся ей,
+    иначе (кандидат снят по таймауту, результат не нужен) освобождается здесь.
+    """
     state = _state.pop(user_id, None)
     if not state:
         return None
-    return build_questionnaire_result_from_state(state)
+    state["finished"] = True
+    result = build_questionnaire_result_from_state(state)
+    # Выжимка по мере ответов и ключ упреждающей загрузки вакансий — забирает new_delivery_context
+    result["_short"] = state.get("short")
+    if deliver:
+        result["_prefetch_key"] = state.get("prefetch_key")
+    else:
+        vacancy_prefetch.release(state.get("prefetch_key"))
+    return result
 
 
-def _dump_dialogue_to_file(user_id: int) -> None:
-    """Сохранить состояние диалога по вакансиям в JSON (агрегированный формат)."""
+async def _dump_dialogue_to_file(user_id: int) -> None:
+    """Сохранить состояние диалога по вакансиям в JSON (агрегированный формат); запись — в потоке."""
     state = _dialogue_state.get(user_id)
     if not state:
         return
     if not SAVE_RESULTS_TO_FILES:
         return
-    try:
-        RESULTS_JSON_DIR.mkdir(parents=True, exist_ok=True)
-        path = RESULTS_JSON_DIR / "vacancy_dialogues.json"
-        if path.exists():
-            with open(path, "r", encoding="utf-8") as f:
-                data: dict[str, Any] = json.load(f)
-        else:
-            data = {}
-        dump_meta = state.get("dump_meta", {})
-        id_value = dump_meta.get("id_value", "unknown")
-        ts_key = dump_meta.get("ts_key") or datetime.now(UTC_PLUS_3).strftime("%Y-%m-%d %H:%M")
-        dict_key = f"({id_value}, {ts_key})"
-        # Подготовим компактное состояние для дампа
-        to_save = {
-            "appropriate": state.get("appropriate"),
-            "inappropriate": state.get("inappropriate", []),
-            "ordered_ids": state.get("ordered_ids", []),
-            "history": state.get("history", []),
-        }
+    dump_meta = state.get("dump_meta", {})
+    id_value = dump_meta.get("id_value", "unknown")
+    ts_key = dump_meta.get("ts_key") or datetime.now(UTC_PLUS_3).strftime("%Y-%m-%d %H:%M")
+    dict_key = f"({id_value}, {ts_key})"
+    # Подготовим компактное состояние для дампа
+    to_save = {
+        "appropriate": state.get("appropriate"),
+        "inappropriate": list(state.get("inappropriate", [])),
+        "ordered_ids": list(state.get("ordered_ids", [])),
+        "history": list(state.get("history", [])),
         # Для vacancies_by_id сохраняем как словарь {id: {...}}
-        vacancies_by_id = state.get("vacancies_by_id") or {}
-        to_save["vacancies_by_id"] = vacancies_by_id
-        data[dict_key] = to_save
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        log.exception("Save vacancy_dialogues.json failed: %s", e)
+        "vacancies_by_id": state.get("vacancies_by_id") or {},
+    }
+    await asyncio.to_thread(
+        _merge_json_file, RESULTS_JSON_DIR / "vacancy_dialogues.json", dict_key, to_save, "vacancy_dialogues.json"
+    )
 
 
 def _log_dialogue_finished(user_id: int, reason: str) -> None:
@@ -760,7 +1018,7 @@ async def handle_vacancy_dialogue_message(
 
     if current_vacancy_id is None or current_vacancy_id not in vacancies_by_id:
         # Нет актуальной вакансии — завершим диалог
-        _dump_dialogue_to_file(user_id)
+        await _dump_dialogue_to_file(user_id)
         _dialogue_state.pop(user_id, None)
         _log_dialogue_finished(user_id, "нет актуальной вакансии в состоянии диалога")
         return True
@@ -768,12 +1026,17 @@ async def handle_vacancy_dialogue_message(
     vacancy = vacancies_by_id[current_vacancy_id]
     vacancy_desc = vacancy.get("description_text") or ""
 
-    # Анализируем ответ кандидата через LLM
-    analysis = openai_client.analyze_vacancy_reply(
-        vacancy_description=vacancy_desc,
-        candidate_message=message_text,
-        history=state.get("history"),
-    )
+    # Анализируем ответ кандидата через LLM; пока приходят токены — «печатаем»
+    typing = get_scheduler()
+    try:
+        analysis = await openai_client.analyze_vacancy_reply(
+            vacancy_description=vacancy_desc,
+            candidate_message=message_text,
+            history=state.get("history"),
+            on_progress=lambda: typing.start(client, user_id, STREAM_TYPING_EXTEND_SEC),
+        )
+    finally:
+        typing.stop(client, user_id)
     analysis_result = int(analysis.get("analysis_result", 4))
     reply_text = analysis.get("reply_text", "") or ""
 
@@ -788,7 +1051,9 @@ async def handle_vacancy_dialogue_message(
 
     # Отправляем ответ кандидату
     try:
-        await client.send_message(user_id, reply_text)
+        await send_queue.send_message(
+            client, user_id, reply_text, priority=send_queue.PRIORITY_INTERACTIVE
+        )
     except Exception as e:
         log.exception("Send dialogue reply to candidate failed: %s", e)
 
@@ -806,7 +1071,7 @@ async def handle_vacancy_dialogue_message(
     if analysis_result == 3:
         # Явное удовлетворение — фиксируем вакансию как подходящую и завершаем диалог
         state["appropriate"] = current_vacancy_id
-        _dump_dialogue_to_file(user_id)
+        await _dump_dialogue_to_file(user_id)
         _dialogue_state.pop(user_id, None)
         _log_dialogue_finished(user_id, "кандидат явно удовлетворён вакансией")
         return True
@@ -828,7 +1093,7 @@ async def handle_vacancy_dialogue_message(
 
         if next_id is None:
             # Вакансий больше нет — отправляем вежливое сообщение и завершаем диалог
-            no_more = openai_client.generate_no_more_vacancies_message()
+            no_more = await llm_pool.no_more_vacancies_message()
             _append_dialogue_history(
                 user_id,
                 author="llm",
@@ -837,10 +1102,12 @@ async def handle_vacancy_dialogue_message(
                 analysis_result=None,
             )
             try:
-                await client.send_message(user_id, no_more)
+                await send_queue.send_message(
+                    client, user_id, no_more, priority=send_queue.PRIORITY_INTERACTIVE
+                )
             except Exception as e:
                 log.exception("Send 'no more vacancies' message failed: %s", e)
-            _dump_dialogue_to_file(user_id)
+            await _dump_dialogue_to_file(user_id)
             _dialogue_state.pop(user_id, None)
             _log_dialogue_finished(user_id, "подходящих вакансий больше нет")
             return True
@@ -853,13 +1120,13 @@ async def handle_vacancy_dialogue_message(
         vacancy_parts = split_vacancy_messages(report_for_next)
         try:
             for idx, part in enumerate(vacancy_parts):
-                await client.send_message(user_id, part)
+                await send_queue.send_message(client, user_id, part, priority=send_queue.PRIORITY_BULK)
                 if idx < len(vacancy_parts) - 1:
                     await asyncio.sleep(random.randint(4, 5))
         except Exception as e:
             log.exception("Send next vacancy to candidate failed: %s", e)
 
-        question = openai_client.generate_satisfaction_question(report_for_next)
+        question = await llm_pool.satisfaction_question([vacancy_next], report_for_next)
         _append_dialogue_history(
             user_id,
             author="llm",
@@ -868,7 +1135,9 @@ async def handle_vacancy_dialogue_message(
             analysis_result=None,
         )
         try:
-            await client.send_message(user_id, question)
+            await send_queue.send_message(
+                client, user_id, question, priority=send_queue.PRIORITY_INTERACTIVE
+            )
         except Exception as e:
             log.exception("Send satisfaction question for next vacancy failed: %s", e)
         return True
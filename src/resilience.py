@@ -0,0 +1,312 @@
+"""
+Защита вызовов OpenAI от деградации API: общий лимит одновременных запросов (по лимиту аккаунта),
+срок на вызов целиком (очередь + попытки + паузы), повтор при 429/таймауте/5xx с паузой full jitter
+и учётом Retry-After, предохранитель (circuit breaker): после серии сбоев LLM не вызывается
+OPENAI_BREAKER_COOLDOWN_SEC, вызывающие сразу получают CircuitOpenError и переходят на локальные фолбэки.
+Интерактивные вызовы при OPENAI_HEDGE хеджируются: попытка без ответа дольше скользящего p90 функции
+дублируется, берётся первый ответ (доля хеджей ограничена OPENAI_HEDGE_MAX_RATE).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+import weakref
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from config import (
+    OPENAI_BACKGROUND_DEADLINE_SEC,
+    OPENAI_BACKOFF_BASE_SEC,
+    OPENAI_BACKOFF_MAX_SEC,
+    OPENAI_BREAKER_COOLDOWN_SEC,
+    OPENAI_BREAKER_FAILURES,
+    OPENAI_CONCURRENCY,
+    OPENAI_DEADLINE_SEC,
+    OPENAI_HEDGE,
+    OPENAI_HEDGE_HOLDOUT,
+    OPENAI_HEDGE_MAX_RATE,
+    OPENAI_HEDGE_MIN_SAMPLES,
+    OPENAI_HEDGE_QUANTILE,
+    OPENAI_RETRIES,
+)
+from . import metrics
+
+log = logging.getLogger("userbot")
+
+T = TypeVar("T")
+
+# Вызовы, ответа которых ждёт кандидат: короткий срок OPENAI_DEADLINE_SEC; остальные — фоновые
+INTERACTIVE_FNS = frozenset({"validate_answer", "evaluate_agreement", "analyze_vacancy_reply"})
+# Хеджируются только интерактивные вызовы: хвост латентности фоновых кандидат не ждёт
+HEDGE_FNS = INTERACTIVE_FNS
+_GAIN_QUANTILES = {"p50": 0.50, "p95": 0.95, "p99": 0.99}
+# HTTP-коды, при которых повтор имеет смысл
+_RETRY_STATUS = {408: "timeout", 409: "conflict", 429: "rate_limit"}
+
+
+class CircuitOpenError(RuntimeError):
+    """Предохранитель открыт: LLM не вызываем, работаем на локальных фолбэках."""
+
+
+class CircuitBreaker:
+    """
+    closed → (failures сбоев подряд) → open → (cooldown_sec) → half_open: один пробный вызов;
+    успех закрывает, сбой снова открывает. Состояние — gauge llm_breaker_state (0/1/2).
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, failures: int, cooldown_sec: float) -> None:
+        self.failures = max(1, int(failures))
+        self.cooldown_sec = cooldown_sec
+        self.state = self.CLOSED
+        self._streak = 0
+        self._opened_at = 0.0
+        self._probing = False
+        metrics.set_gauge("llm_breaker_state", self.state)
+
+    def _set(self, state: int) -> None:
+        self.state = state
+        metrics.set_gauge("llm_breaker_state", state)
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_sec:
+            self._set(self.HALF_OPEN)
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def success(self) -> None:
+        self._streak = 0
+        self._probing = False
+        if self.state != self.CLOSED:
+            log.info("LLM circuit breaker closed")
+            self._set(self.CLOSED)
+
+    def failure(self) -> None:
+        self._streak += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._streak >= self.failures):
+            log.warning("LLM circuit breaker opened after %d failures", self._streak)
+            metrics.inc("llm_breaker_opened")
+            self._opened_at = time.monotonic()
+            self._set(self.OPEN)
+
+    def release(self) -> None:
+        """Вызов завершился ничем (отмена, ошибка запроса): пробный слот снова свободен."""
+        self._probing = False
+
+
+breaker = CircuitBreaker(OPENAI_BREAKER_FAILURES, OPENAI_BREAKER_COOLDOWN_SEC)
+
+# Семафор на event loop (как и клиент OpenAI: run_sync работает в своём loop)
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+_inflight = 0
+
+
+def _semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    sem = _semaphores.get(loop)
+    if sem is None:
+        sem = _semaphores[loop] = asyncio.Semaphore(max(1, OPENAI_CONCURRENCY))
+    return sem
+
+
+def _retry_reason(e: BaseException) -> Optional[str]:
+    """Причина для повтора (метка метрики) или None — ошибка не временная (400, 401 и т.п.)."""
+    status = getattr(e, "status_code", None)
+    if status is not None:
+        if status in _RETRY_STATUS:
+            return _RETRY_STATUS[status]
+        return "server" if status >= 500 else None
+    name = type(e).__name__
+    if name == "APITimeoutError":
+        return "timeout"
+    if name == "APIConnectionError":
+        return "connection"
+    return None
+
+
+def _retry_after(e: BaseException) -> Optional[float]:
+    """Пауза из заголовков ответа: retry-after-ms или Retry-After (секунды или HTTP-дата)."""
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        ms = headers.get("retry-after-ms")
+        if ms:
+            return float(ms) / 1000.0
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(attempt: int) -> float:
+    """Пауза перед попыткой attempt (1, 2, …): full jitter — случайно от 0 до base·2^(attempt-1), не больше max."""
+    return random.uniform(0, min(OPENAI_BACKOFF_MAX_SEC, OPENAI_BACKOFF_BASE_SEC * 2 ** (attempt - 1)))
+
+
+def deadline_for(fn: str) -> float:
+    return OPENAI_DEADLINE_SEC if fn in INTERACTIVE_FNS else OPENAI_BACKGROUND_DEADLINE_SEC
+
+
+async def _attempt(fn: str, factory: Callable[[], Awaitable[T]]) -> T:
+    global _inflight
+    queued = time.monotonic()
+    async with _semaphore():
+        metrics.observe("llm_queue_wait_sec", time.monotonic() - queued, fn=fn)
+        _inflight += 1
+        metrics.set_gauge("llm_inflight", _inflight)
+        started = time.monotonic()
+        try:
+            result = await factory()
+        finally:
+            _inflight -= 1
+            metrics.set_gauge("llm_inflight", _inflight)
+        metrics.observe("llm_attempt_sec", time.monotonic() - started, fn=fn)
+        return result
+
+
+def _hedge_delay(fn: str) -> Optional[float]:
+    """Через сколько секунд дублировать попытку: скользящий перцентиль; None — замеров мало или бюджет исчерпан."""
+    if metrics.sample_count("llm_attempt_sec", fn=fn) < OPENAI_HEDGE_MIN_SAMPLES:
+        return None
+    eligible = metrics.get_counter("llm_hedge_eligible", fn=fn)
+    if metrics.get_counter("llm_hedged", fn=fn) >= OPENAI_HEDGE_MAX_RATE * eligible:
+        return None
+    return metrics.percentile("llm_attempt_sec", OPENAI_HEDGE_QUANTILE, fn=fn)
+
+
+async def _hedged_attempt(
+    fn: str,
+    factory: Callable[[], Awaitable[T]],
+    on_hedge: Optional[Callable[[], None]],
+    discard: Optional[Callable[[T], Any]],
+) -> T:
+    """
+    Попытка с хеджем: нет ответа за _hedge_delay(fn) — второй такой же запрос; первый успешный ответ
+    побеждает, другой запрос отменяется. Ошибка — только если упали оба.
+    discard(result) — ответ проигравшего, если он успел прийти (освободить ресурсы, например закрыть поток).
+    """
+    metrics.inc("llm_hedge_eligible", fn=fn)
+    primary = asyncio.ensure_future(_attempt(fn, factory))
+    tasks = [primary]
+    try:
+        delay = _hedge_delay(fn)
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and _hedge_delay(fn) is not None:
+                tasks.append(asyncio.ensure_future(_attempt(fn, factory)))
+                metrics.inc("llm_hedged", fn=fn)
+                eligible = metrics.get_counter("llm_hedge_eligible", fn=fn)
+                metrics.set_gauge("llm_hedge_rate", metrics.get_counter("llm_hedged", fn=fn) / eligible, fn=fn)
+                if on_hedge is not None:
+                    on_hedge()
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            ok = [t for t in tasks if t in done and t.exception() is None]
+            if not ok:
+                error = next(iter(done)).exception()
+                continue
+            winner = ok[0]
+            if len(tasks) > 1:
+                metrics.inc("llm_hedge_primary_won" if winner is primary else "llm_hedge_won", fn=fn)
+            if discard is not None:
+                for other in ok[1:]:
+                    discard(other.result())
+            return winner.result()
+        assert error is not None
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                # Ошибку проигравшего не показываем как «exception was never retrieved»
+                task.exception()
+
+
+def _observe_hedge_latency(fn: str, group: str, elapsed: float) -> None:
+    """Латентность вызова с хеджем (on) и без (off, контрольная доля); выигрыш по перцентилям — gauge."""
+    metrics.observe("llm_hedge_latency_sec", elapsed, fn=fn, hedge=group)
+    for label, q in _GAIN_QUANTILES.items():
+        on = metrics.percentile("llm_hedge_latency_sec", q, fn=fn, hedge="on")
+        off = metrics.percentile("llm_hedge_latency_sec", q, fn=fn, hedge="off")
+        if on is not None and off is not None:
+            metrics.set_gauge("llm_hedge_gain_sec", off - on, fn=fn, q=label)
+
+
+async def call(
+    fn: str,
+    factory: Callable[[], Awaitable[T]],
+    deadline: Optional[float] = None,
+    on_hedge: Optional[Callable[[], None]] = None,
+    discard: Optional[Callable[[T], Any]] = None,
+) -> T:
+    """
+    Выполнить factory() (новый запрос на каждую попытку) под общим лимитом, со сроком deadline
+    (по умолчанию deadline_for(fn)), повторами временных ошибок и предохранителем.
+    Для HEDGE_FNS при OPENAI_HEDGE попытки хеджируются: on_hedge() — отправлен дублирующий запрос,
+    discard(result) — лишний ответ, пришедший одновременно с победившим.
+    Исключения: CircuitOpenError — предохранитель открыт; asyncio.TimeoutError — срок вышел;
+    иначе — ошибка последней попытки.
+    """
+    if not breaker.allow():
+        metrics.inc("llm_breaker_rejected", fn=fn)
+        raise CircuitOpenError(f"{fn}: LLM circuit breaker is open")
+    started = time.monotonic()
+    deadline_at = started + (deadline if deadline is not None else deadline_for(fn))
+    group = None
+    if OPENAI_HEDGE and fn in HEDGE_FNS:
+        group = "off" if random.random() < OPENAI_HEDGE_HOLDOUT else "on"
+    attempt = 0
+    try:
+        while True:
+            attempt += 1
+            if group == "on":
+                one = _hedged_attempt(fn, factory, on_hedge, discard)
+            else:
+                one = _attempt(fn, factory)
+            try:
+                result = await asyncio.wait_for(one, max(0.0, deadline_at - time.monotonic()))
+            except asyncio.TimeoutError:
+                metrics.inc("llm_deadline_exceeded", fn=fn)
+                breaker.failure()
+                raise
+            except Exception as e:
+                reason = _retry_reason(e)
+                if reason is None:
+                    # API ответил — он жив; ошибка в самом запросе
+                    breaker.release()
+                    raise
+                wait = max(backoff(attempt), _retry_after(e) or 0.0)
+                if attempt > OPENAI_RETRIES or time.monotonic() + wait >= deadline_at:
+                    metrics.inc("llm_retry_exhausted", fn=fn, reason=reason)
+                    breaker.failure()
+                    raise
+                metrics.inc("llm_retries", fn=fn, reason=reason)
+                log.debug("%s: retry %d after %s in %.2fs", fn, attempt, reason, wait)
+                await asyncio.sleep(wait)
+                continue
+            breaker.success()
+            if group is not None:
+                _observe_hedge_latency(fn, group, time.monotonic() - started)
+            return result
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
@@ -0,0 +1,329 @@
+"""
+Единый конвейер исходящих запросов в Telegram: очередь с приоритетами + token bucket
+(на аккаунт и на собеседника). FloodWait не роняет процесс: запрос откладывается и повторяется.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from telethon import functions
+from telethon.errors import FloodWaitError
+
+from config import (
+    SEND_GLOBAL_RATE,
+    SEND_GLOBAL_BURST,
+    SEND_PEER_RATE,
+    SEND_PEER_BURST,
+    SEND_FLOOD_MAX_RETRIES,
+)
+from . import metrics
+
+log = logging.getLogger("userbot")
+
+# Приоритеты: меньше — раньше
+PRIORITY_INTERACTIVE = 0  # ответы кандидату в живом диалоге
+PRIORITY_NORMAL = 1       # приветствия, статус, «печатает», служебные ответы
+PRIORITY_BULK = 2         # части описания вакансий, отчёты HR
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не более burst накопленных."""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = max(float(rate), 1e-6)
+        self.burst = max(float(burst), 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Сколько секунд ждать до появления одного токена (0 — можно сразу)."""
+        self._refill(now)
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def consume(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1.0
+
+
+class _Job:
+    __slots__ = ("priority", "seq", "client", "peer", "factory", "future", "enqueued", "not_before", "retries", "kind")
+
+    def __init__(self, priority, seq, client, peer, factory, future, kind) -> None:
+        self.priority = priority
+        self.seq = seq
+        self.client = client
+        self.peer = peer
+        self.factory = factory
+        self.future = future
+        self.kind = kind
+        self.enqueued = time.monotonic()
+        self.not_before = 0.0
+        self.retries = 0
+
+    def __lt__(self, other: "_Job") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+def _peer_key(entity: Any) -> Any:
+    """Ключ собеседника для per-peer лимита: user_id, если известен, иначе строка."""
+    if entity is None:
+        return None
+    if isinstance(entity, int):
+        return entity
+    if isinstance(entity, str):
+        return entity.strip().lstrip("@").lower()
+    for attr in ("user_id", "id", "channel_id", "chat_id"):
+        val = getattr(entity, attr, None)
+        if isinstance(val, int):
+            return val
+    return str(entity)
+
+
+class OutboundQueue:
+    """
+    Очередь исходящих: один воркер выбирает готовый к отправке запрос с наивысшим приоритетом.
+    Запросы к собеседнику, которому сейчас идёт отправка, ждут в отдельной очереди этого собеседника
+    и возвращаются в кучу, когда отправка закончится (воркер будит _wakeup, а не опрос по таймеру).
+    """
+
+    def __init__(self) -> None:
+        self._heap: list[_Job] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+        self._inflight: set[tuple[int, Any]] = set()
+        # (аккаунт, собеседник) с отправкой в полёте -> его запросы, ждущие окончания отправки
+        self._blocked: dict[tuple[int, Any], list[_Job]] = {}
+        self._tasks: set[asyncio.Task] = set()
+        # Лимиты и FloodWait — по аккаунту (id клиента)
+        self._account_buckets: dict[int, TokenBucket] = {}
+        self._peer_buckets: dict[tuple[int, Any], TokenBucket] = {}
+        self._paused_until: dict[int, float] = {}
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    def submit(
+        self,
+        client: Any,
+        factory: Callable[[], Awaitable[Any]],
+        *,
+        peer: Any = None,
+        priority: int = PRIORITY_NORMAL,
+        kind: str = "message",
+    ) -> asyncio.Future:
+        """
+        Поставить запрос в очередь. factory — функция без аргументов, возвращающая корутину (сам вызов Telethon).
+        peer=None — запрос без per-peer лимита (статус, «печатает»).
+        """
+        loop = asyncio.get_running_loop()
+        job = _Job(priority, next(self._seq), client, _peer_key(peer), factory, loop.create_future(), kind)
+        heapq.heappush(self._heap, job)
+        metrics.set_gauge("send_queue_depth", self._depth())
+        self._wakeup.set()
+        self._ensure_worker()
+        return job.future
+
+    def _depth(self) -> int:
+        return len(self._heap) + sum(len(jobs) for jobs in self._blocked.values())
+
+    def _account_bucket(self, client: Any) -> TokenBucket:
+        b = self._account_buckets.get(id(client))
+        if b is None:
+            b = self._account_buckets[id(client)] = TokenBucket(SEND_GLOBAL_RATE, SEND_GLOBAL_BURST)
+        return b
+
+    def _peer_bucket(self, client: Any, peer: Any) -> TokenBucket:
+        key = (id(client), peer)
+        b = self._peer_buckets.get(key)
+        if b is None:
+            b = self._peer_buckets[key] = TokenBucket(SEND_PEER_RATE, SEND_PEER_BURST)
+        return b
+
+    def _ready_in(self, job: _Job, now: float) -> float:
+        """Через сколько секунд запрос можно отправить (0 — готов)."""
+        acc = id(job.client)
+        wait = max(job.not_before - now, self._paused_until.get(acc, 0.0) - now, 0.0)
+        wait = max(wait, self._account_bucket(job.client).wait_time(now))
+        if job.peer is not None:
+            wait = max(wait, self._peer_bucket(job.client, job.peer).wait_time(now))
+        return wait
+
+    async def _run(self) -> None:
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            now = time.monotonic()
+            chosen: _Job | None = None
+            min_wait: float | None = None
+            # Снимаем с кучи по приоритету до первого готового; ждущие лимита возвращаются в кучу
+            deferred: list[_Job] = []
+            while self._heap:
+                job = heapq.heappop(self._heap)
+                if job.future.done():
+                    continue
+                key = (id(job.client), job.peer)
+                if job.peer is not None and key in self._inflight:
+                    # Сообщения одному собеседнику — строго по одному, чтобы сохранить порядок
+                    self._blocked.setdefault(key, []).append(job)
+                    continue
+                w = self._ready_in(job, now)
+                if w <= 0:
+                    chosen = job
+                    break
+                deferred.append(job)
+                min_wait = w if min_wait is None else min(min_wait, w)
+            for job in deferred:
+                heapq.heappush(self._heap, job)
+            metrics.set_gauge("send_queue_depth", self._depth())
+            if chosen is None:
+                if min_wait is None:
+                    continue
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min_wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._account_bucket(chosen.client).consume(now)
+            if chosen.peer is not None:
+                self._peer_bucket(chosen.client, chosen.peer).consume(now)
+                self._inflight.add((id(chosen.client), chosen.peer))
+            metrics.observe("send_wait_sec", now - chosen.enqueued, priority=chosen.priority)
+            task = asyncio.get_running_loop().create_task(self._execute(chosen))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, job: _Job) -> None:
+        try:
+            result = await job.factory()
+        except FloodWaitError as e:
+            self._on_flood(job, e.seconds)
+        except Exception as e:
+            metrics.inc("send_errors", kind=job.kind)
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            metrics.inc("send_total", kind=job.kind)
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            if job.peer is not None:
+                key = (id(job.client), job.peer)
+                self._inflight.discard(key)
+                # Следующие запросы этому собеседнику — снова в общую кучу
+                for waiting in self._blocked.pop(key, ()):
+                    heapq.heappush(self._heap, waiting)
+            self._wakeup.set()
+
+    def _on_flood(self, job: _Job, seconds: int) -> None:
+        """FloodWait: пауза для всего аккаунта, запрос возвращается в очередь."""
+        metrics.inc("send_flood_wait", kind=job.kind)
+        acc = id(job.client)
+        resume_at = time.monotonic() + max(int(seconds or 0), 1)
+        self._paused_until[acc] = max(self._paused_until.get(acc, 0.0), resume_at)
+        job.retries += 1
+        if job.retries > SEND_FLOOD_MAX_RETRIES:
+            log.error("FloodWait: запрос %s отброшен после %s повторов", job.kind, job.retries - 1)
+            if not job.future.done():
+                job.future.set_exception(FloodWaitError(request=None, capture=seconds))
+            return
+        log.warning("FloodWait %s с: запрос %s отложен (повтор %s)", seconds, job.kind, job.retries)
+        job.not_before = resume_at
+        heapq.heappush(self._heap, job)
+
+    def paused_for(self, client: Any) -> float:
+        """Сколько секунд аккаунт ещё в FloodWait (0 — не в паузе)."""
+        return max(self._paused_until.get(id(client), 0.0) - time.monotonic(), 0.0)
+
+    async def drain(self, timeout: float | None = None) -> bool:
+        """Дождаться отправки всего, что уже в очереди. True — очередь пуста."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._depth() or self._tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.1)
+        return True
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "depth": self._depth(),
+            "inflight": len(self._tasks),
+            "wait_p50": metrics.percentile("send_wait_sec", 0.5, priority=PRIORITY_INTERACTIVE),
+            "wait_p95_bulk": metrics.percentile("send_wait_sec", 0.95, priority=PRIORITY_BULK),
+            "paused_accounts": sum(1 for t in self._paused_until.values() if t > time.monotonic()),
+        }
+
+
+_queue: OutboundQueue | None = None
+
+
+def get_queue() -> OutboundQueue:
+    """Общая очередь процесса (создаётся при первом обращении)."""
+    global _queue
+    if _queue is None:
+        _queue = OutboundQueue()
+    return _queue
+
+
+async def send_message(client: Any, entity: Any, text: str, *, priority: int = PRIORITY_NORMAL, **kwargs: Any) -> Any:
+    """client.send_message через очередь."""
+    return await get_queue().submit(
+        client,
+        lambda: client.send_message(entity, text, **kwargs),
+        peer=entity,
+        priority=priority,
+        kind="message",
+    )
+
+
+async def reply(event: Any, text: str, *, priority: int = PRIORITY_INTERACTIVE) -> Any:
+    """event.reply через очередь."""
+    return await get_queue().submit(
+        event.client,
+        lambda: event.reply(text),
+        peer=event.chat_id,
+        priority=priority,
+        kind="message",
+    )
+
+
+async def call(client: Any, request: Any, *, priority: int = PRIORITY_NORMAL, kind: str = "request") -> Any:
+    """Произвольный TL-запрос (SetTypingRequest, UpdateStatusRequest, ...) через очередь, без per-peer лимита."""
+    return await get_queue().submit(client, lambda: client(request), priority=priority, kind=kind)
+
+
+async def set_status(client: Any, offline: bool) -> Any:
+    """account.UpdateStatusRequest через очередь."""
+    return await call(client, functions.account.UpdateStatusRequest(offline=offline), kind="status")
+
+
+async def read_acknowledge(client: Any, chat_id: Any, max_id: int) -> Any:
+    """send_read_acknowledge через очередь."""
+    return await get_queue().submit(
+        client,
+        lambda: client.send_read_acknowledge(chat_id, max_id=max_id),
+        priority=PRIORITY_NORMAL,
+        kind="read",
+    )
+
+
+def stats() -> dict[str, Any]:
+    """Глубина очереди и время ожидания отправки."""
+    return get_queue().stats()
@@ -0,0 +1,201 @@
+"""
+Выжимка опроса (short) по мере ответов, а не одним вызовом summarize_questionnaire в конце:
+вопрос с полем "extract" в questions.json ("full_name" | "birth_date" | "job_type" | "region")
+после принятого ответа разбирается локально, а если парсера мало — коротким вызовом LLM в фоне.
+К концу опроса short уже готов; summarize_questionnaire остаётся фолбэком для неполной выжимки.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+from datetime import date
+from typing import Any, Callable, Optional
+
+from . import intent, metrics, openai_client
+from .validators import parse_birth_date, region_name
+
+log = logging.getLogger("userbot")
+
+# Поля, которые заполняет разбор одного ответа каждого вида
+KIND_FIELDS: dict[str, tuple[str, ...]] = {
+    "full_name": ("full_name", "last_name", "first_name", "patronymic", "gender"),
+    "birth_date": ("birth_date", "age"),
+    "job_type": ("job_type",),
+    "region": ("region",),
+}
+# Выжимка в формате summarize_questionnaire
+SHORT_FIELDS = (
+    "full_name", "last_name", "first_name", "patronymic", "gender", "birth_date", "age", "job_type", "region",
+)
+
+_PATRONYMIC_RE = re.compile(r"(вич|вна|ична|оглы|кызы)$")
+_FEMALE_SURNAME = ("ова", "ева", "ёва", "ина", "ына", "ская", "цкая")
+_MALE_SURNAME = ("ов", "ев", "ёв", "ин", "ын", "ский", "цкий")
+_NAME_WORD_RE = re.compile(r"^[А-ЯЁ][а-яё]+(?:-[А-ЯЁ][а-яё]+)?$")
+_REGION_PREFIX_RE = re.compile(r"^(?:г\.|г |город |гор\. )\s*", re.IGNORECASE)
+
+# Сколько ждать фоновые разборы перед этапом summary, сек
+SETTLE_TIMEOUT_SEC = 30.0
+
+# Фоновые вызовы LLM по id(short): дожидаемся их перед этапом summary доставки
+_pending: dict[int, list[asyncio.Task]] = {}
+
+
+def _gender(patronymic: Optional[str], last_name: Optional[str]) -> Optional[str]:
+    if patronymic:
+        return "женщина" if patronymic.lower().endswith(("вна", "ична", "кызы")) else "мужчина"
+    low = (last_name or "").lower()
+    if low.endswith(_FEMALE_SURNAME):
+        return "женщина"
+    if low.endswith(_MALE_SURNAME):
+        return "мужчина"
+    return None
+
+
+def _local_full_name(answer: str) -> Optional[dict[str, Any]]:
+    words = [w.strip(".,") for w in (answer or "").split()]
+    if not 2 <= len(words) <= 3 or not all(_NAME_WORD_RE.match(w) for w in words):
+        return None
+    patronymic_at = [i for i, w in enumerate(words) if _PATRONYMIC_RE.search(w.lower())]
+    if len(words) == 3 and patronymic_at == [2]:
+        last, first, patronymic = words
+    elif len(words) == 3 and patronymic_at == [1]:
+        first, patronymic, last = words
+    elif len(words) == 2 and not patronymic_at:
+        # «Иванов Иван» / «Иван Иванов»: фамилия — единственное слово с фамильным окончанием
+        surname_at = [i for i, w in enumerate(words) if w.lower().endswith(_FEMALE_SURNAME + _MALE_SURNAME)]
+        if len(surname_at) != 1:
+            return None
+        last, first, patronymic = words[surname_at[0]], words[1 - surname_at[0]], None
+    else:
+        return None
+    return {
+        "full_name": " ".join(words),
+        "last_name": last,
+        "first_name": first,
+        "patronymic": patronymic,
+        "gender": _gender(patronymic, last),
+    }
+
+
+def _local_birth_date(answer: str) -> Optional[dict[str, Any]]:
+    born, age, error = parse_birth_date(answer)
+    if born is not None:
+        return {"birth_date": born.isoformat(), "age": age}
+    if error or age is not None:
+        # Несуществующая дата или только возраст — как в summarize_questionnaire: даты нет
+        return {"birth_date": None, "age": None}
+    return None
+
+
+def _local_job_type(answer: str) -> Optional[dict[str, Any]]:
+    norm = intent.normalize(answer)
+    found = {t for t, stem in (("склад", "склад"), ("производство", "производ")) if stem in norm}
+    if len(found) == 1:
+        return {"job_type": found.pop()}
+    if not found and not any(stem in norm for stem in ("завод", "цех", "фабрик")):
+        # Другая сфера (клининг, охрана, «любая») — job_type только склад/производство
+        return {"job_type": None}
+    return None
+
+
+def _local_region(answer: str) -> Optional[dict[str, Any]]:
+    text = _REGION_PREFIX_RE.sub("", (answer or "").strip().rstrip("."))
+    # Уверены только в ответе-названии из списка: «Москва», «Нижний Новгород», «Московская обл.»;
+    # «Не знаю», «из Тулы» и т.п. — в LLM
+    name = region_name(text)
+    if name is None:
+        return None
+    return {"region": name}
+
+
+_LOCAL = {
+    "full_name": _local_full_name,
+    "birth_date": _local_birth_date,
+    "job_type": _local_job_type,
+    "region": _local_region,
+}
+
+
+def _normalize_birth_date(fields: dict[str, Any]) -> None:
+    """Проверить birth_date от LLM и посчитать возраст (как summarize_questionnaire)."""
+    if "birth_date" not in fields:
+        return
+    raw = fields.get("birth_date")
+    fields["birth_date"] = fields["age"] = None
+    if isinstance(raw, str) and raw:
+        try:
+            born = date.fromisoformat(raw)
+        except ValueError:
+            return
+        today = date.today()
+        fields["birth_date"] = born.isoformat()
+        fields["age"] = today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+
+
+OnUpdate = Optional[Callable[[dict[str, Any]], None]]
+
+
+async def _extract_llm(short: dict[str, Any], kind: str, question: str, answer: str, on_update: OnUpdate) -> None:
+    try:
+        fields = await openai_client.extract_short_fields(question, answer, list(KIND_FIELDS[kind]))
+    except Exception as e:
+        # Поле останется незаполненным — в конце сработает summarize_questionnaire
+        log.warning("Short extraction (%s) failed: %s", kind, e)
+        metrics.inc("short_extract_failed", kind=kind)
+        return
+    _normalize_birth_date(fields)
+    short.update(fields)
+    if on_update is not None:
+        on_update(short)
+
+
+def extract(
+    short: dict[str, Any], kind: Optional[str], question: str, answer: str, on_update: OnUpdate = None
+) -> None:
+    """
+    Разобрать принятый ответ в short (на месте): локально — сразу, иначе фоновый вызов LLM
+    (дождаться — settle). on_update(short) — после каждого обновления. Неизвестный kind — ничего не делает.
+    """
+    parse = _LOCAL.get(kind or "")
+    if parse is None:
+        return
+    fields = parse(answer)
+    if fields is not None:
+        metrics.inc("short_extract_local", kind=kind)
+        short.update(fields)
+        if on_update is not None:
+            on_update(short)
+        return
+    metrics.inc("short_extract_llm", kind=kind)
+    key = id(short)
+    task = asyncio.get_running_loop().create_task(_extract_llm(short, kind, question, answer, on_update))
+    _pending.setdefault(key, []).append(task)
+
+    def _done(t: asyncio.Task) -> None:
+        tasks = _pending.get(key)
+        if tasks and t in tasks:
+            tasks.remove(t)
+            if not tasks:
+                _pending.pop(key, None)
+
+    task.add_done_callback(_done)
+
+
+async def settle(short: dict[str, Any], timeout: float = SETTLE_TIMEOUT_SEC) -> None:
+    """Дождаться фоновых разборов short (не дольше timeout)."""
+    tasks = _pending.pop(id(short), [])
+    if tasks:
+        await asyncio.wait(list(tasks), timeout=timeout)
+
+
+def is_complete(short: Optional[dict[str, Any]]) -> bool:
+    """Все ответы с "extract" разобраны (None — тоже результат: поля в ответе нет)."""
+    return bool(short) and all(f in short for fields in KIND_FIELDS.values() for f in fields)
+
+
+def finalize(short: dict[str, Any]) -> dict[str, Any]:
+    """Выжимка в формате summarize_questionnaire."""
+    return {f: short.get(f) for f in SHORT_FIELDS}
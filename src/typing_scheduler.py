@@ -0,0 +1,163 @@
+"""
+Общий планировщик индикатора «печатает»: все интервалы набора живут в одном timer wheel
+с одной задачей-тикером вместо отдельного цикла sleep/SetTyping на каждое сообщение.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from typing import Any
+
+from telethon import functions
+from telethon.tl.types import SendMessageTypingAction
+
+from config import TYPING_TICK_SEC, TYPING_MAX_PER_TICK
+from . import metrics, send_queue
+
+log = logging.getLogger("userbot")
+
+# Telegram сбрасывает индикатор «печатает» примерно через 5 сек — обновляем с таким периодом
+TYPING_ACTION_INTERVAL_SEC = 5
+# Число слотов колеса; интервалы длиннее оборота колеса учитываются через rounds
+WHEEL_SLOTS = 64
+
+
+class _Typing:
+    __slots__ = ("client", "peer", "until", "rounds", "active")
+
+    def __init__(self, client: Any, peer: Any, until: float) -> None:
+        self.client = client
+        self.peer = peer
+        self.until = until
+        self.rounds = 0
+        self.active = True
+
+
+class TypingScheduler:
+    """
+    start(client, peer, duration) — показывать «печатает» duration секунд (повторный start продлевает);
+    stop(client, peer) — снять: уже поставленные в очередь обновления для этого собеседника не отправятся.
+    За один тик отправляется не больше max_per_tick обновлений, остальные переносятся на следующий тик;
+    пока аккаунт в FloodWait, обновления для него откладываются. Сами запросы идут через send_queue.
+    """
+
+    def __init__(
+        self,
+        tick_sec: float = TYPING_TICK_SEC,
+        interval_sec: float = TYPING_ACTION_INTERVAL_SEC,
+        max_per_tick: int = TYPING_MAX_PER_TICK,
+        slots: int = WHEEL_SLOTS,
+    ) -> None:
+        self._tick = max(float(tick_sec), 0.05)
+        self._interval = interval_sec
+        self._max_per_tick = max(1, int(max_per_tick))
+        self._wheel: list[list[_Typing]] = [[] for _ in range(max(2, slots))]
+        self._cursor = 0
+        self._entries: dict[tuple[int, Any], _Typing] = {}
+        self._task: asyncio.Task | None = None
+
+    @staticmethod
+    def _key(client: Any, peer: Any) -> tuple[int, Any]:
+        return (id(client), send_queue._peer_key(peer))
+
+    def _schedule(self, entry: _Typing, delay_sec: float) -> None:
+        ticks = max(1, math.ceil(delay_sec / self._tick))
+        slots = len(self._wheel)
+        entry.rounds = (ticks - 1) // slots
+        self._wheel[(self._cursor + ticks) % slots].append(entry)
+
+    def start(self, client: Any, peer: Any, duration_sec: float) -> None:
+        if duration_sec <= 0:
+            return
+        key = self._key(client, peer)
+        until = time.monotonic() + duration_sec
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.until = max(entry.until, until)
+            return
+        entry = self._entries[key] = _Typing(client, peer, until)
+        # Первое обновление — на ближайшем тике
+        self._schedule(entry, 0)
+        metrics.set_gauge("typing_active", len(self._entries))
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self, client: Any, peer: Any) -> None:
+        entry = self._entries.pop(self._key(client, peer), None)
+        if entry is not None:
+            # Из колеса не вынимаем — запись будет отброшена при проходе слота
+            entry.active = False
+            metrics.set_gauge("typing_active", len(self._entries))
+
+    def is_typing(self, client: Any, peer: Any) -> bool:
+        return self._key(client, peer) in self._entries
+
+    async def _run(self) -> None:
+        next_tick = time.monotonic()
+        while self._entries:
+            next_tick += self._tick
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+            self._cursor = (self._cursor + 1) % len(self._wheel)
+            slot, self._wheel[self._cursor] = self._wheel[self._cursor], []
+            self._process(slot)
+
+    def _process(self, slot: list[_Typing]) -> None:
+        now = time.monotonic()
+        sent = 0
+        queue = send_queue.get_queue()
+        for entry in slot:
+            if not entry.active:
+                continue
+            if entry.rounds > 0:
+                entry.rounds -= 1
+                self._wheel[self._cursor].append(entry)
+                continue
+            if now >= entry.until:
+                self.stop(entry.client, entry.peer)
+                continue
+            paused = queue.paused_for(entry.client)
+            if paused > 0:
+                self._schedule(entry, min(paused, self._interval))
+                continue
+            if sent >= self._max_per_tick:
+                metrics.inc("typing_deferred")
+                self._schedule(entry, self._tick)
+                continue
+            sent += 1
+            self._refresh(entry)
+            self._schedule(entry, self._interval)
+        if sent:
+            metrics.inc("typing_refresh", sent)
+
+    def _refresh(self, entry: _Typing) -> None:
+        async def _send() -> Any:
+            # К моменту отправки сообщение могло уже уйти — тогда «печатает» не нужен
+            if not entry.active:
+                metrics.inc("typing_dropped")
+                return None
+            return await entry.client(functions.messages.SetTypingRequest(
+                peer=entry.peer,
+                action=SendMessageTypingAction(),
+            ))
+
+        fut = send_queue.get_queue().submit(entry.client, _send, kind="typing")
+        fut.add_done_callback(_ignore_result)
+
+
+def _ignore_result(fut: asyncio.Future) -> None:
+    if not fut.cancelled() and fut.exception() is not None:
+        log.debug("SetTyping не отправлен: %s", fut.exception())
+
+
+_scheduler: TypingScheduler | None = None
+
+
+def get_scheduler() -> TypingScheduler:
+    """Общий планировщик процесса (создаётся при первом обращении)."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = TypingScheduler()
+    return _scheduler
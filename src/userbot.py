@@ -6,33 +6,45 @@ UserBot — учётная запись Telegram, опросник с OpenAI.
 import asyncio
 import json
 import logging
-import random
 from datetime import datetime, timezone, timedelta
+from typing import Any, Awaitable, Callable
 
-from telethon.sync import TelegramClient
-from telethon import events, functions, types
+from telethon import TelegramClient, events
 from telethon.errors import (
     SessionPasswordNeededError,
     PhoneNumberInvalidError,
     FloodWaitError,
+    PeerFloodError,
 )
 
 from config import (
     TG_API_ID,
     TG_API_HASH,
-    TG_PHONE,
     HR_ACCOUNT,
     COMMAND_MODE_PASSWORD,
     SAVE_RESULTS_TO_FILES,
     PROCESSED_USERS_PATH,
+    CAMPAIGN_CONCURRENCY,
+    CAMPAIGN_IDLE_TIMEOUT_SEC,
+    RESOLVE_LOOKAHEAD,
+    CONTACTS_CLEANUP,
+    SHUTDOWN_DRAIN_SEC,
+    METRICS_LOG_INTERVAL_SEC,
+    HEALTH_PORT,
+    LOOP_LAG_WARN_MS,
+    NO_MORE_REFRESH_SEC,
     setup_logging,
 )
-from . import questionnaire
-from .human_delay import human_like_delay
+from . import health, llm_pool, openai_client, questionnaire, send_queue, verdict_cache
+from .accounts import Account, AccountPool, parse_accounts
+from .campaign import CampaignScheduler
+from .delivery import DeliveryPipeline
+from .inbox import Inbox
+from .mailbox import MailboxRouter
+from .human_delay import ReplyBudget, human_like_delay
 from .candidates_source import get_candidates
 from .candidates_utils import _prepare_candidate_entry, _record_processed
 
-SESSION_NAME = "userbot_session"
 setup_logging()
 log = logging.getLogger("userbot")
 UTC_PLUS_3 = timezone(timedelta(hours=3))
@@ -58,9 +70,49 @@ def _is_yes(text: str) -> bool:
     return t in ("да", "yes", "y", "1")
 
 
+# Фоновые сервисы, которые крутятся в одном event loop с ботом (кэши, планировщики, health и т.п.)
+_services: list[Callable[[], Awaitable[None]]] = []
+
+
+def register_service(factory: Callable[[], Awaitable[None]]) -> None:
+    """
+    Зарегистрировать фоновую корутину: factory() вызывается при старте main(),
+    задача отменяется при остановке бота. Регистрировать до run_userbot()/main().
+    """
+    _services.append(factory)
+
+
+def _install_uvloop() -> None:
+    """Использовать uvloop, если он установлен."""
+    try:
+        import uvloop
+    except ImportError:
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    log.info("Используется uvloop")
+
+
 def run_userbot(command_mode: bool = False) -> None:
+    """Запуск UserBot в новом event loop (asyncio.run). При command_mode=True — режим команд."""
+    _install_uvloop()
+    try:
+        asyncio.run(main(command_mode=command_mode))
+    except KeyboardInterrupt:
+        log.info("Остановлено по Ctrl+C")
+        print("\nОстановлено.")
+
+
+async def main(command_mode: bool = False) -> None:
     """Запуск UserBot. При command_mode=True — режим команд (ожидание команд в ЛС после аутентификации)."""
-    client = TelegramClient(SESSION_NAME, TG_API_ID, TG_API_HASH)
+    # Пул аккаунтов (TG_ACCOUNTS); режим команд работает только с основным аккаунтом
+    account_specs = parse_accounts()
+    if command_mode:
+        account_specs = account_specs[:1]
+    pool = AccountPool([
+        Account(name, phone, TelegramClient(name, TG_API_ID, TG_API_HASH), primary=(i == 0))
+        for i, (name, phone) in enumerate(account_specs)
+    ])
+    client = pool.primary.client
 
     # Состояние режима команд (мутируемое из хендлера)
     cmd_state = {
@@ -79,46 +131,53 @@ def run_userbot(command_mode: bool = False) -> None:
 
     # Состояние массового опроса (обычный режим)
     candidates_list: list[dict] = []
-    current_candidate_index: int | None = None
     processed_users: dict[int, dict] = {}
+    campaign: CampaignScheduler | None = None
+
+    # Склейка серий входящих сообщений кандидата перед оценкой ответа
+    inbox = Inbox()
+    # Очереди обработки по user_id (порядок сообщений одного собеседника, параллельность между собеседниками)
+    mailbox = MailboxRouter()
+
+    def _client_for(name: str):
+        acc = pool.by_name(name)
+        return acc.client if acc is not None else None
+
+    async def _delivery_done(job: dict) -> None:
+        # Доставка закончена; если диалог по вакансиям не начат — диалог с кандидатом больше не активен
+        user_id = job["ctx"].get("candidate_entity")
+        acc = pool.by_name(job["account"])
+        if acc is not None and isinstance(user_id, int) and questionnaire.get_dialogue_state(user_id) is None:
+            await acc.presence.release(user_id)
+
+    async def _campaign_slot_freed() -> None:
+        # Слот кампании освобождён (опрос завершён или кандидат снят по таймауту); кандидаты закончились — итог
+        if campaign is None:
+            return
+        log.info("Аккаунты: %s", pool.stats())
+        if campaign.exhausted:
+            print("Кандидаты закончились, новых опросов нет.")
+            if CONTACTS_CLEANUP:
+                for acc in pool.accounts:
+                    removed = await acc.resolver.cleanup()
+                    print(f"Удалено импортированных контактов [{acc.name}]: {removed}.")
 
-    # Отложенное выключение «В сети» когда все диалоги завершены (10–40 с)
-    offline_task_ref: dict = {"task": None}
-
-    async def _schedule_offline() -> None:
-        if offline_task_ref.get("task") and not offline_task_ref["task"].done():
-            offline_task_ref["task"].cancel()
-            try:
-                await offline_task_ref["task"]
-            except asyncio.CancelledError:
-                pass
-        delay = random.randint(10, 40)
-        async def _go_offline():
-            try:
-                await asyncio.sleep(delay)
-                await client(functions.account.UpdateStatusRequest(offline=True))
-            except asyncio.CancelledError:
-                pass
-            except Exception as e:
-                log.debug("Отложенный offline при завершении диалогов: %s", e)
-            finally:
-                offline_task_ref["task"] = None
-        offline_task_ref["task"] = client.loop.create_task(_go_offline())
-
-    def _cancel_offline_task() -> None:
-        t = offline_task_ref.get("task")
-        if t and not t.done():
-            t.cancel()
+    # Доставка результатов опроса в фоне (обычный режим): слот кампании освобождается сразу после опроса
+    delivery = DeliveryPipeline(_client_for, on_done=_delivery_done)
 
     cmd_log = None
+    service_tasks: list[asyncio.Task] = []
     try:
-        try:
-            client.start(phone=TG_PHONE)
-        except SessionPasswordNeededError:
-            log.warning("Требуется пароль 2FA")
-            client.sign_in(password=input("Введите пароль 2FA: "))
-        me = client.get_me()
-        print(f"Авторизован: {me.first_name} (@{me.username})")
+        for acc in pool.accounts:
+            try:
+                await acc.client.start(phone=acc.phone)
+            except SessionPasswordNeededError:
+                log.warning("Требуется пароль 2FA (%s)", acc.name)
+                await acc.client.sign_in(password=input(f"Введите пароль 2FA ({acc.name}): "))
+            me = await acc.client.get_me()
+            print(f"Авторизован: {me.first_name} (@{me.username}) [{acc.name}]")
+            warmed = acc.peer_cache.load()
+            log.info("Кэш entity %s прогрет: %s записей", acc.name, warmed)
 
         candidate_user_id: int | None = None
         if command_mode:
@@ -139,94 +198,110 @@ def run_userbot(command_mode: bool = False) -> None:
         else:
             print("Ожидаю сообщения в ЛС... (Ctrl+C для выхода)\n")
 
-        @client.on(events.NewMessage(incoming=True, func=lambda e: e.is_private))
         async def handler(event: events.NewMessage.Event):
-            try:
-                await _handle_message(event, client, command_mode, cmd_state, candidate_user_id)
-            except Exception:
-                log.exception("Handler error")
-                raise
-
-        async def _start_next_candidate() -> bool:
-            """Запустить опрос следующего кандидата из списка (обычный режим). Возвращает True, если опрос запущен."""
-            nonlocal candidate_user_id, current_candidate_index
-            if command_mode or not candidates_list:
-                return False
-            idx = (current_candidate_index if current_candidate_index is not None else -1) + 1
-            while idx < len(candidates_list):
-                entry = candidates_list[idx]
-                username = entry.get("username")
-                phone = entry.get("phone")
-                peer = username or phone
-                if not peer:
-                    _record_processed(processed_users, None, username, phone, False, "empty peer after normalization", logger=log)
-                    idx += 1
-                    continue
-                try:
-                    # Если есть номер телефона — добавим кандидата в контакты перед get_entity
-                    if phone:
-                        try:
-                            await client(functions.contacts.ImportContactsRequest(
-                                contacts=[
-                                    types.InputPhoneContact(
-                                        client_id=0,
-                                        phone=phone,
-                                        first_name=f"vaxtaR кандидат {phone}",
-                                        last_name="",
-                                    )
-                                ]
-                            ))
-                        except Exception as e:
-                            log.exception("Import contact failed for %s: %s", phone, e)
+            text = (event.text or "").strip()
+            sender_id = event.sender_id
+            if not text or not sender_id:
+                return
+            acc = pool.for_client(event.client)
+            # Диалог закреплён за аккаунтом, который его начал; сообщения на другие аккаунты пула игнорируем
+            owner = pool.account_for(sender_id)
+            if owner is not None and owner is not acc:
+                return
+            presence = acc.presence
+            # Кандидат в опросе: online + read, серия коротких сообщений склеивается в один ответ
+            # (до постановки в очередь пользователя, иначе сообщения серии выстроятся друг за другом)
+            if questionnaire.get_state(sender_id) and questionnaire.get_dialogue_state(sender_id) is None:
+                await presence.touch(sender_id)
+                presence.mark_read(event.chat_id, event.message.id)
+                text = await inbox.collect(sender_id, text)
+                if text is None:
+                    return
 
-                    entity = await client.get_entity(peer)
-                    candidate_user_id = entity.id
+            async def _job() -> None:
+                try:
+                    await _handle_message(event, text, event.client, command_mode, cmd_state, candidate_user_id)
+                except Exception:
+                    log.exception("Handler error")
+
+            # Сообщения одного пользователя обрабатываются строго по порядку, разных — параллельно
+            await mailbox.submit(sender_id, _job)
+
+        async def typing_handler(event: events.UserUpdate.Event):
+            # Кандидат печатает — продлеваем ожидание склейки его сообщений
+            inbox.typing(event.user_id)
+
+        for acc in pool.accounts:
+            acc.client.add_event_handler(handler, events.NewMessage(incoming=True, func=lambda e: e.is_private))
+            acc.client.add_event_handler(typing_handler, events.UserUpdate(func=lambda e: e.typing))
+
+        async def _start_candidate(entry: dict) -> int | None:
+            """Запустить опрос одного кандидата из списка (обычный режим). Возвращает user_id, если опрос запущен."""
+            username = entry.get("username")
+            phone = entry.get("phone")
+            peer = username or phone
+            if not peer:
+                _record_processed(processed_users, None, username, phone, False, "empty peer after normalization", logger=log)
+                return None
+            # Аккаунт — по кольцу консистентного хеширования; при PeerFlood пробуем следующий аккаунт
+            tried: set[str] = set()
+            while len(tried) < len(pool.accounts):
+                acc = pool.route(peer, exclude=tried)
+                tried.add(acc.name)
+                # Кандидата могли заранее резолвить на аккаунте, к которому он относился по кольцу раньше
+                for other in pool.accounts:
+                    if other is not acc:
+                        other.resolver.discard(entry)
+                try:
+                    # Телефоны импортируются пачками, следующие кандидаты этого аккаунта резолвятся заранее в фоне
+                    upcoming = [
+                        e for e in campaign.upcoming(RESOLVE_LOOKAHEAD)
+                        if pool.route(e.get("username") or e.get("phone")) is acc
+                    ]
+                    acc.resolver.prefetch([entry] + upcoming)
+                    entity = await acc.resolver.resolve(entry)
+                    if questionnaire.get_state(entity.id) is not None:
+                        log.warning("Опрос с кандидатом %s уже идёт, пропуск", peer)
+                        return None
                     uname = getattr(entity, "username", None)
                     greeting = questionnaire.get_greeting(uname)
                     # if TOGGLE_DELAY != "OFF":
                         # await human_like_delay(client, entity, greeting)                    
-                    await client.send_message(entity, greeting)
-                    questionnaire.init_session(candidate_user_id, uname)
-                    current_candidate_index = idx
-                    print(f"Опрос запущен. Кандидат: {username or phone}.")
-                    return True
+                    await send_queue.send_message(acc.client, entity, greeting)
+                except PeerFloodError:
+                    pool.mark_peer_flood(acc)
+                    continue
                 except Exception as e:
                     log.exception("Не удалось запустить опрос для кандидата %s: %s", peer, e)
+                    pool.mark_failed(acc)
                     _record_processed(processed_users, None, username, phone, False, str(e), logger=log)
-                    idx += 1
-            print("Кандидаты закончились, новых опросов нет.")
-            return False
-
-        async def _handle_message(event, client, command_mode, cmd_state, candidate_user_id):
-            text = (event.text or "").strip()
-            if not text:
-                return
+                    return None
+                questionnaire.init_session(entity.id, uname)
+                pool.assign(peer, entity.id, acc)
+                print(f"Опрос запущен. Кандидат: {username or phone} [{acc.name}].")
+                return entity.id
+            _record_processed(processed_users, None, username, phone, False, "PeerFlood на всех аккаунтах", logger=log)
+            return None
+
+        async def _handle_message(event, text, client, command_mode, cmd_state, candidate_user_id):
             sender_id = event.sender_id
-            if not sender_id:
-                return
+            presence = pool.for_client(client).presence
 
             # Если для пользователя уже запущен диалог по вакансиям, обрабатываем его отдельно
             dialog_state = questionnaire.get_dialogue_state(sender_id)
             if dialog_state is not None:
                 # Диалог по вакансиям активен: показываем статус online и помечаем сообщение как прочитанное
-                _cancel_offline_task()
-                try:
-                    await client(functions.account.UpdateStatusRequest(offline=False))
-                except Exception:
-                    log.exception("Failed to update online status in dialogue")
-                try:
-                    await client.send_read_acknowledge(event.chat_id, max_id=event.message.id)
-                except Exception:
-                    log.exception("Failed to send read acknowledge in dialogue")
+                await presence.touch(sender_id)
+                presence.mark_read(event.chat_id, event.message.id)
 
                 handled = await questionnaire.handle_vacancy_dialogue_message(
                     sender_id,
                     text,
                     client,
                 )
-                # Если диалог по вакансиям завершился — запланировать выключение «В сети» через 10–40 с
+                # Если диалог по вакансиям завершился — выключение «В сети», когда активных диалогов не останется
                 if questionnaire.get_dialogue_state(sender_id) is None:
-                    await _schedule_offline()
+                    await presence.release(sender_id)
                 if handled:
                     return
 
@@ -234,36 +309,29 @@ def run_userbot(command_mode: bool = False) -> None:
             if command_mode and cmd_state["questionnaire_running"]:
                 if sender_id != cmd_state["candidate_user_id"]:
                     return
-                # Активный кандидат в режиме команд: online + read
-                _cancel_offline_task()
-                try:
-                    await client(functions.account.UpdateStatusRequest(offline=False))
-                except Exception:
-                    log.exception("Failed to update online status (command_mode candidate)")
-                try:
-                    await client.send_read_acknowledge(event.chat_id, max_id=event.message.id)
-                except Exception:
-                    log.exception("Failed to send read acknowledge (command_mode candidate)")
                 sender = await event.get_sender()
                 username_str = f"@{sender.username}" if getattr(sender, "username", None) else None
                 state = questionnaire.get_state(sender_id)
-                if not state:
-                    return
-                if state["state"] == "greeting_sent":
-                    reply_text, done = await questionnaire.handle_agreement(
-                        sender_id, username_str, text
-                    )
-                elif state["state"] == "asking":
-                    reply_text, done = await questionnaire.handle_answer(
-                        sender_id, username_str, text
-                    )
-                else:
+                if not state or state["state"] not in ("greeting_sent", "asking"):
                     return
-                if reply_text:
-                    await human_like_delay(client, event.chat_id, reply_text)
-                    await event.reply(reply_text)
+                # Время ответа отсчитывается от прихода сообщения: LLM работает, пока «печатаем»
+                budget = ReplyBudget(client, event.chat_id)
+                try:
+                    if state["state"] == "greeting_sent":
+                        reply_text, done = await questionnaire.handle_agreement(
+                            sender_id, username_str, text
+                        )
+                    else:
+                        reply_text, done = await questionnaire.handle_answer(
+                            sender_id, username_str, text, on_progress=budget.keep_alive
+                        )
+                    if reply_text:
+                        await budget.wait(reply_text)
+                        await send_queue.reply(event, reply_text)
+                finally:
+                    budget.cancel()
                 if done:
-                    result = questionnaire.finish_session(sender_id)
+                    result = questionnaire.finish_session(sender_id, deliver=True)
                     if result:
                         hr = cmd_state["hr_override"] or HR_ACCOUNT
                         await questionnaire.dump_result_and_save_text(
@@ -284,8 +352,9 @@ def run_userbot(command_mode: bool = False) -> None:
                         )
                     cmd_state["questionnaire_running"] = False
                     cmd_state["authenticated"] = False
-                    # Опрос завершён, активных диалогов нет — выключить «В сети» через 10–40 с
-                    await _schedule_offline()
+                    # Опрос завершён; если диалог по вакансиям не начат — диалог с кандидатом больше не активен
+                    if questionnaire.get_dialogue_state(sender_id) is None:
+                        await presence.release(sender_id)
                 return
 
             # ----- Режим команд: ожидание команд от оператора -----
@@ -308,7 +377,7 @@ def run_userbot(command_mode: bool = False) -> None:
                         op_username = getattr(sender, "username", None)
                         op_label = f"@{op_username}" if op_username else str(sender_id)
                         cmd_log.info("operator = %s", op_label)
-                        await event.reply(f"Доступ разрешён.\n\n{CMD_LIST}\n\nОжидаю команду.")
+                        await send_queue.reply(event, f"Доступ разрешён.\n\n{CMD_LIST}\n\nОжидаю команду.")
                     else:
                         sender = await event.get_sender()
                         op_username = getattr(sender, "username", None)
@@ -316,7 +385,7 @@ def run_userbot(command_mode: bool = False) -> None:
                         cmd_log.warning("неверный пароль, от %s", op_label)
                         cmd_state["waiting_for"] = None
                         cmd_state["pending_operator_id"] = None
-                        await event.reply("Неверный пароль.")
+                        await send_queue.reply(event, "Неверный пароль.")
                     return
 
                 if waiting == "hr_username" and is_operator:
@@ -326,7 +395,7 @@ def run_userbot(command_mode: bool = False) -> None:
                     cmd_state["waiting_for"] = None
                     cmd_state["non_command_count"] = -1
                     cmd_log.info("hr = %s", hr_val or "—")
-                    await event.reply("HR установлен.")
+                    await send_queue.reply(event, "HR установлен.")
                     return
 
                 if waiting == "candidate_username" and is_operator:
@@ -336,7 +405,7 @@ def run_userbot(command_mode: bool = False) -> None:
                     cmd_state["waiting_for"] = None
                     cmd_state["non_command_count"] = -1
                     cmd_log.info("candidate = %s", cand_val or "—")
-                    await event.reply("Кандидат установлен.")
+                    await send_queue.reply(event, "Кандидат установлен.")
                     return
 
                 if waiting == "start_confirmation" and is_operator:
@@ -344,31 +413,31 @@ def run_userbot(command_mode: bool = False) -> None:
                         hr = cmd_state["hr_override"] or HR_ACCOUNT
                         cand = cmd_state["candidate_override"]
                         if not cand:
-                            await event.reply("Кандидат не задан. Выполните /set_candidate.")
+                            await send_queue.reply(event, "Кандидат не задан. Выполните /set_candidate.")
                             cmd_state["waiting_for"] = None
                             return
                         try:
-                            entity = await client.get_entity(cand)
+                            entity = await pool.primary.peer_cache.resolve(client, cand)
                             candidate_user_id = entity.id
                             uname = getattr(entity, "username", None)
                             greeting = questionnaire.get_greeting(uname)
                             await human_like_delay(client, entity, greeting)
-                            await client.send_message(entity, greeting)
+                            await send_queue.send_message(client, entity, greeting)
                             questionnaire.init_session(candidate_user_id, uname)
                             cmd_state["candidate_user_id"] = candidate_user_id
                             cmd_state["questionnaire_running"] = True
                             cmd_state["waiting_for"] = None
                             cmd_state["non_command_count"] = -1
-                            await event.reply(f"Опрос запущен. Кандидат: {cand}.")
+                            await send_queue.reply(event, f"Опрос запущен. Кандидат: {cand}.")
                         except Exception as e:
                             log.exception("Не удалось запустить опрос: %s", e)
-                            await event.reply(f"Ошибка: {e}")
+                            await send_queue.reply(event, f"Ошибка: {e}")
                             _record_processed(processed_users, None, cand, None, False, str(e), logger=log)
                             cmd_state["waiting_for"] = None
                     else:
                         cmd_state["waiting_for"] = None
                         cmd_state["non_command_count"] = -1
-                        await event.reply("Запуск отменён.")
+                        await send_queue.reply(event, "Запуск отменён.")
                     return
 
                 # Команды (только от оператора, кроме /command_mode до аутентификации)
@@ -376,137 +445,172 @@ def run_userbot(command_mode: bool = False) -> None:
                     cmd_state["non_command_count"] = -1
                     if text == "/command_mode":
                         if cmd_state["authenticated"] and sender_id == cmd_state["operator_user_id"]:
-                            await event.reply(f"{CMD_LIST}\n\nОжидаю команду.")
+                            await send_queue.reply(event, f"{CMD_LIST}\n\nОжидаю команду.")
                         else:
                             cmd_state["pending_operator_id"] = sender_id
                             cmd_state["waiting_for"] = "password"
-                            await event.reply("Введите пароль для режима команд.")
+                            await send_queue.reply(event, "Введите пароль для режима команд.")
                         return
 
                     if not is_operator:
-                        await event.reply("Доступ только после команды перехода в \"режим команд\" и ввода пароля.")
+                        await send_queue.reply(event, "Доступ только после команды перехода в \"режим команд\" и ввода пароля.")
                         return
 
                     if text == "/set_hr":
                         cmd_state["waiting_for"] = "hr_username"
-                        await event.reply("Введите @username для HR.")
+                        await send_queue.reply(event, "Введите @username для HR.")
                         return
                     if text == "/set_candidate":
                         cmd_state["waiting_for"] = "candidate_username"
-                        await event.reply("Введите @username кандидата.")
+                        await send_queue.reply(event, "Введите @username кандидата.")
                         return
                     if text == "/cancel":
                         cmd_state["authenticated"] = False
                         cmd_state["hr_override"] = None
                         cmd_state["waiting_for"] = None
                         cmd_state["non_command_count"] = -1
-                        await event.reply("Выхожу из режима команд.")
+                        await send_queue.reply(event, "Выхожу из режима команд.")
                         return
                     if text == "/start_questions":
                         if not cmd_state["hr_set_this_session"] or not cmd_state["candidate_set_this_session"]:
-                            await event.reply("Сначала выполните /set_hr и /set_candidate.")
+                            await send_queue.reply(event, "Сначала выполните /set_hr и /set_candidate.")
                             return
                         hr = cmd_state["hr_override"] or HR_ACCOUNT
                         cand = cmd_state["candidate_override"] or ""
-                        await event.reply(
+                        await send_queue.reply(
+                            event,
                             f"HR: {hr or '—'}, Кандидат: {cand or '—'}.\n"
                             "Подтвердить запуск опроса? (да / нет)"
                         )
                         cmd_state["waiting_for"] = "start_confirmation"
                         return
 
-                    await event.reply("Неизвестная команда.")
+                    await send_queue.reply(event, "Неизвестная команда.")
                     return
 
                 # Не команда от оператора в режиме ожидания команд
                 if is_operator and waiting is None:
                     cmd_state["non_command_count"] += 1
                     if cmd_state["non_command_count"] == 0:
-                        await event.reply(
+                        await send_queue.reply(
+                            event,
                             "Ожидается команда (например /set_hr, /set_candidate, /start_questions, /cancel)."
                         )
                     elif cmd_state["non_command_count"] >= 1:
-                        await event.reply("Выхожу из режима команд.")
+                        await send_queue.reply(event, "Выхожу из режима команд.")
                         cmd_state["authenticated"] = False
                         cmd_state["hr_override"] = None
                         cmd_state["waiting_for"] = None
                         cmd_state["non_command_count"] = -1
                 return
 
-            # ----- Обычный режим (не command_mode): один кандидат за раз из списка -----
-            if candidate_user_id is not None and sender_id != candidate_user_id:
-                return
-            # Активный кандидат в обычном режиме: online + read
-            _cancel_offline_task()
-            try:
-                await client(functions.account.UpdateStatusRequest(offline=False))
-            except Exception:
-                log.exception("Failed to update online status (candidate)")
-            try:
-                await client.send_read_acknowledge(event.chat_id, max_id=event.message.id)
-            except Exception:
-                log.exception("Failed to send read acknowledge (candidate)")
-
-            sender = await event.get_sender()
-            username_str = f"@{sender.username}" if getattr(sender, "username", None) else None
-
+            # ----- Обычный режим (не command_mode): несколько кандидатов параллельно -----
+            # Маршрутизация по user_id: сообщение относится к активному опросу, если для отправителя есть questionnaire._state
             state = questionnaire.get_state(sender_id)
-            if not state:
+            if not state or state["state"] not in ("greeting_sent", "asking"):
                 return
+            if campaign is not None:
+                campaign.touch(sender_id)
 
-            if state["state"] == "greeting_sent":
-                reply_text, done = await questionnaire.handle_agreement(
-                    sender_id, username_str, text
-                )
-            elif state["state"] == "asking":
-                reply_text, done = await questionnaire.handle_answer(
-                    sender_id, username_str, text
-                )
-            else:
-                return
+            # Время ответа отсчитывается от прихода сообщения: LLM работает, пока «печатаем»
+            budget = ReplyBudget(client, event.chat_id)
+            try:
+                sender = await event.get_sender()
+                username_str = f"@{sender.username}" if getattr(sender, "username", None) else None
 
-            if reply_text:
-                await human_like_delay(client, event.chat_id, reply_text)
-                await event.reply(reply_text)
+                if state["state"] == "greeting_sent":
+                    reply_text, done = await questionnaire.handle_agreement(
+                        sender_id, username_str, text
+                    )
+                else:
+                    reply_text, done = await questionnaire.handle_answer(
+                        sender_id, username_str, text, on_progress=budget.keep_alive
+                    )
+
+                if reply_text:
+                    await budget.wait(reply_text)
+                    await send_queue.reply(event, reply_text)
+            finally:
+                budget.cancel()
 
             if done:
-                # Зафиксировать результат и перейти к следующему кандидату (обычный режим)
+                # Зафиксировать результат и освободить слот кампании (обычный режим)
                 username_src = username_str
                 phone_src = None
-                if current_candidate_index is not None and 0 <= current_candidate_index < len(candidates_list):
-                    entry = candidates_list[current_candidate_index]
+                entry = campaign.entry_for(sender_id) if campaign else None
+                if entry is not None:
                     username_src = username_src or entry.get("username")
                     phone_src = entry.get("phone")
 
                 _record_processed(processed_users, sender_id, username_src, phone_src, True, None, logger=log)
 
-                result = questionnaire.finish_session(sender_id)
+                result = questionnaire.finish_session(sender_id, deliver=True)
                 if result:
-                    await questionnaire.dump_result_and_save_text(
-                        result,
-                        client,
-                        candidate_entity=candidate_user_id,
-                        candidate_phone=phone_src,
+                    # summary → вакансии → HR → кандидат → диалог — в фоне, следующий кандидат не ждёт
+                    await delivery.submit(
+                        questionnaire.new_delivery_context(
+                            result,
+                            candidate_entity=sender_id,
+                            candidate_phone=phone_src,
+                        ),
+                        pool.for_client(client).name,
                     )
 
-                started = await _start_next_candidate()
-                # Если следующего кандидата нет — выключить «В сети» через 10–40 с
-                if not started:
-                    await _schedule_offline()
+                pool.release(sender_id)
+                if campaign is not None:
+                    await campaign.complete(sender_id)
+                    await _campaign_slot_freed()
+                # Нет доставки и диалога по вакансиям — диалог с кандидатом больше не активен
+                if not result and questionnaire.get_dialogue_state(sender_id) is None:
+                    await presence.release(sender_id)
+
+        async def _on_candidate_idle(user_id: int, entry: dict[str, Any]) -> None:
+            # Кандидат не ответил за CAMPAIGN_IDLE_TIMEOUT_SEC: опрос закрыт без результата, поздние ответы не обрабатываются
+            questionnaire.finish_session(user_id)
+            _record_processed(
+                processed_users, user_id, entry.get("username"), entry.get("phone"), False, "no reply timeout", logger=log
+            )
+            acc = pool.account_for(user_id)
+            pool.release(user_id)
+            if acc is not None and questionnaire.get_dialogue_state(user_id) is None:
+                await acc.presence.release(user_id)
+            await _campaign_slot_freed()
+
+        if not command_mode:
+            delivery.start()
 
         if not command_mode and candidates_list:
-            # Старт первого кандидата после инициализации
-            client.loop.create_task(_start_next_candidate())
-
-        # В режиме ожидания (до первого диалога) — сразу «не в сети»; online только во время диалога
-        try:
-            client.loop.run_until_complete(
-                client(functions.account.UpdateStatusRequest(offline=True))
+            # Старт первых N кандидатов после инициализации; дальше слоты дозаполняются по мере завершения опросов
+            # CAMPAIGN_CONCURRENCY — на каждый аккаунт пула
+            campaign = CampaignScheduler(
+                candidates_list, _start_candidate, CAMPAIGN_CONCURRENCY * len(pool.accounts), logger=log
             )
-        except Exception as e:
-            log.debug("Начальный offline при старте: %s", e)
+            campaign.schedule_fill()
 
-        client.run_until_disconnected()
+        # В режиме ожидания (до первого диалога) — сразу «не в сети»; online только во время диалога
+        for acc in pool.accounts:
+            try:
+                await acc.presence.force_offline()
+            except Exception as e:
+                log.debug("Начальный offline при старте (%s): %s", acc.name, e)
+
+        # Встроенные сервисы (метрики в лог, health endpoint, пул сообщений LLM) + зарегистрированные через register_service
+        services = list(_services)
+        if METRICS_LOG_INTERVAL_SEC > 0:
+            services.append(lambda: health.log_metrics_periodically(METRICS_LOG_INTERVAL_SEC))
+        if HEALTH_PORT > 0:
+            services.append(lambda: health.serve_health(HEALTH_PORT))
+        if LOOP_LAG_WARN_MS > 0:
+            services.append(lambda: health.watch_loop_lag(LOOP_LAG_WARN_MS))
+        if campaign is not None and CAMPAIGN_IDLE_TIMEOUT_SEC > 0:
+            services.append(lambda: campaign.watch_idle(CAMPAIGN_IDLE_TIMEOUT_SEC, on_idle=_on_candidate_idle))
+        if not command_mode and NO_MORE_REFRESH_SEC > 0:
+            services.append(lambda: llm_pool.refresh_no_more_periodically(NO_MORE_REFRESH_SEC))
+        for acc in pool.accounts:
+            services.append(acc.peer_cache.autosave)
+        service_tasks = [asyncio.create_task(factory()) for factory in services]
+
+        await asyncio.gather(*(acc.client.run_until_disconnected() for acc in pool.accounts))
 
     except PhoneNumberInvalidError:
         log.error("Неверный формат номера телефона")
@@ -514,26 +618,34 @@ def run_userbot(command_mode: bool = False) -> None:
     except FloodWaitError as e:
         log.error("FloodWait: %s секунд", e.seconds)
         print(f"Ожидание {e.seconds} с (ограничение Telegram).")
-    except KeyboardInterrupt:
-        log.info("Остановлено по Ctrl+C")
-        print("\nОстановлено.")
     except Exception as e:
         log.exception("Неожиданная ошибка")
         print(f"Ошибка: {e}")
     finally:
         if command_mode and cmd_log:
             cmd_log.info("конец сеанса command_mode")
-        # Отменяем отложенное выключение «В сети», если оно было запланировано
-        t = offline_task_ref.get("task")
-        if t and not t.done():
-            t.cancel()
-        # Снимаем статус «В сети» при завершении (в т.ч. по Ctrl+C)
-        try:
-            if client.is_connected():
-                client.loop.run_until_complete(
-                    client(functions.account.UpdateStatusRequest(offline=True))
-                )
-        except Exception as e:
-            log.debug("Не удалось выставить offline при выходе: %s", e)
-        client.disconnect()
+        for task in service_tasks:
+            task.cancel()
+        await asyncio.gather(*service_tasks, return_exceptions=True)
+        # Незавершённые доставки сохранены на диск и продолжатся при следующем запуске
+        await delivery.close()
+        if delivery.pending:
+            log.info("Доставка: %s незавершённых сохранено до следующего запуска", delivery.pending)
+        # Досылаем то, что уже стоит в очереди исходящих (в т.ч. по Ctrl+C)
+        if not await send_queue.get_queue().drain(timeout=SHUTDOWN_DRAIN_SEC):
+            log.warning("Очередь исходящих не опустела за %s с: %s", SHUTDOWN_DRAIN_SEC, send_queue.stats())
+        for acc in pool.accounts:
+            # Отменяем отложенное выключение «В сети» и склейку прочтений
+            acc.presence.close()
+            # Снимаем статус «В сети» при завершении
+            try:
+                if acc.client.is_connected():
+                    await acc.presence.force_offline()
+            except Exception as e:
+                log.debug("Не удалось выставить offline при выходе (%s): %s", acc.name, e)
+            await acc.client.disconnect()
+            # Кэш entity между периодическими сбросами — на диск
+            await acc.peer_cache.flush()
+        await openai_client.close_client()
+        verdict_cache.get_cache().close()
         print("Клиент отключён.")
@@ -0,0 +1,147 @@
+"""
+Упреждающая загрузка вакансий: как только из ответов опроса известны все поля фильтра (регион, пол, возраст,
+тип работы), get_places + get_job_offerings + enrich_offerings запускаются в фоне, не дожидаясь конца опроса.
+Результат хранится по ключу фильтра; ответ, меняющий фильтр, отменяет прежнюю загрузку и запускает новую.
+Этап vacancies доставки забирает готовый (или ещё идущий) результат вместо нового запроса.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from config import VACANCY_API_KEY, VACANCY_PREFETCH_TTL_SEC, VACANCY_TOP_N
+from . import metrics
+from .vacancies import (
+    enrich_offerings,
+    filter_from_short,
+    format_top_vacancies_report,
+    generate_filter,
+    get_job_offerings,
+    get_places,
+)
+
+log = logging.getLogger("userbot")
+
+# Поля short, от которых зависит filter_from_short
+FILTER_FIELDS = ("region", "gender", "age", "job_type")
+# Сколько разных фильтров держать одновременно
+MAX_ENTRIES = 200
+
+Fetched = tuple[list[dict[str, Any]], Optional[str], int]
+
+
+def fetch_vacancies(short: dict[str, Any]) -> Fetched:
+    """Синхронно: (вакансии, отчёт по топ-N или None, всего найдено) по выжимке short."""
+    places_resp = get_places()
+    places = places_resp.get("data", [])
+    flat = filter_from_short(short, places)
+    if not flat:
+        return [], None, 0
+    filter_dict = generate_filter(flat)
+    raw = get_job_offerings(filter_dict=filter_dict)
+    offerings = enrich_offerings(raw, places)
+    meta = raw.get("meta") or {}
+    print(meta)
+    total_count = meta.get("count") or len(offerings)
+    report = format_top_vacancies_report(offerings, top_n=VACANCY_TOP_N) if offerings else None
+    return offerings, report, total_count
+
+
+def filter_key(short: Optional[dict[str, Any]]) -> Optional[str]:
+    """
+    Ключ фильтра по полям short; None — ещё не все ответы для фильтра разобраны
+    (загружать по неполному фильтру — лишние запросы к API на каждый ответ) или фильтр пуст.
+    """
+    if not short or not all(f in short for f in FILTER_FIELDS):
+        return None
+    values = [short[f] for f in FILTER_FIELDS]
+    if all(v is None for v in values):
+        return None
+    return "|".join("" if v is None else str(v) for v in values)
+
+
+class _Entry:
+    __slots__ = ("task", "started", "refs")
+
+    def __init__(self, task: asyncio.Task) -> None:
+        self.task = task
+        self.started = time.monotonic()
+        self.refs = 1
+
+
+_entries: OrderedDict[str, _Entry] = OrderedDict()
+
+
+def _fresh(entry: _Entry) -> bool:
+    return time.monotonic() - entry.started < VACANCY_PREFETCH_TTL_SEC
+
+
+def release(key: Optional[str]) -> None:
+    """
+    Кандидату больше не нужна загрузка по key (опрос прерван, доставки не будет): когда она никому
+    не нужна — убрать её (и отменить, если ещё идёт).
+    """
+    entry = _entries.get(key) if key else None
+    if entry is None:
+        return
+    entry.refs -= 1
+    if entry.refs > 0:
+        return
+    _entries.pop(key, None)
+    if not entry.task.done():
+        entry.task.cancel()
+        metrics.inc("vacancy_prefetch_invalidated")
+
+
+def prefetch(short: dict[str, Any], previous: Optional[str] = None) -> Optional[str]:
+    """
+    Запустить фоновую загрузку по текущим полям short. previous — ключ прошлой загрузки этого кандидата
+    (она освобождается, если фильтр изменился). Возвращает новый ключ (его передать в следующий вызов).
+    """
+    key = filter_key(short)
+    if key is None or key == previous or not VACANCY_API_KEY:
+        return previous if key is None else key
+    release(previous)
+    entry = _entries.get(key)
+    if entry is not None and _fresh(entry) and not entry.task.cancelled():
+        entry.refs += 1
+        _entries.move_to_end(key)
+        return key
+    snapshot = {f: short.get(f) for f in FILTER_FIELDS}
+    task = asyncio.get_running_loop().create_task(asyncio.to_thread(fetch_vacancies, snapshot))
+    # Ошибку заберёт take(); без ожидающих не ругаемся «exception was never retrieved»
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    _entries[key] = _Entry(task)
+    metrics.inc("vacancy_prefetch_started")
+    while len(_entries) > MAX_ENTRIES:
+        _entries.popitem(last=False)
+    return key
+
+
+async def take(short: dict[str, Any], held: Optional[str] = None) -> Optional[Fetched]:
+    """
+    Результат упреждающей загрузки для short (дождаться, если ещё идёт); None — загрузки нет или она не удалась.
+    held — ключ, который вернул кандидату последний prefetch (по умолчанию — ключ short): ссылка
+    кандидата освобождается, загрузка без других кандидатов удаляется.
+    """
+    key = filter_key(short)
+    entry = _entries.get(key) if key else None
+    try:
+        if entry is None or not _fresh(entry) or entry.task.cancelled():
+            metrics.inc("vacancy_prefetch_miss")
+            return None
+        try:
+            result = await asyncio.shield(entry.task)
+        except Exception as e:
+            log.warning("Vacancy prefetch failed, fetching again: %s", e)
+            _entries.pop(key, None)
+            metrics.inc("vacancy_prefetch_miss")
+            return None
+        metrics.inc("vacancy_prefetch_hit")
+        return result
+    finally:
+        release(held if held is not None else key)
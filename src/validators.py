@@ -0,0 +1,243 @@
+"""
+Локальные валидаторы ответов на вопросы опроса: необязательный блок "validator" у вопроса в questions.json.
+evaluate() возвращает (True, "") — ответ точно подходит, (False, причина) — точно не подходит
+(нужен человеческий ответ рекрутера от LLM), (None, "") — проверка не дала ответа, решает LLM.
+
+Поддерживаемые типы (validator — объект или список объектов; побеждает первый уверенный вердикт):
+  {"type": "name", "min_words": 2, "max_words": 4}        — ФИО: 2–4 слова с заглавной, есть фамилия/отчество,
+                                                             нет названий городов и регионов («Москва Петров»)
+  {"type": "date", "min_age": 14, "max_age": 80}           — дата рождения или год («мне 30 лет» — решает LLM)
+  {"type": "int_range", "min": 10000, "max": 1000000}      — число в диапазоне («50 тыс», «50к» учитываются)
+  {"type": "regex", "pattern": "...", "on_match": "accept" | "reject", "reason": "..."}
+  {"type": "enum", "values": ["склад", "производство"]}    — ответ содержит одно из значений (начало слова, без «не»)
+  {"type": "yes_no"}                                       — короткий ответ «да»/«нет» (отказ отвечать — решает LLM)
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+from datetime import date
+from functools import lru_cache
+from typing import Any, Optional
+
+from config import REGIONS_PATH
+from . import intent
+
+log = logging.getLogger("userbot")
+
+Verdict = tuple[Optional[bool], str]
+
+_INCONCLUSIVE: Verdict = (None, "")
+
+_MONTHS = {
+    "январ": 1, "феврал": 2, "март": 3, "апрел": 4, "ма": 5, "июн": 6,
+    "июл": 7, "август": 8, "сентябр": 9, "октябр": 10, "ноябр": 11, "декабр": 12,
+}
+_NUMERIC_DATE_RE = re.compile(r"(?<!\d)(\d{1,2})[./\- ](\d{1,2})[./\- ](\d{2}|\d{4})(?!\d)")
+_ISO_DATE_RE = re.compile(r"(?<!\d)(\d{4})-(\d{1,2})-(\d{1,2})(?!\d)")
+_WORD_DATE_RE = re.compile(r"(?<!\d)(\d{1,2})\s+([а-я]+)\s+(\d{4})(?!\d)")
+_YEAR_RE = re.compile(r"(?<!\d)(19\d{2}|20\d{2})(?!\d)")
+_AGE_RE = re.compile(r"(?<!\d)(\d{1,2})\s*(?:год|лет)")
+# Суффикс тысяч — отдельным словом: «50к», «50 тыс.», но не «20 км», «50 кг»
+_NUMBER_RE = re.compile(
+    r"(?<![\d.,])(\d+(?:[ .,]\d{3})*(?:[.,]\d+)?)\s*(?:(тыс\w*|т\.?р|к|k)(?![а-яёa-z]))?", re.IGNORECASE
+)
+_NAME_WORD_RE = re.compile(r"^[A-Za-zА-Яа-яЁё]+(?:-[A-Za-zА-Яа-яЁё]+)*$")
+# Окончания фамилий и отчеств: без них два слова с заглавной («Зачем Вам») — не ФИО наверняка
+_SURNAME_OR_PATRONYMIC_RE = re.compile(
+    r"(ов|ев|ёв|ин|ын|ова|ева|ёва|ина|ына|ский|цкий|ская|цкая|вич|вна|ична|оглы|кызы)$"
+)
+# Перед значением enum: «не сразу» — не «сразу»
+_NEGATIONS = {"не", "ни"}
+# Сокращения в названиях регионов: «Московская обл.» → «московская область»
+_REGION_ABBREV = {"обл": "область", "респ": "республика", "г": "город"}
+
+
+def _region_key(text: str) -> str:
+    words = re.sub(r"[.,]", " ", text.lower().replace("ё", "е")).split()
+    return " ".join(_REGION_ABBREV.get(w, w) for w in words)
+
+
+@lru_cache(maxsize=1)
+def _known_regions() -> dict[str, str]:
+    """Нормализованное название → название из regions.json (регионы и города)."""
+    try:
+        with open(REGIONS_PATH, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        log.warning("Список регионов не загружен (%s): регион разбирается только через LLM", e)
+        return {}
+    names = [n for group in ("regions", "cities") for n in data.get(group, [])]
+    return {_region_key(n): n for n in names}
+
+
+def region_name(text: str) -> Optional[str]:
+    """Название региона или города из regions.json, если text — именно оно («московская обл.»), иначе None."""
+    return _known_regions().get(_region_key(text or ""))
+
+
+def _age_on(born: date, today: date) -> int:
+    return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+
+
+def parse_birth_date(answer: str) -> tuple[Optional[date], Optional[int], str]:
+    """
+    Дата рождения из ответа: (дата или None, возраст или None, ошибка).
+    Если указан только год — дата YYYY-01-01; «мне 30 лет» — только возраст.
+    """
+    text = (answer or "").lower().replace("ё", "е")
+    today = date.today()
+    parts: Optional[tuple[int, int, int]] = None
+    m = _ISO_DATE_RE.search(text)
+    if m:
+        parts = (int(m.group(1)), int(m.group(2)), int(m.group(3)))
+    if parts is None:
+        m = _NUMERIC_DATE_RE.search(text)
+        if m:
+            y = int(m.group(3))
+            if y < 100:
+                # Двузначный год: «05» — 2005, если так человеку не меньше 14, иначе 19xx
+                y += 2000 if 2000 + y <= today.year - 14 else 1900
+            parts = (y, int(m.group(2)), int(m.group(1)))
+    if parts is None:
+        m = _WORD_DATE_RE.search(text)
+        if m:
+            month = next((n for stem, n in _MONTHS.items() if m.group(2).startswith(stem)), None)
+            if month is not None:
+                parts = (int(m.group(3)), month, int(m.group(1)))
+    if parts is not None:
+        try:
+            born = date(*parts)
+        except ValueError:
+            return None, None, "такой даты не существует"
+        return born, _age_on(born, today), ""
+    m = _YEAR_RE.search(text)
+    if m:
+        born = date(int(m.group(1)), 1, 1)
+        return born, _age_on(born, today), ""
+    m = _AGE_RE.search(text)
+    if m:
+        return None, int(m.group(1)), ""
+    return None, None, ""
+
+
+def _check_date(spec: dict[str, Any], answer: str) -> Verdict:
+    born, age, error = parse_birth_date(answer)
+    if error:
+        return (False, error)
+    if born is None:
+        # Нет даты («мне 30 лет», ерунда) — дата рождения не названа, решает LLM
+        return _INCONCLUSIVE
+    min_age = int(spec.get("min_age", 14))
+    max_age = int(spec.get("max_age", 80))
+    if not (min_age <= age <= max_age):
+        return (False, f"возраст {age} вне допустимого диапазона {min_age}–{max_age}")
+    return (True, "")
+
+
+def _parse_numbers(answer: str) -> list[float]:
+    numbers = []
+    for raw, suffix in _NUMBER_RE.findall(answer or ""):
+        digits = raw.replace(" ", "")
+        # «50.000» / «50,000» — разделитель тысяч; «1,5» — дробь
+        if re.fullmatch(r"\d{1,3}([.,]\d{3})+", digits):
+            digits = re.sub(r"[.,]", "", digits)
+        try:
+            value = float(digits.replace(",", "."))
+        except ValueError:
+            continue
+        if suffix:
+            value *= 1000
+        numbers.append(value)
+    return numbers
+
+
+def _check_int_range(spec: dict[str, Any], answer: str) -> Verdict:
+    numbers = _parse_numbers(answer)
+    if not numbers:
+        return _INCONCLUSIVE
+    lo = float(spec.get("min", float("-inf")))
+    hi = float(spec.get("max", float("inf")))
+    if any(lo <= n <= hi for n in numbers):
+        return (True, "")
+    # Число есть, но не то (например, «5» вместо суммы) — пусть решает LLM
+    return _INCONCLUSIVE
+
+
+def _check_regex(spec: dict[str, Any], answer: str) -> Verdict:
+    if not re.search(spec["pattern"], answer or "", re.IGNORECASE):
+        return _INCONCLUSIVE
+    if spec.get("on_match", "accept") == "reject":
+        return (False, spec.get("reason") or "ответ не подходит по формату")
+    return (True, "")
+
+
+def _check_enum(spec: dict[str, Any], answer: str) -> Verdict:
+    norm = intent.normalize(answer)
+    for value in spec.get("values") or []:
+        v = intent.normalize(str(value))
+        if not v:
+            continue
+        for m in re.finditer(rf"(?<!\w){re.escape(v)}", norm):
+            before = norm[: m.start()].split()
+            if not before or before[-1] not in _NEGATIONS:
+                return (True, "")
+    return _INCONCLUSIVE
+
+
+def _check_name(spec: dict[str, Any], answer: str) -> Verdict:
+    words = (answer or "").replace(",", " ").split()
+    min_words = int(spec.get("min_words", 2))
+    max_words = int(spec.get("max_words", 4))
+    if not (min_words <= len(words) <= max_words):
+        return _INCONCLUSIVE
+    # Только слова с заглавной буквы: «Иванов Иван»; «не скажу», «зачем вам» и строчные ответы — решает LLM
+    if not all(_NAME_WORD_RE.match(w) and len(w) >= 2 and w[0].isupper() for w in words):
+        return _INCONCLUSIVE
+    if any(intent.classify_agreement(w) is not None for w in words):
+        return _INCONCLUSIVE
+    if not any(_SURNAME_OR_PATRONYMIC_RE.search(w.lower()) for w in words):
+        return _INCONCLUSIVE
+    # «Москва Петров» — город вместо имени
+    if any(region_name(w) for w in words):
+        return _INCONCLUSIVE
+    return (True, "")
+
+
+def _check_yes_no(spec: dict[str, Any], answer: str) -> Verdict:
+    # И «да», и «нет» — валидные ответы на вопрос «был ли / есть ли / согласны ли»;
+    # отказ отвечать («не хочу отвечать», «отстаньте») — не ответ, решает LLM
+    verdict = intent.classify_agreement(answer)
+    if verdict is None or (verdict is False and intent.is_refusal(answer)):
+        return _INCONCLUSIVE
+    return (True, "")
+
+
+_CHECKS = {
+    "name": _check_name,
+    "date": _check_date,
+    "int_range": _check_int_range,
+    "regex": _check_regex,
+    "enum": _check_enum,
+    "yes_no": _check_yes_no,
+}
+
+
+def evaluate(validator: Any, answer: str) -> Verdict:
+    """Проверить ответ по блоку validator вопроса (объект или список объектов)."""
+    if not validator or not (answer or "").strip():
+        return _INCONCLUSIVE
+    # Брань всегда оценивает LLM (red flag и человеческий ответ)
+    if intent.has_profanity(answer):
+        return _INCONCLUSIVE
+    specs = validator if isinstance(validator, list) else [validator]
+    for spec in specs:
+        check = _CHECKS.get((spec or {}).get("type"))
+        if check is None:
+            continue
+        verdict = check(spec, answer)
+        if verdict[0] is not None:
+            return verdict
+    return _INCONCLUSIVE
@@ -0,0 +1,176 @@
+"""
+Кэш вердиктов validate_answer: одни и те же пары (вопрос, ответ) — «нет», «не было», «склад», «18» —
+повторяются у тысяч кандидатов. Храним только положительные вердикты (без human_response): LRU в памяти
++ SQLite на диске, с TTL и ограничением размера. Запросы к SQLite идут в потоке (asyncio.to_thread),
+не блокируя event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from config import (
+    VERDICT_CACHE_PATH,
+    VERDICT_CACHE_TTL_SEC,
+    VERDICT_CACHE_MAX_ENTRIES,
+    VERDICT_CACHE_MEMORY_SIZE,
+)
+from . import intent, metrics
+
+log = logging.getLogger("userbot")
+
+# Длиннее — ответ почти наверняка уникален, кэшировать нет смысла
+MAX_ANSWER_LEN = 80
+# Как часто (в записях) проверять размер таблицы на диске
+_EVICT_EVERY = 200
+
+
+def make_key(q_key: str, acceptance: str, answer: str) -> Optional[str]:
+    """Ключ кэша: индекс вопроса, хеш критериев приемлемости, нормализованный ответ. None — не кэшируем."""
+    norm = intent.normalize(answer)
+    if not norm or len(norm) > MAX_ANSWER_LEN:
+        return None
+    acc_hash = hashlib.sha1((acceptance or "").encode("utf-8")).hexdigest()[:12]
+    return f"{q_key}:{acc_hash}:{norm}"
+
+
+class VerdictCache:
+    """await get(key) → True/False/None (нет или просрочено); await put(key, valid)."""
+
+    def __init__(
+        self,
+        path: Path = VERDICT_CACHE_PATH,
+        ttl_sec: float = VERDICT_CACHE_TTL_SEC,
+        max_entries: int = VERDICT_CACHE_MAX_ENTRIES,
+        memory_size: int = VERDICT_CACHE_MEMORY_SIZE,
+    ) -> None:
+        self.path = path
+        self.ttl_sec = ttl_sec
+        self.max_entries = max(1, int(max_entries))
+        self.memory_size = max(1, int(memory_size))
+        self._memory: OrderedDict[str, tuple[bool, float]] = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        # Соединение общее для потоков asyncio.to_thread: запросы по одному
+        self._db_lock = threading.Lock()
+        self._puts = 0
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if self._db is None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+                # Кэш можно потерять при сбое — без fsync на каждую запись
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS verdicts ("
+                    "key TEXT PRIMARY KEY, valid INTEGER NOT NULL, ts REAL NOT NULL, used REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS verdicts_used ON verdicts(used)")
+            except Exception as e:
+                log.exception("Open verdict cache failed: %s", e)
+                self._db = None
+        return self._db
+
+    def _remember(self, key: str, valid: bool, ts: float) -> None:
+        self._memory[key] = (valid, ts)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _read(self, key: str, now: float) -> Optional[tuple[bool, float]]:
+        """(valid, ts) из SQLite со свежей отметкой used; None — нет или просрочено. В потоке."""
+        with self._db_lock:
+            db = self._conn()
+            if db is None:
+                return None
+            try:
+                row = db.execute("SELECT valid, ts FROM verdicts WHERE key = ?", (key,)).fetchone()
+                if row is None or now - row[1] >= self.ttl_sec:
+                    return None
+                db.execute("UPDATE verdicts SET used = ? WHERE key = ?", (now, key))
+            except Exception as e:
+                log.exception("Verdict cache read failed: %s", e)
+                return None
+        return bool(row[0]), row[1]
+
+    def _write(self, key: str, valid: bool, now: float) -> None:
+        """Записать вердикт в SQLite (и раз в _EVICT_EVERY записей подрезать таблицу). В потоке."""
+        with self._db_lock:
+            db = self._conn()
+            if db is None:
+                return
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO verdicts (key, valid, ts, used) VALUES (?, ?, ?, ?)",
+                    (key, int(valid), now, now),
+                )
+                self._puts += 1
+                if self._puts % _EVICT_EVERY == 0:
+                    self._evict(now)
+            except Exception as e:
+                log.exception("Verdict cache write failed: %s", e)
+
+    async def get(self, key: Optional[str]) -> Optional[bool]:
+        if not key:
+            return None
+        now = time.time()
+        hit = self._memory.get(key)
+        if hit is not None and now - hit[1] < self.ttl_sec:
+            self._memory.move_to_end(key)
+            metrics.inc("verdict_cache_hits", layer="memory")
+            return hit[0]
+        row = await asyncio.to_thread(self._read, key, now)
+        if row is None:
+            self._memory.pop(key, None)
+            metrics.inc("verdict_cache_misses")
+            return None
+        valid, ts = row
+        self._remember(key, valid, ts)
+        metrics.inc("verdict_cache_hits", layer="disk")
+        return valid
+
+    async def put(self, key: Optional[str], valid: bool) -> None:
+        if not key:
+            return
+        now = time.time()
+        self._remember(key, valid, now)
+        await asyncio.to_thread(self._write, key, valid, now)
+
+    def _evict(self, now: float) -> None:
+        """Удалить просроченные записи и самые давно использованные сверх max_entries."""
+        db = self._db
+        db.execute("DELETE FROM verdicts WHERE ts < ?", (now - self.ttl_sec,))
+        (count,) = db.execute("SELECT COUNT(*) FROM verdicts").fetchone()
+        if count > self.max_entries:
+            db.execute(
+                "DELETE FROM verdicts WHERE key IN (SELECT key FROM verdicts ORDER BY used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+            metrics.inc("verdict_cache_evicted", count - self.max_entries)
+        metrics.set_gauge("verdict_cache_size", min(count, self.max_entries))
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+_cache: VerdictCache | None = None
+
+
+def get_cache() -> VerdictCache:
+    """Общий кэш процесса (создаётся при первом обращении)."""
+    global _cache
+    if _cache is None:
+        _cache = VerdictCache()
+    return _cache
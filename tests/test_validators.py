@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from src import openai_client, questionnaire, validators
+
+NAME = {"type": "name", "min_words": 2, "max_words": 4}
+DATE = {"type": "date", "min_age": 14, "max_age": 80}
+
+
+def _question(idx: int) -> dict:
+    return questionnaire.get_question_full(str(idx))
+
+
+@pytest.mark.parametrize("answer", ["Петров Иван Сергеевич", "Иванова Мария", "Иван Петров"])
+def test_name_accepts_full_name(answer):
+    assert validators.evaluate(NAME, answer) == (True, "")
+
+
+@pytest.mark.parametrize("answer", ["Москва Петров", "Петров Казань", "Зачем Вам", "не скажу"])
+def test_name_defers_to_llm(answer):
+    assert validators.evaluate(NAME, answer) == (None, "")
+
+
+@pytest.mark.parametrize("answer", ["12.03.1990", "родился 5 мая 1988", "1995"])
+def test_date_accepts_birth_date(answer):
+    assert validators.evaluate(DATE, answer) == (True, "")
+
+
+@pytest.mark.parametrize("answer", ["мне 30 лет", "30 лет", "не помню"])
+def test_date_defers_age_only(answer):
+    assert validators.evaluate(DATE, answer) == (None, "")
+
+
+def test_date_rejects_impossible_date():
+    valid, reason = validators.evaluate(DATE, "31.02.1990")
+    assert valid is False and reason
+
+
+@pytest.mark.parametrize("idx", [5, 6])
+def test_bare_yes_is_not_an_answer_to_experience_or_skills(idx):
+    assert validators.evaluate(_question(idx).get("validator"), "да") == (None, "")
+
+
+@pytest.mark.parametrize("idx, answer", [(5, "нет"), (5, "не было"), (6, "нет"), (6, "погрузчик, ТСД")])
+def test_experience_and_skills_accept_answers(idx, answer):
+    assert validators.evaluate(_question(idx).get("validator"), answer) == (True, "")
+
+
+def test_region_name():
+    assert validators.region_name("московская обл.") == "Московская область"
+    assert validators.region_name("Не знаю") is None
+
+
+def test_local_rejection_does_not_call_llm(monkeypatch):
+    async def unavailable(*args, **kwargs):
+        raise AssertionError("LLM не должна вызываться для локального отказа")
+
+    monkeypatch.setattr(openai_client, "validate_answer", unavailable)
+    user_id = 990001
+    questionnaire.init_session(user_id)
+    state = questionnaire.get_state(user_id)
+    state.update(state="asking", current_q_index=1)
+    try:
+        reply, done = asyncio.run(questionnaire.handle_answer(user_id, None, "31.02.1990"))
+    finally:
+        questionnaire.finish_session(user_id)
+    assert not done
+    assert "такой даты не существует" in reply
+    assert state["current_q_index"] == 1
+    assert state["report"][-1]["invalid"] is True